@@ -1,24 +1,346 @@
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import pandas as pd
+from sklearn.preprocessing import normalize
+import scipy.sparse as sp
 import numpy as np
-from models import User, UserPreferences
+import logging
+import os
+import threading
+from itertools import chain
+from cachetools import TTLCache
+from sqlalchemy import event
+from models import User, UserPreferences, Book
 from extensions import db
- # Import your Flask app
+from recommender_model import RecommenderModel, HashingFeaturizer, DEFAULT_HASH_FEATURES
+from ann_index import IVFIndex
+import book_features
+from book_features import BookFeatureStore, book_from_catalog
+from candidate_filter import get_candidate_filter
+from candidate_pool import CandidatePool
+from collaborative import CollaborativeModel
+from memory_budget import MemoryBudget, record_peak_rss  # noqa: F401 (record_peak_rss is used by app.py)
+from catalog_index import candidate_book, get_catalog_index, preference_terms
+from recommendation_cache import RecommendationCache, candidate_fingerprint, preference_fingerprint
+from similarity_memo import SimilarityMemo
+from structured_features import (
+    BookAttributes, PreferenceTargets, DEFAULT_FEATURE_WEIGHTS, combine_scores, explain_score, score_attributes
+)
+from score_breakdown import (
+    BOOK_TEXT_FIELDS, field_dots, field_parts, normalize_field_blocks, stacked_field_keys, stacked_field_texts
+)
+from tokenizer import default_tokenizer, pretokenized, set_token_cache_size, DEFAULT_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Pre-fitted text model (or hashing featurizer) shared by every recommender in
+# this process. Set once at start-up by load_featurizer().
+_recommender_model = None
+
+# Optional approximate index over the stored book vectors, see load_ann_index()
+_ann_index = None
+
+# Optional reading-list factors for collaborative scores, see load_collaborative_model()
+_collaborative_model = None
+
+# float32 vectors and vocabulary/description caps, see set_memory_budget()
+_memory_budget = MemoryBudget()
+
+# Weights for mixing text similarity with the structured features, see
+# set_feature_weights()
+_feature_weights = dict(DEFAULT_FEATURE_WEIGHTS)
+
+# The process-wide recommender, built lazily by get_recommender()
+_recommender = None
+_recommender_lock = threading.Lock()
+
+# Per-user preference profiles kept by the shared recommender. Changes made in this
+# process invalidate entries straight away; the TTL bounds how long another
+# worker process can serve a stale profile.
+PREFERENCE_CACHE_SIZE = 10000
+PREFERENCE_CACHE_TTL = 300  # seconds
+
+# Finished recommendation lists, keyed by preference and candidate fingerprints
+# (see recommendation_cache.py)
+RESULT_CACHE_SIZE = 5000
+RESULT_CACHE_TTL = 600  # seconds
+
+# Per-feature scores of (preference fingerprint, book) pairs, so books other
+# users with the same answers already scored are not scored again
+# (similarity_memo.py); about 300 bytes per pair
+SIMILARITY_MEMO_SIZE = 100000
+SIMILARITY_MEMO_TTL = 3600  # seconds
+
+# Each user's last candidate pool with its per-field partial scores, so an
+# edit to one preference field only re-scores that field (candidate_pool.py)
+POOL_CACHE_SIZE = 1000
+POOL_CACHE_TTL = 900  # seconds
+
+# get_recommendations_bulk scores this many users per dense block
+BULK_SCORE_CHUNK = 512
+# and loads their preferences in IN() batches of this size
+BULK_PREFERENCE_BATCH = 500
+
+# Free-text preference fields compared with the book text. Language, length and
+# maturity are scored as structured features instead (structured_features.py).
+TEXT_PREFERENCE_FIELDS = ('genres', 'theme', 'mood', 'style')
+
+
+def _set_recommender_model(model):
+    global _recommender_model
+    _recommender_model = model
+    # The shared recommender and the book vectors were built on the previous model
+    reset_recommender()
+    book_features.activate(
+        BookFeatureStore(model, BookRecommender(model).get_book_text) if model is not None else None
+    )
+    return model
+
+
+def load_recommender_model(path):
+    """Load the offline-fitted model from disk once for the whole process"""
+    model = None
+    if path and os.path.exists(path):
+        try:
+            model = RecommenderModel.load(path, _memory_budget.dtype)
+            if _memory_budget.max_vocabulary and model.n_features > _memory_budget.max_vocabulary:
+                # Rebuild it with --max-features to keep the stored book vectors valid
+                logger.warning(f"Recommender model has {model.n_features} terms; keeping "
+                               f"{_memory_budget.max_vocabulary} (RECOMMENDER_MAX_VOCABULARY)")
+                model = model.truncated(_memory_budget.max_vocabulary)
+            logger.info(f"Loaded recommender model {model.version} from {path}")
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Could not load recommender model from {path}: {str(e)}")
+    else:
+        logger.warning(f"No recommender model at {path}; vectorizers will be fitted per request")
+    return _set_recommender_model(model)
+
+
+def use_hashing_featurizer(n_features=DEFAULT_HASH_FEATURES):
+    """Featurize with fixed-width hashed terms instead of a fitted model"""
+    model = HashingFeaturizer(_memory_budget.vocabulary_size(n_features), dtype=_memory_budget.dtype)
+    logger.info(f"Using hashing featurizer {model.version} ({model.n_features} features)")
+    return _set_recommender_model(model)
+
+
+def load_featurizer(config):
+    """Set up the featurizer chosen by RECOMMENDER_FEATURIZER ('tfidf' or 'hashing')
+
+    The memory budget (RECOMMENDER_MEMORY_BUDGET etc.) is set up first, as the
+    featurizer is built for it.
+    """
+    set_memory_budget(MemoryBudget.from_config(config))
+    set_token_cache_size(config.get('RECOMMENDER_TOKEN_CACHE_SIZE', DEFAULT_CACHE_SIZE))
+    featurizer = config.get('RECOMMENDER_FEATURIZER', 'tfidf')
+    if featurizer == 'hashing':
+        return use_hashing_featurizer(config.get('RECOMMENDER_HASH_FEATURES', DEFAULT_HASH_FEATURES))
+    if featurizer != 'tfidf':
+        logger.warning(f"Unknown RECOMMENDER_FEATURIZER '{featurizer}'; using the TF-IDF model")
+    return load_recommender_model(config.get('RECOMMENDER_MODEL_PATH'))
+
+
+def set_memory_budget(budget=None):
+    """Switch float32 vectors and the vocabulary/description caps on or off (see memory_budget.py)
+
+    Call load_featurizer() afterwards (it does this itself) so the model uses
+    the new dtype.
+    """
+    global _memory_budget
+    _memory_budget = budget if budget is not None else MemoryBudget()
+    reset_recommender()
+    return _memory_budget
+
+
+def get_memory_budget():
+    return _memory_budget
+
+
+def get_recommender_model():
+    """The model set up by load_featurizer(), or None"""
+    return _recommender_model
+
+
+def load_ann_index(path):
+    """Load the approximate nearest-neighbour index once for the whole process"""
+    global _ann_index
+    _ann_index = None
+    if path and os.path.exists(path):
+        try:
+            _ann_index = IVFIndex.load(path)
+            logger.info(f"Loaded ANN index ({_ann_index.n_lists} lists) from {path}")
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Could not load ANN index from {path}: {str(e)}")
+    return _ann_index
+
+
+def get_ann_index():
+    """The index loaded by load_ann_index(), or None"""
+    return _ann_index
+
+
+def load_collaborative_model(path):
+    """Load the offline-trained reading-list factors once for the whole process"""
+    global _collaborative_model
+    _collaborative_model = None
+    if path and os.path.exists(path):
+        try:
+            _collaborative_model = CollaborativeModel.load(path)
+            logger.info(f"Loaded collaborative model {_collaborative_model.version} "
+                        f"({len(_collaborative_model.user_ids)} users) from {path}")
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Could not load collaborative model from {path}: {str(e)}")
+    # Cached results were scored without (or with other) factors
+    reset_recommender()
+    return _collaborative_model
+
+
+def get_collaborative_model():
+    """The model loaded by load_collaborative_model(), or None"""
+    return _collaborative_model
+
+
+def set_feature_weights(weights=None):
+    """Override the default text/language/length/maturity weights"""
+    global _feature_weights
+    _feature_weights = dict(DEFAULT_FEATURE_WEIGHTS, **(weights or {}))
+    reset_recommender()
+    return _feature_weights
+
+
+def get_recommender():
+    """The long-lived BookRecommender for this process, created on first use"""
+    global _recommender
+    if _recommender is None:
+        with _recommender_lock:
+            if _recommender is None:
+                _recommender = BookRecommender()
+    return _recommender
+
+
+def reset_recommender():
+    """Drop the shared recommender; the next get_recommender() builds a new one"""
+    global _recommender
+    with _recommender_lock:
+        _recommender = None
+
+
+def invalidate_user(user_id):
+    """Forget everything the shared recommender has cached for one user"""
+    if _recommender is not None:
+        _recommender.invalidate_user(user_id)
+
+
+def _on_preferences_changed(mapper, connection, target):
+    invalidate_user(target.user_id)
+
+
+# Keep the shared recommender in step with the UserPreferences table
+for _event_name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(UserPreferences, _event_name, _on_preferences_changed)
+
+
+def top_k_indices(scores, k):
+    """Indices of the k highest scores, best first.
+
+    Uses a partial partition so only the k winners are sorted. Ties are broken by
+    position (earlier candidates first), which matches what a stable
+    sorted(..., reverse=True) over the whole list returns.
+    """
+    scores = np.asarray(scores)
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return np.array([], dtype=np.intp)
+
+    if k < n:
+        # Value of the k-th best score; everything strictly above it is in,
+        # and ties at the boundary are filled in position order
+        threshold = np.partition(scores, n - k)[n - k]
+        above = np.flatnonzero(scores > threshold)
+        tied = np.flatnonzero(scores == threshold)[:k - len(above)]
+        candidates = np.concatenate([above, tied])
+    else:
+        candidates = np.arange(n)
+
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order]
+
+
+class PreferenceProfile:
+    """Everything scoring needs from one UserPreferences row"""
+
+    def __init__(self, text='', match_text='', targets=None, fingerprint=None, fields=None):
+        self.text = text              # Full preference text, also used to build search queries
+        self.match_text = match_text  # Free-text fields compared with the book text
+        self.fields = fields or {}    # The same free text split by field, e.g. {'mood': 'mood:curious'}
+        self.targets = targets if targets is not None else PreferenceTargets()
+        self.fingerprint = fingerprint  # Result cache key, see preference_fingerprint()
+
+    def __bool__(self):
+        return bool(self.match_text.strip()) or bool(self.targets)
+
 
 class BookRecommender:
-    def __init__(self):
-        # Get all user preferences from database
-        self.preferences = UserPreferences.query.all()
-        self.vectorizer = TfidfVectorizer(stop_words='english')
+    def __init__(self, model=None, weights=None, collaborative=None, budget=None):
+        # Fall back to the process-wide models loaded at start-up
+        self.model = model if model is not None else _recommender_model
+        self.collaborative = collaborative if collaborative is not None else _collaborative_model
+        self.weights = dict(weights) if weights is not None else _feature_weights
+        self.budget = budget if budget is not None else _memory_budget
+        # Preference profiles are cached per user and dropped by invalidate_user()
+        self._profiles = TTLCache(maxsize=PREFERENCE_CACHE_SIZE, ttl=PREFERENCE_CACHE_TTL)
+        self._cache_lock = threading.Lock()
+        # Keyed by preference content, so changed preferences never hit old results
+        self.result_cache = RecommendationCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+        # Only used with the pre-fitted model: a per-request vectorizer's
+        # scores depend on the other candidates too
+        self.similarity_memo = SimilarityMemo(SIMILARITY_MEMO_SIZE, SIMILARITY_MEMO_TTL)
+        # Deliberately kept when preferences change: that is when they pay off
+        self._pools = TTLCache(maxsize=POOL_CACHE_SIZE, ttl=POOL_CACHE_TTL)
+
+    def invalidate_user(self, user_id):
+        """Drop cached state for a user whose preferences changed"""
+        with self._cache_lock:
+            self._profiles.pop(user_id, None)
 
     def get_weighted_text(self, text, weight, feature_name):
         """Repeat text to give it more weight in similarity calculation"""
         return f"{feature_name}: {' '.join([text] * weight)}"
 
-    def get_user_preference_text(self, user_id):
+    def load_preferences(self, user_id):
+        """Fetch a user's stored preference profile (one query)"""
+        return UserPreferences.query.filter_by(user_id=user_id).first()
+
+    def get_user_profile(self, user_id, preferences=None):
+        """A user's PreferenceProfile, cached until their preferences change
+
+        Pass an already-loaded UserPreferences row as `preferences` to skip the
+        database lookup.
+        """
+        if preferences is None:
+            with self._cache_lock:
+                cached = self._profiles.get(user_id)
+            if cached is not None:
+                return cached
+            preferences = self.load_preferences(user_id)
+
+        profile = self.build_profile(preferences)
+        with self._cache_lock:
+            self._profiles[user_id] = profile
+        return profile
+
+    def get_user_preference_text(self, user_id, preferences=None):
         """Convert user preferences into a text string with meaningful features"""
-        preference = UserPreferences.query.filter_by(user_id=user_id).first()
+        return self.get_user_profile(user_id, preferences).text
+
+    def build_profile(self, preference):
+        """Turn a UserPreferences row (or None) into a PreferenceProfile"""
+        fields = self.preference_to_fields(preference)
+        return PreferenceProfile(self.preference_to_text(preference),
+                                 ' '.join(fields.values()),
+                                 PreferenceTargets.from_preferences(preference),
+                                 preference_fingerprint(preference),
+                                 fields)
+
+    def preference_to_text(self, preference):
+        """Turn a UserPreferences row into the text used for matching"""
         if not preference:
             return ""
         
@@ -49,107 +371,481 @@ class BookRecommender:
         
         return ' '.join(features).lower()
 
-    def get_book_text(self, book_data):
-        """Convert book data into text with corresponding features"""
-        features = []
+    def preference_to_fields(self, preference):
+        """The free-text preference fields as {field: 'field:value'} texts"""
+        if not preference:
+            return {}
+        return {
+            field: f"{field}:{getattr(preference, field)}".lower()
+            for field in TEXT_PREFERENCE_FIELDS if getattr(preference, field)
+        }
+
+    def preference_to_match_text(self, preference):
+        """The free-text part of the preferences, matched against book text"""
+        return ' '.join(self.preference_to_fields(preference).values())
+
+    def get_book_fields(self, book_data):
+        """Book text split by field ({field: text}, see BOOK_TEXT_FIELDS)"""
+        features = {}
         
         # Match the weighting from user preferences
         if book_data.get('categories'):
-            features.append(self.get_weighted_text(' '.join(book_data['categories']), 1, 'genres'))
+            features['genres'] = self.get_weighted_text(' '.join(book_data['categories']), 1, 'genres')
         
         # Description (can match with user's theme/mood preferences)
         if book_data.get('description'):
-            features.append(self.get_weighted_text(book_data['description'], 1, 'theme'))
-        
-        # Language (direct match with user's language preference)
-        if book_data.get('language'):
-            features.append(f"language: {book_data['language']}")
-        
-        # Page count (corresponds to user's length preference)
-        if book_data.get('pageCount'):
-            page_count = book_data['pageCount']
-            length_category = 'short' if page_count < 200 else 'medium' if page_count < 400 else 'long'
-            features.append(f"length: {length_category}")
+            features['theme'] = self.get_weighted_text(self.budget.truncate(book_data['description']), 1, 'theme')
         
-        # Maturity rating
-        if book_data.get('maturityRating'):
-            features.append(f"maturity: {book_data['maturityRating']}")
+        # Language, page count and maturity are scored as structured
+        # features (see structured_features.py), not as text
         
-        # Add your new feature here, for example:
+        # Add your new feature here (and to BOOK_TEXT_FIELDS), for example:
         if book_data.get('authors'):
-            features.append(f"author: {' '.join(book_data['authors'])}")
+            features['author'] = f"author: {' '.join(book_data['authors'])}"
         
-        return ' '.join(features).lower()
+        return {field: text.lower() for field, text in features.items()}
+
+    def get_book_text(self, book_data):
+        """Convert book data into text with corresponding features"""
+        return ' '.join(self.get_book_fields(book_data).values())
 
-    def calculate_similarity(self, user_id, book_data):
+    def calculate_similarity(self, user_id, book_data, preferences=None):
         """Calculate similarity between user preferences and a book"""
         try:
-            # Get user preferences as text
-            user_text = self.get_user_preference_text(user_id)
-            if not user_text.strip():
-                return 0.0
-
-            # Get book information as text
-            book_text = self.get_book_text(book_data)
-            if not book_text.strip():
-                return 0.0
-
-            # Create new vectorizer instance for each comparison
-            vectorizer = TfidfVectorizer(stop_words='english',
-                                         min_df=1,
-                                         analyzer='word',
-                                         token_pattern=r'\b\w+\b')
-
-            # Fit and transform both texts
-            try:
-                tfidf_matrix = vectorizer.fit_transform([user_text, book_text])
-
-                # Check if we have enough features
-                if tfidf_matrix.shape[1] == 0:
-                    return 0.0
-
-                # Calculate cosine similarity
-                similarity = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])
-                return float(similarity[0][0])
-
-            except ValueError as ve:
-                print(f"Vectorization error: {str(ve)}")
-                return 0.0
+            profile = self.get_user_profile(user_id, preferences)
+            return float(self.score_books(profile, [book_data])[0])
 
         except Exception as e:
             print(f"Error calculating similarity: {str(e)}")
             return 0.0
 
-    def get_recommendations(self, user_id, book_list, num_recommendations=5):
-        """Get top N book recommendations for a user from a list of books"""
+    def vectorize(self, user_texts, book_texts, book_keys=None):
+        """L2-normalised TF-IDF matrices for user texts and book texts
+
+        Uses the pre-fitted model when there is one; otherwise a single
+        vectorizer is fitted on all the texts together. `book_keys` (e.g. book
+        IDs) let the tokens of books seen before come from the token cache.
+        Raises ValueError when the texts contain no usable terms.
+        """
+        if self.model is not None:
+            # Pre-fitted model: transform only, nothing is fitted here
+            return (self.budget.matrix(self.model.transform(user_texts)),
+                    self.budget.matrix(self.model.transform(book_texts, book_keys)))
+
+        # Same terms as TfidfVectorizer(stop_words='english', token_pattern=r'\b\w+\b')
+        tokenizer = default_tokenizer()
+        vectorizer = TfidfVectorizer(min_df=1,
+                                     max_features=self.budget.max_vocabulary,
+                                     analyzer=pretokenized,
+                                     dtype=self.budget.dtype)
+        tfidf_matrix = self.budget.matrix(vectorizer.fit_transform(
+            chain(tokenizer.tokenize_all(user_texts), tokenizer.tokenize_all(book_texts, book_keys))))
+        return tfidf_matrix[:len(user_texts)], tfidf_matrix[len(user_texts):]
+
+    def vectorize_fields(self, user_texts, book_list):
+        """L2-normalised user vectors and the stacked per-field book matrix
+
+        The book matrix has one block of len(book_list) rows per
+        BOOK_TEXT_FIELDS entry, scaled so the blocks add up to the normalised
+        book vectors (see score_breakdown.py). Without a pre-fitted model one
+        vectorizer is fitted on all the texts, with IDF counted over whole
+        books. Raises ValueError when the texts contain no usable terms.
+        """
+        field_texts = stacked_field_texts([self.get_book_fields(book) for book in book_list])
+        field_keys = stacked_field_keys(book_list)
+        if self.model is not None:
+            # Pre-fitted model: transform only, nothing is fitted here
+            return self.budget.matrix(self.model.transform(user_texts)), self.budget.matrix(normalize_field_blocks(
+                self.model.transform_raw(field_texts, field_keys), len(book_list)))
+
+        # Term counts only; the field rows are separate documents to the
+        # vectorizer, so the IDF is worked out below over whole books
+        tokenizer = default_tokenizer()
+        vectorizer = TfidfVectorizer(min_df=1,
+                                     max_features=self.budget.max_vocabulary,
+                                     analyzer=pretokenized,
+                                     use_idf=False,
+                                     norm=None,
+                                     dtype=self.budget.dtype)
+        counts = self.budget.matrix(vectorizer.fit_transform(
+            chain(tokenizer.tokenize_all(user_texts), tokenizer.tokenize_all(field_texts, field_keys))).tocsr())
+        user_counts, field_counts = counts[:len(user_texts)], counts[len(user_texts):]
+        n_books = len(book_list)
+        book_counts = sum(field_counts[i * n_books:(i + 1) * n_books] for i in range(len(BOOK_TEXT_FIELDS)))
+        book_counts = sp.csr_matrix(book_counts)
+        book_counts.eliminate_zeros()
+
+        # Same smoothed IDF as TfidfVectorizer: ln((1 + n) / (1 + df)) + 1
+        n_features = counts.shape[1]
+        df = (np.bincount(user_counts.indices, minlength=n_features)
+              + np.bincount(book_counts.indices, minlength=n_features))
+        idf = sp.diags((np.log((1 + len(user_texts) + n_books) / (1 + df)) + 1).astype(counts.dtype))
+        return (self.budget.matrix(normalize(user_counts @ idf, norm='l2', copy=False)),
+                self.budget.matrix(normalize_field_blocks(field_counts @ idf, n_books)))
+
+    def text_parts(self, user_text, book_list):
+        """Cosine similarity of the user text with every book, split by book field"""
+        if not user_text.strip() or not book_list:
+            return {}
+
         try:
-            similarities = []
+            user_vector, field_matrix = self.vectorize_fields([user_text], book_list)
+        except ValueError as ve:
+            print(f"Vectorization error: {str(ve)}")
+            return {}
+
+        # The field blocks add up to the L2-normalised book rows, so one sparse
+        # product gives every field's share of the cosine for all candidates
+        return field_parts(field_dots(field_matrix, user_vector, len(book_list)))
+
+    def text_scores(self, user_text, book_list):
+        """Cosine similarity of the user text with every book's text"""
+        return sum(self.text_parts(user_text, book_list).values(), np.zeros(len(book_list)))
+
+    def score_parts(self, profile, book_list):
+        """(text parts by field, structured scores by feature, use_text) for every book"""
+        return (self.text_parts(profile.match_text, book_list),
+                score_attributes(profile.targets, BookAttributes.from_books(book_list)),
+                bool(profile.match_text.strip()))
+
+    def uses_collaborative(self, user_id):
+        """Whether a collaborative model is loaded, has a weight and knows the user"""
+        return (self.collaborative is not None and bool(self.weights.get('collaborative'))
+                and self.collaborative.knows_user(user_id))
+
+    def collaborative_scores(self, user_id, book_list):
+        """Reading-list (collaborative) scores for the candidates, or None when they don't apply"""
+        if not self.uses_collaborative(user_id):
+            return None
+        return self.collaborative.scores(user_id, book_list)
+
+    def _add_collaborative(self, user_id, book_list, attribute_scores):
+        scores = self.collaborative_scores(user_id, book_list)
+        if scores is not None:
+            attribute_scores['collaborative'] = scores
+        return attribute_scores
+
+    def result_key(self, user_id, profile):
+        """Result cache key: the preference fingerprint, made per-user when collaborative scores apply"""
+        if not self.uses_collaborative(user_id):
+            return profile.fingerprint
+        return f"{profile.fingerprint}:{self.collaborative.version}:{user_id}"
+
+    def score_books(self, profile, book_list, user_id=None):
+        """Score every book against a user's preferences in one pass
+
+        `profile` is a PreferenceProfile; a plain string is scored as free
+        text only. Text similarity and the structured language/length/maturity
+        scores are mixed with self.weights, as are the user's collaborative
+        scores when `user_id` is given.
+        """
+        if isinstance(profile, str):
+            profile = PreferenceProfile(match_text=profile)
+        if not book_list:
+            return np.zeros(0)
+
+        text_parts, attribute_scores, use_text = self.score_parts(profile, book_list)
+        if user_id is not None:
+            attribute_scores = self._add_collaborative(user_id, book_list, attribute_scores)
+        return combine_scores(sum(text_parts.values(), np.zeros(len(book_list))),
+                              attribute_scores, self.weights, use_text)
+
+    def local_candidates(self, user_id, preferences=None):
+        """Candidate books from the local catalog, via its inverted indexes (see catalog_index.py)"""
+        profile = self.get_user_profile(user_id, preferences)
+        if not profile:
+            return []
+        return get_catalog_index().candidates(preference_terms(profile.fields), profile.targets.languages)
+
+    def get_pool_books(self, user_id, queries):
+        """The user's last candidate books if they came from these same search queries"""
+        pool = self._pools.get(user_id)
+        if pool is None or not queries or pool.queries != tuple(queries):
+            return None
+        return pool.book_list
+
+    def score_pool(self, user_id, profile, book_list, candidates_fp, queries=None):
+        """Score the user's candidate pool, reusing partial scores from their last request
+
+        Needs the pre-fitted model (a per-request vectorizer changes with the
+        user text, so nothing could be reused).
+        """
+        with self._cache_lock:
+            pool = self._pools.get(user_id)
+            if (pool is None or pool.candidates_fp != candidates_fp
+                    or pool.model_version != self.model.version):
+                field_texts = stacked_field_texts([self.get_book_fields(book) for book in book_list])
+                field_matrix = normalize_field_blocks(
+                    self.model.transform_raw(field_texts, stacked_field_keys(book_list)), len(book_list))
+                pool = CandidatePool(queries, book_list, candidates_fp, field_matrix,
+                                     BookAttributes.from_books(book_list), self.model.version)
+                self._pools[user_id] = pool
+            elif queries:
+                pool.queries = tuple(queries)
+
+        with pool.lock:
+            return pool.score_parts(profile, self.model)
+
+    def memoized_parts(self, user_id, profile, book_list, candidates_fp, queries=None):
+        """score_pool(), skipping the books already scored for these preferences (see similarity_memo.py)"""
+        memo = self.similarity_memo
+        rows = memo.lookup(profile.fingerprint, self.model.version, book_list)
+        missing = [position for position, row in enumerate(rows) if row is None]
+        use_text = bool(profile.match_text.strip())
+
+        if len(missing) == len(book_list):
+            # Nothing seen with these preferences: the user's pool may still
+            # have the fields that didn't change
+            text_parts, attribute_scores, use_text = self.score_pool(user_id, profile, book_list,
+                                                                     candidates_fp, queries)
+            memo.store(profile.fingerprint, self.model.version, book_list, text_parts, attribute_scores)
+            return text_parts, attribute_scores, use_text
+
+        if missing:
+            new_books = [book_list[position] for position in missing]
+            text_parts, attribute_scores, _ = self.score_parts(profile, new_books)
+            new_rows = memo.store(profile.fingerprint, self.model.version, new_books, text_parts, attribute_scores)
+            for position, row in zip(missing, new_rows):
+                rows[position] = row
+        text_parts, attribute_scores = memo.assemble(rows)
+        return text_parts, attribute_scores, use_text
 
-            for book in book_list:
-                similarity = self.calculate_similarity(user_id, book)
-                similarities.append({
-                    'book': book,
-                    'similarity': similarity
-                })
+    def get_recommendations(self, user_id, book_list, num_recommendations=5, preferences=None, queries=None,
+                            explain=False):
+        """Get top N book recommendations for a user from a list of books
 
-            # Sort by similarity score
-            sorted_recommendations = sorted(
-                similarities,
-                key=lambda x: x['similarity'],
-                reverse=True
-            )
+        The user's preferences are resolved once for the whole call; pass the
+        UserPreferences row as `preferences` if the caller already has it.
+        Results for the same preferences and candidate IDs come from the
+        result cache without scoring. With a pre-fitted model the candidate
+        pool is kept per user, so when only some preference fields changed
+        since the last call just those are re-scored, and books already
+        scored for the same preferences (by any user) come from the
+        similarity memo. Pass the search
+        `queries` the candidates came from so get_pool_books() can reuse them.
 
-            # Return top N recommendations
-            return sorted_recommendations[:num_recommendations]
+        With explain=True each result also carries an 'explanation': every
+        feature's share of its similarity (genres, theme, author, language,
+        length, maturity), taken from the same scoring pass.
+        """
+        try:
+            profile = self.get_user_profile(user_id, preferences)
+            return self._with_explanations(self._recommend(user_id, profile, book_list, num_recommendations,
+                                                           queries), explain)
 
         except Exception as e:
             print(f"Error getting recommendations: {str(e)}")
             return []
 
-    def debug_similarity(self, user_id, book_data):
+    def _recommend(self, user_id, profile, book_list, num_recommendations, queries=None):
+        """get_recommendations() for an already resolved profile, explanations included"""
+        result_key = self.result_key(user_id, profile)
+        candidates_fp = candidate_fingerprint(book_list)
+        cached = self.result_cache.get(result_key, candidates_fp, num_recommendations)
+        if cached is None:
+            cached = self._score_recommendations(user_id, profile, book_list, num_recommendations,
+                                                 candidates_fp, queries, result_key)
+        return cached
+
+    def _rank(self, user_id, book_list, text_parts, attribute_scores, use_text, num_recommendations):
+        """The top N of book_list, given its text parts and structured scores
+
+        Every scoring path ends here, so they all add the user's collaborative
+        scores and mix the features the same way.
+        """
+        attribute_scores = self._add_collaborative(user_id, book_list, attribute_scores)
+        scores = combine_scores(sum(text_parts.values(), np.zeros(len(book_list))),
+                                attribute_scores, self.weights, use_text)
+
+        # Only the winners are sorted and turned into result dicts. Their
+        # explanations are read off the arrays the scores came from.
+        return [
+            {
+                'book': book_list[index],
+                'similarity': float(scores[index]),
+                'explanation': explain_score(text_parts, attribute_scores, self.weights, index, use_text)
+            }
+            for index in top_k_indices(scores, num_recommendations)
+        ]
+
+    def rank_books(self, user_id, profile, book_list, num_recommendations=5, explain=False):
+        """Top N of book_list scored directly, bypassing the result cache, candidate pool and memo
+
+        For the few books a caller already narrowed down (the streaming top k);
+        with the pre-fitted model their scores don't depend on the other books.
+        """
+        if not book_list:
+            return []
+        text_parts, attribute_scores, use_text = self.score_parts(profile, book_list)
+        return self._with_explanations(self._rank(user_id, book_list, text_parts, attribute_scores, use_text,
+                                                  num_recommendations), explain)
+
+    def _score_recommendations(self, user_id, profile, book_list, num_recommendations, candidates_fp, queries,
+                               result_key):
+        if self.model is not None and book_list:
+            text_parts, attribute_scores, use_text = self.memoized_parts(user_id, profile, book_list,
+                                                                         candidates_fp, queries)
+        else:
+            text_parts, attribute_scores, use_text = self.score_parts(profile, book_list)
+        recommendations = self._rank(user_id, book_list, text_parts, attribute_scores, use_text,
+                                     num_recommendations)
+        if book_list:
+            # An empty pool usually means the fetch failed; don't remember that
+            self.result_cache.put(result_key, candidates_fp, num_recommendations, recommendations)
+        return recommendations
+
+    @staticmethod
+    def _with_explanations(recommendations, explain):
+        if explain:
+            return recommendations
+        return [{key: value for key, value in rec.items() if key != 'explanation'} for rec in recommendations]
+
+    def get_cached_recommendations(self, user_id, num_recommendations=5, preferences=None, explain=False):
+        """The last results for these preferences, or None
+
+        Lets a repeat form submission skip fetching candidates altogether: the
+        cache remembers which candidate pool the same preferences were last
+        scored against.
+        """
+        profile = self.get_user_profile(user_id, preferences)
+        cached = self.result_cache.latest(self.result_key(user_id, profile), num_recommendations)
+        return self._with_explanations(cached, explain) if cached is not None else None
+
+    def load_preferences_bulk(self, user_ids):
+        """Fetch preference rows for many users, keyed by user_id"""
+        preferences = {}
+        user_ids = list(user_ids)
+        for start in range(0, len(user_ids), BULK_PREFERENCE_BATCH):
+            batch = user_ids[start:start + BULK_PREFERENCE_BATCH]
+            for preference in UserPreferences.query.filter(UserPreferences.user_id.in_(batch)).all():
+                preferences[preference.user_id] = preference
+        return preferences
+
+    def get_recommendations_bulk(self, user_ids, book_list, k=5, preferences=None):
+        """Top-k recommendations for many users over one shared candidate set
+
+        Returns {user_id: [{'book', 'similarity'}, ...]}, each list exactly
+        what get_recommendations() returns for that user. With the pre-fitted
+        model all users and all books are vectorized once and the text scores
+        come from a single sparse matrix product per block of users; the
+        structured and collaborative scores are added per user by the same
+        code as get_recommendations(). Without the model the IDF depends on
+        each user's text, so every user is scored on their own.
+
+        Pass `preferences` ({user_id: UserPreferences}) when the caller has
+        them already; otherwise they are loaded in batches.
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return {}
+
+        if preferences is None:
+            preferences = self.load_preferences_bulk(user_ids)
+        profiles = [self.build_profile(preferences.get(user_id)) for user_id in user_ids]
+        if self.model is None or not book_list:
+            return {
+                user_id: self._with_explanations(self._recommend(user_id, profile, book_list, k), False)
+                for user_id, profile in zip(user_ids, profiles)
+            }
+
+        user_texts = [profile.match_text for profile in profiles]
+        attributes = BookAttributes.from_books(book_list)
+
+        user_matrix = None
+        if any(text.strip() for text in user_texts):
+            user_matrix, book_matrix = self.vectorize(user_texts,
+                                                      [self.get_book_text(book) for book in book_list],
+                                                      [book.get('id') for book in book_list])
+            book_matrix_t = book_matrix.T.tocsr()
+
+        results = {}
+        for start in range(0, len(user_ids), BULK_SCORE_CHUNK):
+            chunk_ids = user_ids[start:start + BULK_SCORE_CHUNK]
+            if user_matrix is not None:
+                # (users x terms) @ (terms x books) -> one dense block of cosine scores
+                scores = (user_matrix[start:start + BULK_SCORE_CHUNK] @ book_matrix_t).toarray()
+
+            for row, user_id in enumerate(chunk_ids):
+                profile = profiles[start + row]
+                use_text = bool(profile.match_text.strip())
+                text_parts = {'text': scores[row].astype(np.float64)} if use_text else {}
+                results[user_id] = self._with_explanations(
+                    self._rank(user_id, book_list, text_parts,
+                               score_attributes(profile.targets, attributes), use_text, k),
+                    False
+                )
+        return results
+
+    def catalog_ready(self):
+        """Whether the local catalog has stored vectors for this recommender's model"""
+        store = book_features.get_active_store()
+        return self.model is not None and store is not None and store.model is self.model
+
+    def recommend_from_catalog(self, user_id, num_recommendations=5, preferences=None, explain=False):
+        """Top N books from the local catalog using the stored book vectors
+
+        Only the user's preference text is vectorized; books are scored with a
+        dot product against their precomputed vectors. When an ANN index built
+        for the current model is loaded and the catalog is large enough for it
+        to pay off, only the books in the closest clusters are scored;
+        otherwise the whole catalog is scored exactly. The
+        structured and collaborative scores are mixed in as in
+        get_recommendations(), and books are keyed by their candidate ID.
+        With explain=True the text similarity is one 'text' share, as the
+        stored vectors aren't split by field. Returns [] when there is no
+        pre-fitted model (and therefore no stored vectors).
+        """
+        if not self.catalog_ready():
+            return []
+
+        profile = self.get_user_profile(user_id, preferences)
+        catalog = book_features.get_active_store().load()
+        if not profile or len(catalog) == 0:
+            return []
+
+        return self._with_explanations(self._score_catalog(user_id, profile, catalog, num_recommendations),
+                                       explain)
+
+    def _score_catalog(self, user_id, profile, catalog, num_recommendations):
+        user_vector = self.model.transform([profile.match_text])
+        index = _ann_index
+        if index is not None and index.applies_to(catalog, self.model.version):
+            positions, text_scores = index.candidates(user_vector, catalog)
+        else:
+            positions = np.arange(len(catalog))
+            text_scores = (catalog.matrix @ user_vector.T).toarray().ravel()
+        use_text = bool(profile.match_text.strip())
+
+        # Only books the candidate filter lets into the catalog index, as for
+        # local_candidates()
+        admitted = np.isin(catalog.book_ids[positions], get_catalog_index().book_ids)
+        positions, text_scores = positions[admitted], text_scores[admitted]
+
+        # Stand-ins carrying the candidate ID (for the collaborative scores);
+        # only the winners are read back from the Book table
+        candidates = [{'id': key, 'book_id': book_id}
+                      for key, book_id in zip(catalog.keys[positions].tolist(), catalog.book_ids[positions].tolist())]
+        ranked = self._rank(user_id, candidates,
+                            {'text': text_scores.astype(np.float64)} if use_text else {},
+                            score_attributes(profile.targets, catalog.attributes.take(positions)),
+                            use_text, num_recommendations)
+        books = {book.id: book for book in Book.query.filter(
+            Book.id.in_([rec['book']['book_id'] for rec in ranked])
+        ).all()}
+        return [
+            dict(rec, book=candidate_book(books[rec['book']['book_id']]))
+            for rec in ranked
+            if rec['book']['book_id'] in books
+        ]
+
+    def debug_similarity(self, user_id, book_data, preferences=None):
         """Debug method to see how features are matching"""
-        user_text = self.get_user_preference_text(user_id)
+        if preferences is None:
+            preferences = self.load_preferences(user_id)
+        user_text = self.get_user_preference_text(user_id, preferences)
         book_text = self.get_book_text(book_data)
+        # One scoring pass gives both the score and its breakdown
+        results = self.get_recommendations(user_id, [book_data], 1, preferences, explain=True)
         
         print("\nUser Preferences:")
         print("-" * 50)
@@ -157,72 +853,19 @@ class BookRecommender:
         print("\nBook Features:")
         print("-" * 50)
         print(book_text)
-        print("\nSimilarity Score:", self.calculate_similarity(user_id, book_data))
+        print("\nSimilarity Score:", results[0]['similarity'] if results else 0.0)
+        if results:
+            print("\nScore by Feature:")
+            print("-" * 50)
+            for feature, share in results[0]['explanation'].items():
+                print(f"{feature}: {share:.4f}")
 
     def process_google_books_response(self, books):
-        """Process and clean the Google Books API response"""
-        processed_books = []
-        for book in books:
-            volume_info = book.get('volumeInfo', {})
-            
-            # Skip books without essential information
-            if not all([
-                volume_info.get('title'),
-                volume_info.get('authors'),
-                volume_info.get('description')
-            ]):
-                continue
-            
-            # Strict category filtering
-            categories = [cat.lower() for cat in volume_info.get('categories', [])]
-            if not any(cat in ' '.join(categories) for cat in [
-                'fiction',
-                'adventure',
-                'action and adventure',
-                'juvenile fiction'
-            ]):
-                continue
-            
-            # Skip non-fiction and educational materials
-            if any(cat in ' '.join(categories) for cat in [
-                'non-fiction',
-                'education',
-                'textbook',
-                'manual',
-                'guide',
-                'science',
-                'copyright'
-            ]):
-                continue
-            
-            # Check description for adventure content
-            description = volume_info.get('description', '').lower()
-            if not any(term in description for term in [
-                'adventure',
-                'quest',
-                'journey',
-                'expedition',
-                'explore',
-                'discovery'
-            ]):
-                continue
-            
-            processed_book = {
-                'id': book['id'],
-                'title': volume_info['title'],
-                'authors': volume_info['authors'],
-                'categories': categories,
-                'description': description,
-                'language': volume_info.get('language', 'unknown'),
-                'pageCount': volume_info.get('pageCount', 0),
-                'averageRating': volume_info.get('averageRating', 0),
-                'maturityRating': volume_info.get('maturityRating', 'NOT_MATURE'),
-                'series': 'series' if 'series' in volume_info.get('title', '').lower() else 'standalone'
-            }
-            
-            processed_books.append(processed_book)
-        
-        return processed_books
+        """Process and clean the Google Books API response
+
+        The filter rules are compiled once (see candidate_filter.py).
+        """
+        return get_candidate_filter().process(books)
 
 # Example usage
 if __name__ == "__main__":
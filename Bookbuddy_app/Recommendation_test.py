@@ -5,6 +5,7 @@ import requests
 import os
 from dotenv import load_dotenv
 from models import User, UserPreferences
+from candidate_filter import get_candidate_filter
 import logging
 
 # Load environment variables
@@ -85,69 +86,11 @@ def fetch_books_from_google_api(query, user_prefs=None, max_results=40):
         return []
 
 def process_google_books_response(books):
-    """Process and clean the Google Books API response"""
-    processed_books = []
-    for book in books:
-        volume_info = book.get('volumeInfo', {})
-        
-        # Skip books without essential information
-        if not all([
-            volume_info.get('title'),
-            volume_info.get('authors'),
-            volume_info.get('description')
-        ]):
-            continue
-        
-        # Strict category filtering
-        categories = [cat.lower() for cat in volume_info.get('categories', [])]
-        if not any(cat in ' '.join(categories) for cat in [
-            'fiction',
-            'adventure',
-            'action and adventure',
-            'juvenile fiction'
-        ]):
-            continue
-            
-        # Skip non-fiction and educational materials
-        if any(cat in ' '.join(categories) for cat in [
-            'non-fiction',
-            'education',
-            'textbook',
-            'manual',
-            'guide',
-            'science',
-            'copyright'
-        ]):
-            continue
-        
-        # Check description for adventure content
-        description = volume_info.get('description', '').lower()
-        if not any(term in description for term in [
-            'adventure',
-            'quest',
-            'journey',
-            'expedition',
-            'explore',
-            'discovery'
-        ]):
-            continue
-        
-        processed_book = {
-            'id': book['id'],
-            'title': volume_info['title'],
-            'authors': volume_info['authors'],
-            'categories': categories,
-            'description': description,
-            'language': volume_info.get('language', 'unknown'),
-            'pageCount': volume_info.get('pageCount', 0),
-            'averageRating': volume_info.get('averageRating', 0),
-            'maturityRating': volume_info.get('maturityRating', 'NOT_MATURE'),
-            'series': 'series' if 'series' in volume_info.get('title', '').lower() else 'standalone'
-        }
-        
-        processed_books.append(processed_book)
-    
-    return processed_books
+    """Process and clean the Google Books API response
+
+    The filter rules are compiled once (see candidate_filter.py).
+    """
+    return get_candidate_filter().process(books)
 
 def test_recommendation_system():
     """Test the recommendation system"""
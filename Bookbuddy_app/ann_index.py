@@ -0,0 +1,191 @@
+"""Approximate nearest-neighbour index over stored book vectors.
+
+A clustered (IVF) index written with NumPy/SciPy only: book vectors are grouped
+with spherical k-means, and a query is only scored exactly against the books in
+its `n_probe` closest clusters. Centroids are kept sparse (the heaviest terms
+only) so the index stays small for large vocabularies.
+
+Built offline with 'python build_recommender.py index', saved as a versioned
+.npz file and loaded at start-up. When no index exists, it was built for a
+different model or the catalog is smaller than MIN_INDEXED_BOOKS, the
+recommender scores the catalog exactly instead.
+"""
+import numpy as np
+import scipy.sparse as sp
+from sklearn.preprocessing import normalize
+
+# Bump this whenever the on-disk layout changes
+INDEX_FORMAT_VERSION = 1
+
+# recall@10 of about 0.99 on the synthetic catalogs of bench_ann.py from 20k
+# books up (0.76 at 2k); probing fewer clusters loses recall faster than it
+# saves time
+DEFAULT_N_PROBE = 8
+# Smaller catalogs are scored exactly: exact scoring takes 3.3 ms at 20k books,
+# the same as probing 8 clusters, while at 50k it is 1.5x and at 100k 4x
+# slower than probing (bench_ann.py)
+MIN_INDEXED_BOOKS = 50_000
+DEFAULT_CENTROID_TERMS = 256
+# Rows scored against the centroids at once while clustering
+ASSIGN_CHUNK = 4096
+
+
+def _prune_rows(matrix, max_terms):
+    """Keep the `max_terms` largest weights in each row, then re-normalise"""
+    matrix = matrix.tocsr()
+    rows = []
+    for start, end in zip(matrix.indptr[:-1], matrix.indptr[1:]):
+        data = matrix.data[start:end]
+        indices = matrix.indices[start:end]
+        if len(data) > max_terms:
+            keep = np.argpartition(data, len(data) - max_terms)[len(data) - max_terms:]
+            data, indices = data[keep], indices[keep]
+        rows.append((data, indices))
+
+    indptr = np.zeros(len(rows) + 1, dtype=np.int32)
+    np.cumsum([len(data) for data, _ in rows], out=indptr[1:])
+    pruned = sp.csr_matrix(
+        (np.concatenate([data for data, _ in rows]).astype(np.float32),
+         np.concatenate([indices for _, indices in rows]).astype(np.int32),
+         indptr),
+        shape=matrix.shape
+    )
+    pruned.sort_indices()
+    return normalize(pruned, norm='l2', copy=False)
+
+
+def _assign(matrix, centroids):
+    """Closest centroid (highest cosine) for every row"""
+    centroids_t = centroids.T.tocsr()
+    labels = np.empty(matrix.shape[0], dtype=np.int32)
+    for start in range(0, matrix.shape[0], ASSIGN_CHUNK):
+        block = (matrix[start:start + ASSIGN_CHUNK] @ centroids_t).toarray()
+        labels[start:start + ASSIGN_CHUNK] = block.argmax(axis=1)
+    return labels
+
+
+class IVFIndex:
+    def __init__(self, centroids, list_offsets, list_book_ids, model_version, n_probe=DEFAULT_N_PROBE):
+        self.centroids = centroids.tocsr()
+        self.list_offsets = np.asarray(list_offsets, dtype=np.int64)
+        self.list_book_ids = np.asarray(list_book_ids, dtype=np.int64)
+        self.model_version = str(model_version)
+        self.n_probe = int(n_probe)
+        self._centroids_t = self.centroids.T.tocsr()
+        self._unindexed = None
+
+    @property
+    def n_lists(self):
+        return self.centroids.shape[0]
+
+    @classmethod
+    def build(cls, catalog, model_version, n_lists=None, n_iter=10,
+              centroid_terms=DEFAULT_CENTROID_TERMS, n_probe=DEFAULT_N_PROBE, seed=0):
+        """Cluster a CatalogVectors matrix with spherical k-means"""
+        matrix = catalog.matrix.tocsr()
+        n_books = matrix.shape[0]
+        if n_books == 0:
+            raise ValueError("Cannot build an index over an empty catalog")
+        if n_lists is None:
+            # Roughly sqrt(n) lists keeps both probing and list scans short
+            n_lists = int(np.sqrt(n_books))
+        n_lists = max(1, min(n_lists, n_books))
+
+        rng = np.random.default_rng(seed)
+        centroids = _prune_rows(matrix[rng.choice(n_books, n_lists, replace=False)], centroid_terms)
+
+        for _ in range(n_iter):
+            labels = _assign(matrix, centroids)
+            membership = sp.csr_matrix(
+                (np.ones(n_books, dtype=np.float32), (labels, np.arange(n_books))),
+                shape=(n_lists, n_books)
+            )
+            sums = (membership @ matrix).tocsr()
+
+            # Re-seed clusters that lost all their members
+            empty = np.flatnonzero(np.diff(sums.indptr) == 0)
+            if len(empty):
+                reseed = matrix[rng.choice(n_books, len(empty), replace=False)]
+                sums = sums.tolil()
+                for row, cluster in enumerate(empty):
+                    sums[cluster] = reseed[row]
+                sums = sums.tocsr()
+            centroids = _prune_rows(sums, centroid_terms)
+
+        # Final routing uses the same pruned centroids as queries will
+        labels = _assign(matrix, centroids)
+        order = np.argsort(labels, kind='stable')
+        list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=n_lists), out=list_offsets[1:])
+        return cls(centroids, list_offsets, catalog.book_ids[order], model_version, n_probe)
+
+    def applies_to(self, catalog, model_version):
+        """Whether probing beats scoring this catalog exactly (and the index fits the model)"""
+        return self.model_version == model_version and len(catalog) >= MIN_INDEXED_BOOKS
+
+    def _unindexed_positions(self, catalog):
+        # Catalog rows for books added after the index was built. Worked out
+        # once per loaded catalog rather than on every query.
+        cached = self._unindexed
+        if cached is not None and cached[0] is catalog:
+            return cached[1]
+        positions = np.flatnonzero(~np.isin(catalog.book_ids, self.list_book_ids))
+        self._unindexed = (catalog, positions)
+        return positions
+
+    def candidates(self, query, catalog, n_probe=None):
+        """Catalog row positions worth scoring for a 1 x n_features query, with their scores
+
+        Only books in the `n_probe` closest clusters are scored. Books added to
+        the catalog after the index was built are not in any cluster yet, so
+        they are always scored as well.
+        """
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        centroid_scores = (query @ self._centroids_t).toarray().ravel()
+        probe = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+
+        candidate_ids = np.concatenate(
+            [self.list_book_ids[self.list_offsets[i]:self.list_offsets[i + 1]] for i in probe]
+        )
+        # Map book IDs to catalog rows (catalog.book_ids is sorted); books
+        # deleted since the build simply drop out
+        positions = np.searchsorted(catalog.book_ids, candidate_ids)
+        found = positions < len(catalog)
+        found[found] = catalog.book_ids[positions[found]] == candidate_ids[found]
+        positions = np.union1d(positions[found], self._unindexed_positions(catalog))
+
+        scores = (catalog.matrix[positions] @ query.T).toarray().ravel()
+        return positions, scores
+
+    def save(self, path):
+        """Write the index to a versioned .npz file"""
+        with open(path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                format_version=np.array(INDEX_FORMAT_VERSION),
+                model_version=np.array(self.model_version),
+                n_probe=np.array(self.n_probe),
+                centroid_shape=np.array(self.centroids.shape),
+                centroid_data=self.centroids.data,
+                centroid_indices=self.centroids.indices,
+                centroid_indptr=self.centroids.indptr,
+                list_offsets=self.list_offsets,
+                list_book_ids=self.list_book_ids
+            )
+
+    @classmethod
+    def load(cls, path):
+        """Read an index written by save(), rejecting unknown format versions"""
+        with np.load(path, allow_pickle=False) as data:
+            format_version = int(data['format_version'])
+            if format_version != INDEX_FORMAT_VERSION:
+                raise ValueError(
+                    f"Unsupported ANN index format {format_version} "
+                    f"(expected {INDEX_FORMAT_VERSION}); rebuild it with build_recommender.py"
+                )
+            centroids = sp.csr_matrix(
+                (data['centroid_data'], data['centroid_indices'], data['centroid_indptr']),
+                shape=tuple(data['centroid_shape'])
+            )
+            return cls(centroids, data['list_offsets'], data['list_book_ids'],
+                       str(data['model_version']), int(data['n_probe']))
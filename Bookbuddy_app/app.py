@@ -10,11 +10,21 @@ import logging  # For keeping track of what's happening in the app
 from routes.books import books_bp  # Book-related routes
 import os  # For interacting with the operating system
 from dotenv import load_dotenv  # For loading secret settings
-from Recommendation import BookRecommender
+from Recommendation import (
+    get_recommender, load_featurizer, load_ann_index, load_collaborative_model, set_feature_weights, record_peak_rss
+)
 from Recommendation_test import get_search_queries_from_preferences, fetch_books_from_google_api, process_google_books_response
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 from models import User, UserPreferences, ReadingList, Book
+from precompute import load_precomputed, save_precomputed
+from candidate_filter import load_candidate_filter
+from recommendation_stream import can_stream, fetch_pages, stream_recommendations
+from cooccurrence import load_cooccurrence_index, get_cooccurrence_index, also_added
+from catalog_index import candidate_id
+from book_features import EXTERNAL_ID_MARKER
+from request_timing import RequestTimer, latency_snapshot
+from itertools import chain
 
 
 # Load secret settings from .env file
@@ -44,6 +54,14 @@ from models import User, Book, ReadingList, UserPreferences
 # Add the books blueprint - this organizes our book-related routes
 app.register_blueprint(books_bp, url_prefix='/books')
 
+# Load the recommender featurizer (and its optional ANN index) once for this process
+load_featurizer(app.config)
+set_feature_weights(app.config['RECOMMENDER_FEATURE_WEIGHTS'])
+load_ann_index(app.config['RECOMMENDER_INDEX_PATH'])
+load_collaborative_model(app.config['RECOMMENDER_CF_PATH'])
+load_candidate_filter(app.config)
+load_cooccurrence_index(app.config)
+
 
 # Tell Flask-Login how to find a specific user
 @login_manager.user_loader
@@ -64,99 +82,247 @@ def homepage():
 def form():
     return render_template('form page/form.html')
 
+def find_listed_book(external_book_id, local_id=None):
+    """The Book row a recommended book is listed as: its own row when it came from
+    the local catalog, otherwise the row saved for its Google Books ID (or None)"""
+    if local_id:
+        return Book.query.get(local_id)
+    return Book.query.filter_by(summary=f"{EXTERNAL_ID_MARKER} {external_book_id}").first()
+
+def add_reading_status(recommendations):
+    """Mark each recommended book with its status on the current user's reading list"""
+    for rec in recommendations:
+        book = find_listed_book(rec['book']['id'], rec['book'].get('local_id'))
+        reading_list_entry = ReadingList.query.filter_by(
+            user_id=current_user.id,
+            book_id=book.id
+        ).first() if book else None
+        rec['reading_status'] = reading_list_entry.status if reading_list_entry else None
+
+def add_also_added(recommendations):
+    """Attach the books other readers most often listed with each recommended book"""
+    found = also_added([rec['book']['id'] for rec in recommendations], limit=3)
+    for rec in recommendations:
+        rec['also_added'] = [{'id': book.id, 'title': book.title} for book in found[rec['book']['id']]]
+
 @app.route('/recommendation', methods=['GET', 'POST'])
 @login_required
 def recommendation():
     if request.method == 'POST':
+        # Named spans for each stage, logged and added to the latency
+        # histograms when the request finishes (see request_timing.py)
+        timer = RequestTimer('recommendation', user_id=current_user.id)
         try:
             # Save preferences to database
-            preferences = UserPreferences.query.filter_by(user_id=current_user.id).first()
+            with timer.span('save_preferences'):
+                preferences = UserPreferences.query.filter_by(user_id=current_user.id).first()
             
-            # Convert lists to comma-separated strings
-            themes = ','.join(request.form.getlist('themes')) if request.form.getlist('themes') else ''
-            genres = ','.join(request.form.getlist('genres')) if request.form.getlist('genres') else ''
-            languages = ','.join(request.form.getlist('preferred_languages')) if request.form.getlist('preferred_languages') else ''
+                # Convert lists to comma-separated strings
+                themes = ','.join(request.form.getlist('themes')) if request.form.getlist('themes') else ''
+                genres = ','.join(request.form.getlist('genres')) if request.form.getlist('genres') else ''
+                languages = ','.join(request.form.getlist('preferred_languages')) if request.form.getlist('preferred_languages') else ''
             
-            if preferences:
-                preferences.style = request.form.get('series', '')
-                preferences.theme = themes
-                preferences.mood = request.form.get('mood', '')
-                preferences.length = request.form.get('length', '')
-                preferences.maturity = request.form.get('maturity_rating', '')
-                preferences.genres = genres
-                preferences.language = languages
-                preferences.pace = request.form.get('pace', '')
-            else:
-                preferences = UserPreferences(
-                    user_id=current_user.id,
-                    style=request.form.get('series', ''),
-                    theme=themes,
-                    mood=request.form.get('mood', ''),
-                    length=request.form.get('length', ''),
-                    maturity=request.form.get('maturity_rating', ''),
-                    genres=genres,
-                    language=languages,
-                    pace=request.form.get('pace', '')
-                )
-                db.session.add(preferences)
+                if preferences:
+                    preferences.style = request.form.get('series', '')
+                    preferences.theme = themes
+                    preferences.mood = request.form.get('mood', '')
+                    preferences.length = request.form.get('length', '')
+                    preferences.maturity = request.form.get('maturity_rating', '')
+                    preferences.genres = genres
+                    preferences.language = languages
+                    preferences.pace = request.form.get('pace', '')
+                else:
+                    preferences = UserPreferences(
+                        user_id=current_user.id,
+                        style=request.form.get('series', ''),
+                        theme=themes,
+                        mood=request.form.get('mood', ''),
+                        length=request.form.get('length', ''),
+                        maturity=request.form.get('maturity_rating', ''),
+                        genres=genres,
+                        language=languages,
+                        pace=request.form.get('pace', '')
+                    )
+                    db.session.add(preferences)
             
-            db.session.commit()
+                db.session.commit()
 
-            # Create recommender instance
-            recommender = BookRecommender()
+            # Shared, long-lived recommender for this process
+            recommender = get_recommender()
             
-            # Get user preferences
-            user_prefs = recommender.get_user_preference_text(current_user.id)
-            
-            # Log the full text of user preferences
-            logger.debug(f"User Preferences Text for User {current_user.id}: {user_prefs}")
+            # Same answers as a recent submission? Reuse those results
+            # without asking Google Books or the scorer again
+            with timer.span('cached_results'):
+                recommendations = recommender.get_cached_recommendations(
+                    current_user.id,
+                    num_recommendations=5,
+                    preferences=preferences,
+                    explain=app.config['RECOMMENDER_EXPLAIN']
+                )
+            if recommendations is not None:
+                timer.annotate(source='result_cache')
+            else:
+                # Generated offline for these same answers? Use those
+                with timer.span('precomputed_results'):
+                    recommendations = load_precomputed(current_user.id, preferences)
+                if recommendations is not None:
+                    timer.annotate(source='precomputed')
+            if recommendations is None:
+                timer.annotate(source='scored')
+                # Get user preferences (reuse the row we just saved)
+                with timer.span('query_generation') as span:
+                    user_prefs = recommender.get_user_preference_text(current_user.id, preferences)
             
-            # Get search queries
-            search_queries = get_search_queries_from_preferences(user_prefs)
+                    # Log the full text of user preferences
+                    logger.debug(f"User Preferences Text for User {current_user.id}: {user_prefs}")
             
-            # Log the search queries
-            logger.debug(f"Search Queries for User {current_user.id}: {search_queries}")
+                    # Get search queries
+                    search_queries = get_search_queries_from_preferences(user_prefs)
+                    span['queries'] = len(search_queries)
             
-            # Fetch and process books
-            all_books = []
-            for query in search_queries:
-                books = fetch_books_from_google_api(query)
-                processed_books = process_google_books_response(books)
-                all_books.extend(processed_books)
+                # Log the search queries
+                logger.debug(f"Search Queries for User {current_user.id}: {search_queries}")
+
+                # Fetching and filtering a query's books, each in a span of its
+                # own ('google_fetch' / 'filter'), streamed or not
+                def timed_fetch(query):
+                    with timer.span('google_fetch', query=query) as span:
+                        books = fetch_books_from_google_api(query)
+                        span['books'] = len(books)
+                        return books
+
+                def timed_filter(books):
+                    with timer.span('filter', books=len(books)) as span:
+                        processed_books = process_google_books_response(books)
+                        span['kept'] = len(processed_books)
+                        return processed_books
             
-            # Remove duplicates
-            unique_books = {book['id']: book for book in all_books}.values()
-            all_books = list(unique_books)
+                candidates = None  # books the stream scored, when it runs
+
+                # Only fields like length or language changed? Then the searches
+                # are the same as last time and the books found can be reused
+                with timer.span('pool_lookup') as span:
+                    all_books = recommender.get_pool_books(current_user.id, search_queries)
+                    span['hit'] = all_books is not None
+                if all_books is None:
+                    # Books from the local catalog first; Google Books is only
+                    # asked when there are too few of them
+                    with timer.span('local_candidates') as span:
+                        all_books = recommender.local_candidates(current_user.id, preferences)
+                        span['books'] = len(all_books)
+                    if (len(all_books) >= app.config['RECOMMENDER_LOCAL_MIN_CANDIDATES']
+                            and recommender.catalog_ready()):
+                        # The catalog is enough and its book vectors are stored:
+                        # rank it from those, without tokenizing any book text
+                        with timer.span('catalog_score') as span, record_peak_rss(span):
+                            recommendations = recommender.recommend_from_catalog(
+                                current_user.id,
+                                num_recommendations=5,
+                                preferences=preferences,
+                                explain=app.config['RECOMMENDER_EXPLAIN']
+                            )
+                    elif len(all_books) < app.config['RECOMMENDER_LOCAL_MIN_CANDIDATES']:
+                        if app.config['RECOMMENDER_STREAMING'] and can_stream(recommender):
+                            # Score each Google Books page as it arrives (local books
+                            # first) and stop fetching once the top 5 has settled.
+                            # Fetching and filtering get spans of their own inside
+                            # this one, so its self time is the scoring
+                            with timer.span('stream') as span, record_peak_rss(span):
+                                result = stream_recommendations(
+                                    recommender,
+                                    current_user.id,
+                                    chain([('local', all_books)],
+                                          fetch_pages(search_queries, timed_fetch, timed_filter)),
+                                    k=5,
+                                    preferences=preferences,
+                                    min_score=app.config['RECOMMENDER_STREAM_MIN_SCORE'],
+                                    patience=app.config['RECOMMENDER_STREAM_PATIENCE'],
+                                    explain=app.config['RECOMMENDER_EXPLAIN']
+                                )
+                                span.update(pages=result.pages_scored, books=result.books_scored,
+                                            stopped_early=result.stopped_early)
+                            logger.debug(f"Scored {result.pages_scored} of {len(search_queries) + 1} pages "
+                                         f"({result.books_scored} books) for User {current_user.id}")
+                            # The stream's top 5 are the results. Nothing is pooled:
+                            # the pages it never fetched could not be ranked later
+                            recommendations = result.recommendations
+                            candidates = result.books_scored
+                        else:
+                            # Fetch and process books
+                            for query in search_queries:
+                                all_books.extend(timed_filter(timed_fetch(query)))
+
+                    if recommendations is None:
+                        # Remove duplicates, keeping the first copy of a book (a
+                        # local book over its Google copy), as the stream does
+                        with timer.span('dedupe', books=len(all_books)) as span:
+                            unique_books = {}
+                            for book in all_books:
+                                unique_books.setdefault(book['id'], book)
+                            all_books = list(unique_books.values())
+                            span['unique'] = len(all_books)
             
-            # Get recommendations
-            recommendations = recommender.get_recommendations(
-                current_user.id,
-                all_books,
-                num_recommendations=5
-            )
+                # Get recommendations
+                if recommendations is None:
+                    with timer.span('score', candidates=len(all_books)) as span, record_peak_rss(span):
+                        recommendations = recommender.get_recommendations(
+                            current_user.id,
+                            all_books,
+                            num_recommendations=5,
+                            preferences=preferences,
+                            queries=search_queries,
+                            explain=app.config['RECOMMENDER_EXPLAIN']
+                        )
+                timer.annotate(candidates=candidates if candidates is not None else len(all_books))
+
+                # Keep them for the next visit to the recommendation page
+                if recommendations:
+                    with timer.span('save_precomputed'):
+                        save_precomputed(current_user.id, preferences, recommendations)
+                        db.session.commit()
             
-            # Get reading status for each recommended book
-            for rec in recommendations:
-                reading_list_entry = ReadingList.query.filter_by(
-                    user_id=current_user.id,
-                    book_id=rec['book']['id']
-                ).first()
-                rec['reading_status'] = reading_list_entry.status if reading_list_entry else None
-
-            return render_template(
-                "recommendation.html", 
-                recommendations=recommendations,
-                show_results=True
-            )
+            with timer.span('reading_status', lookups=len(recommendations)):
+                add_reading_status(recommendations)
+            with timer.span('also_added'):
+                add_also_added(recommendations)
+
+            with timer.span('render'):
+                page = render_template(
+                    "recommendation.html", 
+                    recommendations=recommendations,
+                    show_results=True
+                )
+            timer.finish(results=len(recommendations))
+            return page
 
         except Exception as e:
+            timer.finish(error=type(e).__name__)
             logger.error(f"Error generating recommendations: {str(e)}")
             flash(f'Error generating recommendations: {str(e)}', 'error')
             return redirect(url_for('form'))
 
-    # Handle GET request
+    # Handle GET request: show the recommendations generated offline (or on
+    # the last submission) if they still match the user's preferences
+    preferences = UserPreferences.query.filter_by(user_id=current_user.id).first()
+    recommendations = load_precomputed(current_user.id, preferences) if preferences else None
+    if recommendations:
+        add_reading_status(recommendations)
+        add_also_added(recommendations)
+        return render_template(
+            "recommendation.html",
+            recommendations=recommendations,
+            show_results=True
+        )
     return render_template("recommendation.html", show_results=False)
 
+@app.route('/recommendation/timings')
+@login_required
+def recommendation_timings():
+    """Latency histograms (total, per stage, per component) since this process started"""
+    if app.debug:  # Only allow in debug mode
+        return jsonify(latency_snapshot())
+    return "Not available in production", 403
+
 # Routes for user registration and login
 @app.route('/signup', methods=['GET', 'POST'])
 def signup():
@@ -446,6 +612,8 @@ def add_to_reading_list():
         import os  # Move the import to the top of the function
         data = request.get_json()
         external_book_id = data.get('book_id')
+        # Set for books recommended from the local catalog: list that very row
+        local_id = data.get('local_id')
         status = data.get('status')
         
         # Log the received data for debugging
@@ -457,7 +625,7 @@ def add_to_reading_list():
         book_cover = data.get('cover_image', '')
         
         # Handle external image URLs (like from Google Books API)
-        if book_cover and (book_cover.startswith('http://') or book_cover.startswith('https://')):
+        if not local_id and book_cover and (book_cover.startswith('http://') or book_cover.startswith('https://')):
             try:
                 # Generate a unique filename
                 import uuid
@@ -499,22 +667,28 @@ def add_to_reading_list():
         # Print the data for debugging
         print(f"Book data: ID={external_book_id}, Title={book_title}, Author={book_author}, Cover={book_cover}")
         
-        # First, check if we have a book with this external ID in the summary field
-        existing_books = Book.query.filter(Book.summary.like(f"%External ID: {external_book_id}%")).all()
+        # First, check if we already have this book: the catalog row it was
+        # recommended from, or the row saved for this external ID
+        book = find_listed_book(external_book_id, local_id)
+        if book is None and local_id:
+            return jsonify({
+                'success': False,
+                'message': 'Book not found'
+            }), 404
         
-        if existing_books:
-            # Use the first matching book
-            book = existing_books[0]
+        if book is not None:
             book_id = book.id
             app.logger.debug(f"Found existing book with external ID {external_book_id}, internal ID: {book_id}")
             
-            # Always update the book details to ensure we have the latest information
-            if book_title != 'Unknown Title':
-                book.title = book_title
-            if book_author != 'Unknown Author':
-                book.author = book_author
-            if book_cover != '01.jpg':
-                book.cover_image = book_cover
+            # Update the details of saved Google Books volumes when they changed;
+            # local catalog books keep their own
+            if not local_id:
+                if book_title != 'Unknown Title' and book.title != book_title:
+                    book.title = book_title
+                if book_author != 'Unknown Author' and book.author != book_author:
+                    book.author = book_author
+                if book_cover != '01.jpg':
+                    book.cover_image = book_cover
                 
             app.logger.debug(f"Updated book details: Title={book.title}, Author={book.author}, Cover={book.cover_image}")
         else:
@@ -526,7 +700,7 @@ def add_to_reading_list():
                     title=book_title,
                     author=book_author,
                     cover_image=book_cover,
-                    summary=f"External ID: {external_book_id}"
+                    summary=f"{EXTERNAL_ID_MARKER} {external_book_id}"
                 )
                 db.session.add(new_book)
                 db.session.flush()  # Get the auto-generated ID
@@ -575,7 +749,14 @@ def add_to_reading_list():
             
         db.session.commit()
         app.logger.debug("Database changes committed successfully")
-        
+
+        # Count the new entry towards "readers also added" right away; the
+        # entry is saved either way, so a failure here is only logged
+        try:
+            get_cooccurrence_index().catch_up()
+        except Exception as index_error:
+            app.logger.error(f"Error updating the co-occurrence index: {str(index_error)}")
+
         return jsonify({
             'success': True,
             'message': message
@@ -602,9 +783,14 @@ def book_details(book_id):
         if reading_list_entry:
             reading_status = reading_list_entry.status
     
+    # Books other readers most often put on their lists next to this one
+    key = candidate_id(book)
+    also_added_books = also_added([key])[key]
+    
     return render_template('book_details.html', 
                          book=book, 
-                         reading_status=reading_status)
+                         reading_status=reading_status,
+                         also_added=also_added_books)
 
 @app.route('/debug_reading_list')
 @login_required
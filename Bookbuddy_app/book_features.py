@@ -0,0 +1,197 @@
+"""Precomputed recommender feature vectors for the local Book catalog.
+
+Each book's TF-IDF vector is computed once, when the book is inserted or its
+text changes, and stored in the BookVector table as compact int32/float32
+arrays. Scoring a user against the catalog then only needs to load those
+vectors in bulk and take a dot product - no book text is tokenized.
+"""
+import threading
+
+import numpy as np
+import scipy.sparse as sp
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import Book, BookVector
+from structured_features import BookAttributes
+
+# Book columns the recommender reads (language is a structured feature, but a
+# new vector also tells other workers to reload it); other edits (e.g. cover
+# image) don't need a new vector
+TEXT_COLUMNS = ('title', 'author', 'genre', 'language', 'summary')
+
+
+# Books added from Google only carry this marker and their Google Books ID as summary
+EXTERNAL_ID_MARKER = 'External ID:'
+
+
+def external_id(summary):
+    """The Google Books ID in a summary that is only an 'External ID: ...' marker, or None"""
+    summary = summary or ''
+    if summary.startswith(EXTERNAL_ID_MARKER):
+        return summary[len(EXTERNAL_ID_MARKER):].strip()
+    return None
+
+
+def book_from_catalog(book):
+    """Convert a local Book row into the dict shape used by the recommender"""
+    summary = book.summary or ''
+    if external_id(summary) is not None:
+        summary = ''
+    return {
+        'id': book.id,
+        'title': book.title,
+        'authors': [book.author] if book.author else [],
+        'categories': [book.genre.lower()] if book.genre else [],
+        'description': summary.lower(),
+        'language': book.language or '',
+    }
+
+
+def encode_vector(row):
+    """Serialize a 1 x n_features sparse row to (indices bytes, weights bytes)"""
+    row = row.tocsr()
+    return (row.indices.astype(np.int32).tobytes(),
+            row.data.astype(np.float32).tobytes())
+
+
+def decode_vectors(rows, n_features):
+    """Assemble stored (indices, weights) pairs into one CSR matrix"""
+    indices = [np.frombuffer(row_indices, dtype=np.int32) for row_indices, _ in rows]
+    weights = [np.frombuffer(row_weights, dtype=np.float32) for _, row_weights in rows]
+    indptr = np.zeros(len(rows) + 1, dtype=np.int32)
+    np.cumsum([len(row) for row in indices], out=indptr[1:])
+    return sp.csr_matrix(
+        (np.concatenate(weights) if weights else np.zeros(0, dtype=np.float32),
+         np.concatenate(indices) if indices else np.zeros(0, dtype=np.int32),
+         indptr),
+        shape=(len(rows), n_features)
+    )
+
+
+class CatalogVectors:
+    """All stored vectors for one model version, as a single matrix
+
+    `attributes` holds the books' structured features (language etc.) in the
+    same row order; they are all unknown when not given. `keys` are the
+    books' candidate IDs (their Google Books ID when they came from Google,
+    see catalog_index.candidate_id), as strings; the book IDs when not given.
+    """
+
+    def __init__(self, book_ids, matrix, attributes=None, keys=None):
+        self.book_ids = np.asarray(book_ids, dtype=np.int64)
+        self.matrix = matrix
+        self.attributes = attributes if attributes is not None else BookAttributes.from_books([{}] * len(self.book_ids))
+        self.keys = np.asarray(keys if keys is not None else self.book_ids.astype(str), dtype=str)
+
+    def __len__(self):
+        return len(self.book_ids)
+
+
+class BookFeatureStore:
+    def __init__(self, model, book_text):
+        # book_text turns a book dict into the recommender text, i.e.
+        # BookRecommender.get_book_text
+        self.model = model
+        self.book_text = book_text
+        self._cached = None
+        self._cached_state = None
+        self._lock = threading.Lock()
+
+    def compute(self, book):
+        """Encoded feature vector for a Book row"""
+        text = self.book_text(book_from_catalog(book))
+        return encode_vector(self.model.transform([text]))
+
+    def refresh_book(self, book):
+        """(Re)compute a book's stored vector; the caller commits"""
+        indices, weights = self.compute(book)
+        vector = book.feature_vector
+        if vector is None:
+            book.feature_vector = BookVector(model_version=self.model.version,
+                                             indices=indices,
+                                             weights=weights)
+        else:
+            vector.model_version = self.model.version
+            vector.indices = indices
+            vector.weights = weights
+
+    def rebuild(self):
+        """Backfill vectors for every book that lacks one for this model"""
+        stale = Book.query.outerjoin(BookVector).filter(
+            (BookVector.id.is_(None)) | (BookVector.model_version != self.model.version)
+        ).all()
+        for book in stale:
+            self.refresh_book(book)
+        db.session.commit()
+        return len(stale)
+
+    def _store_state(self):
+        # Cheap fingerprint of the stored vectors, so a process notices books
+        # added or changed by another worker
+        return db.session.query(func.count(BookVector.id), func.max(BookVector.updated_at)).filter(
+            BookVector.model_version == self.model.version
+        ).one()
+
+    def load(self):
+        """All vectors for the current model, loaded in bulk and cached"""
+        state = tuple(self._store_state())
+        with self._lock:
+            if self._cached is not None and self._cached_state == state:
+                return self._cached
+
+        rows = db.session.query(BookVector.book_id, BookVector.indices, BookVector.weights, Book.language,
+                                Book.summary).join(
+            Book, Book.id == BookVector.book_id
+        ).filter(
+            BookVector.model_version == self.model.version
+        ).order_by(BookVector.book_id).all()
+        # The Book table has no page count or maturity rating, so only the
+        # language is known for catalog books
+        vectors = CatalogVectors([row.book_id for row in rows],
+                                 decode_vectors([(row.indices, row.weights) for row in rows],
+                                                self.model.n_features),
+                                 BookAttributes.from_books([{'language': row.language} for row in rows]),
+                                 [external_id(row.summary) or str(row.book_id) for row in rows])
+        with self._lock:
+            self._cached = vectors
+            self._cached_state = state
+        return vectors
+
+    def before_flush(self, session, flush_context, instances):
+        """Session hook: vectorize books that are new or whose text changed"""
+        for obj in list(session.new) + list(session.dirty):
+            if not isinstance(obj, Book) or obj in session.deleted:
+                continue
+            if obj in session.new or any(
+                inspect(obj).attrs[column].history.has_changes() for column in TEXT_COLUMNS
+            ):
+                self.refresh_book(obj)
+
+
+# The store fed by the Session hook; see activate()
+_active_store = None
+_listener_lock = threading.Lock()
+
+
+def _before_flush(session, flush_context, instances):
+    store = _active_store
+    if store is not None:
+        store.before_flush(session, flush_context, instances)
+
+
+def activate(store):
+    """Make `store` the one that keeps BookVector rows in sync (None turns it off)"""
+    global _active_store
+    with _listener_lock:
+        _active_store = store
+        listening = event.contains(Session, 'before_flush', _before_flush)
+        if store is not None and not listening:
+            event.listen(Session, 'before_flush', _before_flush)
+        elif store is None and listening:
+            event.remove(Session, 'before_flush', _before_flush)
+
+
+def get_active_store():
+    return _active_store
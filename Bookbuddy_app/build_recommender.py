@@ -0,0 +1,236 @@
+"""Offline build steps for the book recommender.
+
+Usage:
+    python build_recommender.py model [--volumes volumes.json ...] [--output PATH]
+    python build_recommender.py vectors [--model PATH]
+    python build_recommender.py index [--model PATH] [--output PATH] [--lists N] [--probe N]
+    python build_recommender.py precompute [--workers N] [--top N] [--restart] [--changed-only]
+    python build_recommender.py collaborative [--output PATH] [--factors N] [--iterations N]
+    python build_recommender.py cooccurrence [--output PATH]
+
+The 'model' step fits the vocabulary and IDF weights on the book catalog (the
+local Book table plus any saved Google Books responses) and writes the
+versioned model file that app.py loads at start-up.
+
+The 'vectors' step stores a feature vector for every Book that does not have
+one for the current model yet. New and edited books get theirs automatically;
+run this after fitting a new model.
+
+The 'index' step clusters the stored vectors into an approximate
+nearest-neighbour index for large catalogs. It is optional: without it (or
+after a new model) the catalog is scored exactly.
+
+The 'precompute' step generates every user's top recommendations across a
+process pool and stores them for the recommendation page (see precompute.py).
+An interrupted run resumes from its checkpoint unless --restart is given.
+
+The 'collaborative' step factorizes the ReadingList table into user and book
+factors (see collaborative.py). Retrain it now and then as reading lists grow.
+
+The 'cooccurrence' step counts which books readers list together (see
+cooccurrence.py). Workers load the counts at start-up and only read the
+entries added since; rebuild it now and then to keep that delta small.
+
+With RECOMMENDER_FEATURIZER=hashing there is no model to fit; 'vectors' and
+'index' then use the hashing featurizer and ignore --model.
+"""
+import argparse
+import json
+
+from app import app
+from models import Book
+from Recommendation import (
+    BookRecommender, book_from_catalog, get_memory_budget, load_recommender_model, use_hashing_featurizer
+)
+import book_features
+from recommender_model import RecommenderModel
+from ann_index import IVFIndex, DEFAULT_N_PROBE, MIN_INDEXED_BOOKS
+import precompute
+import collaborative
+from collaborative import CollaborativeModel
+from cooccurrence import CooccurrenceIndex
+
+
+def book_from_volume(item):
+    """Convert a raw Google Books volume into the recommender's dict shape"""
+    volume_info = item.get('volumeInfo', {})
+    return {
+        'id': item.get('id'),
+        'title': volume_info.get('title', ''),
+        'authors': volume_info.get('authors', []),
+        'categories': [cat.lower() for cat in volume_info.get('categories', [])],
+        'description': volume_info.get('description', '').lower(),
+        'language': volume_info.get('language', 'unknown'),
+        'pageCount': volume_info.get('pageCount', 0),
+        'maturityRating': volume_info.get('maturityRating', 'NOT_MATURE'),
+    }
+
+
+def load_volumes(paths):
+    """Read saved Google Books responses (either a list of items or {'items': [...]})"""
+    books = []
+    for path in paths or []:
+        with open(path) as f:
+            data = json.load(f)
+        items = data.get('items', []) if isinstance(data, dict) else data
+        books.extend(book_from_volume(item) for item in items)
+    return books
+
+
+def load_catalog(volume_paths=None):
+    """All books the model should be fitted on"""
+    books = [book_from_catalog(book) for book in Book.query.all()]
+    books.extend(load_volumes(volume_paths))
+    return books
+
+
+def load_model(model_path):
+    """The featurizer the app is configured with (the fitted model at model_path by default)"""
+    if app.config['RECOMMENDER_FEATURIZER'] == 'hashing':
+        return use_hashing_featurizer(app.config['RECOMMENDER_HASH_FEATURES'])
+    return load_recommender_model(model_path)
+
+
+def build_model(output, volume_paths=None, max_features=None):
+    if app.config['RECOMMENDER_FEATURIZER'] == 'hashing':
+        print("RECOMMENDER_FEATURIZER is 'hashing'; there is no model to fit")
+        return None
+
+    with app.app_context():
+        books = load_catalog(volume_paths)
+        if not books:
+            print("No books in the catalog; add books or pass --volumes")
+            return None
+
+        recommender = BookRecommender()
+        texts = [recommender.get_book_text(book) for book in books]
+        model = RecommenderModel.fit(texts, max_features=max_features)
+        model.save(output)
+        print(f"Fitted recommender model {model.version} on {len(texts)} books "
+              f"({model.n_features} terms) -> {output}")
+        return model
+
+
+def build_vectors(model_path):
+    with app.app_context():
+        if load_model(model_path) is None:
+            print(f"No recommender model at {model_path}; run the 'model' step first")
+            return 0
+
+        updated = book_features.get_active_store().rebuild()
+        print(f"Stored feature vectors for {updated} books")
+        return updated
+
+
+def build_index(model_path, output, n_lists=None, n_probe=DEFAULT_N_PROBE):
+    with app.app_context():
+        model = load_model(model_path)
+        if model is None:
+            print(f"No recommender model at {model_path}; run the 'model' step first")
+            return None
+
+        store = book_features.get_active_store()
+        store.rebuild()
+        catalog = store.load()
+        if len(catalog) == 0:
+            print("No book vectors to index")
+            return None
+
+        index = IVFIndex.build(catalog, model.version, n_lists=n_lists, n_probe=n_probe)
+        index.save(output)
+        print(f"Built ANN index over {len(catalog)} books ({index.n_lists} lists) -> {output}")
+        if len(catalog) < MIN_INDEXED_BOOKS:
+            print(f"Catalogs under {MIN_INDEXED_BOOKS} books are scored exactly; the index is used once it grows")
+        return index
+
+
+def build_precomputed(workers=None, top_n=precompute.DEFAULT_TOP_N, checkpoint=None, restart=False,
+                      changed_only=False):
+    with app.app_context():
+        stored = precompute.run(workers=workers, top_n=top_n, checkpoint_path=checkpoint,
+                                restart=restart, changed_only=changed_only)
+        print(f"Stored precomputed recommendations for {stored} users")
+        return stored
+
+
+def build_collaborative(output, factors=collaborative.DEFAULT_FACTORS,
+                        iterations=collaborative.DEFAULT_ITERATIONS,
+                        regularization=collaborative.DEFAULT_REGULARIZATION,
+                        alpha=collaborative.DEFAULT_ALPHA):
+    with app.app_context():
+        model = CollaborativeModel.train(factors, regularization, alpha, iterations)
+        if len(model.user_ids) == 0:
+            print("No reading-list entries to learn from")
+            return None
+
+        model.save(output)
+        print(f"Trained collaborative model {model.version} on {len(model.user_ids)} users and "
+              f"{len(model.book_keys)} books ({model.n_factors} factors) -> {output}")
+        return model
+
+
+def build_cooccurrence(output):
+    with app.app_context():
+        index = CooccurrenceIndex(app.config['RECOMMENDER_COOCCURRENCE_NEIGHBOURS'])
+        entries = index.catch_up()
+        index.save(output)
+        print(f"Counted {entries} reading-list entries over {len(index)} books -> {output}")
+        return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline build steps for the book recommender")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    model_parser = subparsers.add_parser('model', help="Fit the vocabulary/IDF model on the book catalog")
+    model_parser.add_argument('--output', default=app.config['RECOMMENDER_MODEL_PATH'])
+    model_parser.add_argument('--volumes', nargs='*', help="Saved Google Books responses (JSON)")
+    model_parser.add_argument('--max-features', type=int, default=get_memory_budget().max_vocabulary,
+                              help="Vocabulary size (default: RECOMMENDER_MAX_VOCABULARY in the memory budget)")
+
+    vectors_parser = subparsers.add_parser('vectors', help="Store feature vectors for every catalog book")
+    vectors_parser.add_argument('--model', default=app.config['RECOMMENDER_MODEL_PATH'])
+
+    index_parser = subparsers.add_parser('index', help="Build the approximate nearest-neighbour index")
+    index_parser.add_argument('--model', default=app.config['RECOMMENDER_MODEL_PATH'])
+    index_parser.add_argument('--output', default=app.config['RECOMMENDER_INDEX_PATH'])
+    index_parser.add_argument('--lists', type=int, default=None, help="Number of clusters (default sqrt(books))")
+    index_parser.add_argument('--probe', type=int, default=DEFAULT_N_PROBE, help="Clusters scored per query")
+
+    precompute_parser = subparsers.add_parser('precompute', help="Generate and store every user's recommendations")
+    precompute_parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    precompute_parser.add_argument('--top', type=int, default=precompute.DEFAULT_TOP_N, help="Books stored per user")
+    precompute_parser.add_argument('--checkpoint', default=app.config['RECOMMENDER_PRECOMPUTE_CHECKPOINT'])
+    precompute_parser.add_argument('--restart', action='store_true', help="Ignore an existing checkpoint")
+    precompute_parser.add_argument('--changed-only', action='store_true',
+                                   help="Skip users whose stored results match their preferences")
+
+    cf_parser = subparsers.add_parser('collaborative', help="Train reading-list factors for collaborative scores")
+    cf_parser.add_argument('--output', default=app.config['RECOMMENDER_CF_PATH'])
+    cf_parser.add_argument('--factors', type=int, default=collaborative.DEFAULT_FACTORS)
+    cf_parser.add_argument('--iterations', type=int, default=collaborative.DEFAULT_ITERATIONS)
+    cf_parser.add_argument('--regularization', type=float, default=collaborative.DEFAULT_REGULARIZATION)
+    cf_parser.add_argument('--alpha', type=float, default=collaborative.DEFAULT_ALPHA,
+                           help="Confidence added per unit of reading-list status weight")
+
+    cooccurrence_parser = subparsers.add_parser('cooccurrence',
+                                                help="Count the books readers list together")
+    cooccurrence_parser.add_argument('--output', default=app.config['RECOMMENDER_COOCCURRENCE_PATH'])
+
+    args = parser.parse_args(argv)
+    if args.command == 'model':
+        build_model(args.output, args.volumes, args.max_features)
+    elif args.command == 'vectors':
+        build_vectors(args.model)
+    elif args.command == 'index':
+        build_index(args.model, args.output, args.lists, args.probe)
+    elif args.command == 'precompute':
+        build_precomputed(args.workers, args.top, args.checkpoint, args.restart, args.changed_only)
+    elif args.command == 'collaborative':
+        build_collaborative(args.output, args.factors, args.iterations, args.regularization, args.alpha)
+    elif args.command == 'cooccurrence':
+        build_cooccurrence(args.output)
+
+
+if __name__ == "__main__":
+    main()
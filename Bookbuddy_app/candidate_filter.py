@@ -0,0 +1,163 @@
+"""Rule-based filtering of Google Books volumes before they are scored.
+
+A volume is kept when it has a title, authors and a description, at least one
+of its categories mentions an included category, none mentions an excluded
+one, and its description mentions one of the keywords. Matching is plain
+substring matching on the lowercased text, as before; each rule list is
+compiled once into a single alternation regex, so a volume costs one search
+per rule instead of a Python loop over every term.
+
+The rules can be replaced without code changes by pointing
+RECOMMENDER_FILTER_RULES_PATH at a JSON file with any of the keys of
+DEFAULT_FILTER_RULES (missing keys keep their default; an empty list turns
+that rule off). The filter counts how many volumes each rule rejected.
+"""
+import json
+import logging
+import re
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FILTER_RULES = {
+    # Strict category filtering: keep fiction and adventure
+    'include_categories': ['fiction', 'adventure', 'action and adventure', 'juvenile fiction'],
+    # Skip non-fiction and educational materials
+    'exclude_categories': ['non-fiction', 'education', 'textbook', 'manual', 'guide', 'science', 'copyright'],
+    # The description must hint at adventure content
+    'description_keywords': ['adventure', 'quest', 'journey', 'expedition', 'explore', 'discovery'],
+}
+
+# Rejection reasons, in the order they are checked
+REJECTION_REASONS = ('missing_fields', 'include_categories', 'exclude_categories', 'description_keywords')
+
+
+def compile_terms(terms):
+    """One regex matching any of `terms` as a substring, or None for no terms"""
+    terms = sorted({term.lower() for term in terms if term}, key=len, reverse=True)
+    if not terms:
+        return None
+    return re.compile('|'.join(re.escape(term) for term in terms))
+
+
+class CandidateFilter:
+    def __init__(self, include_categories=(), exclude_categories=(), description_keywords=()):
+        self.rules = {
+            'include_categories': list(include_categories),
+            'exclude_categories': list(exclude_categories),
+            'description_keywords': list(description_keywords),
+        }
+        self._include = compile_terms(include_categories)
+        self._exclude = compile_terms(exclude_categories)
+        self._keywords = compile_terms(description_keywords)
+        self.rejections = Counter()
+        self.accepted = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_rules(cls, rules=None):
+        """Filter for a dict of rule lists; missing keys keep their default"""
+        merged = dict(DEFAULT_FILTER_RULES)
+        for name, terms in (rules or {}).items():
+            if name not in merged:
+                raise ValueError(f"Unknown filter rule '{name}'")
+            merged[name] = terms
+        return cls(**merged)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as f:
+            return cls.from_rules(json.load(f))
+
+    def _rejection(self, volume_info, categories, description):
+        if not (volume_info.get('title') and volume_info.get('authors') and description):
+            return 'missing_fields'
+        # Categories are matched as one string, so a term may span two categories
+        joined = ' '.join(categories)
+        if self._include is not None and not self._include.search(joined):
+            return 'include_categories'
+        if self._exclude is not None and self._exclude.search(joined):
+            return 'exclude_categories'
+        if self._keywords is not None and not self._keywords.search(description):
+            return 'description_keywords'
+        return None
+
+    def accepts(self, book):
+        """Whether a recommender book dict (e.g. a local catalog book) passes every rule
+
+        Nothing is added to the stats, which count Google Books volumes.
+        """
+        categories = [category.lower() for category in book.get('categories') or []]
+        return self._rejection(book, categories, (book.get('description') or '').lower()) is None
+
+    def process(self, books):
+        """Keep the volumes that pass every rule, converted to the recommender's book dicts"""
+        processed_books = []
+        rejections = Counter()
+        for book in books:
+            volume_info = book.get('volumeInfo', {})
+            categories = [cat.lower() for cat in volume_info.get('categories', [])]
+            description = (volume_info.get('description') or '').lower()
+
+            reason = self._rejection(volume_info, categories, description)
+            if reason is not None:
+                rejections[reason] += 1
+                continue
+
+            title = volume_info['title']
+            processed_books.append({
+                'id': book['id'],
+                'title': title,
+                'authors': volume_info['authors'],
+                'categories': categories,
+                'description': description,
+                'language': volume_info.get('language', 'unknown'),
+                'pageCount': volume_info.get('pageCount', 0),
+                'averageRating': volume_info.get('averageRating', 0),
+                'maturityRating': volume_info.get('maturityRating', 'NOT_MATURE'),
+                'series': 'series' if 'series' in title.lower() else 'standalone'
+            })
+
+        with self._lock:
+            self.rejections.update(rejections)
+            self.accepted += len(processed_books)
+        if rejections:
+            logger.debug(f"Kept {len(processed_books)} of {len(books)} volumes; rejected: {dict(rejections)}")
+        return processed_books
+
+    def stats(self):
+        """Volumes kept so far and rejections per rule"""
+        with self._lock:
+            return {
+                'accepted': self.accepted,
+                'rejected': {reason: self.rejections[reason] for reason in REJECTION_REASONS},
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self.rejections.clear()
+            self.accepted = 0
+
+
+# The filter used by process_google_books_response(), see load_candidate_filter()
+_candidate_filter = CandidateFilter.from_rules()
+
+
+def load_candidate_filter(config):
+    """Set up the rules from RECOMMENDER_FILTER_RULES_PATH, or the defaults"""
+    global _candidate_filter
+    path = config.get('RECOMMENDER_FILTER_RULES_PATH')
+    if path:
+        try:
+            _candidate_filter = CandidateFilter.from_file(path)
+            logger.info(f"Loaded candidate filter rules from {path}")
+            return _candidate_filter
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not load candidate filter rules from {path}: {str(e)}")
+    _candidate_filter = CandidateFilter.from_rules()
+    return _candidate_filter
+
+
+def get_candidate_filter():
+    return _candidate_filter
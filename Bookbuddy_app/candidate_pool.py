@@ -0,0 +1,100 @@
+"""A user's last candidate pool, with per-field partial scores.
+
+When a user changes one answer on the preferences form (say mood or length),
+most of the previous scoring work still holds. The pool keeps:
+
+  * the candidate books and their per-field feature matrix
+    (score_breakdown.py),
+  * one partial text score per preference field: the field's raw TF-IDF
+    vector dotted with every book field, and
+  * one score array per structured feature (language, length, maturity).
+
+Raw TF-IDF weights are additive over the field texts, so the cosine with the
+whole preference text is the sum of the field dot products divided by the
+norm of the summed user vector. Re-scoring after an edit therefore only
+re-vectorizes the fields that changed and re-ranks; the books are never
+re-tokenized.
+"""
+import threading
+
+import numpy as np
+
+from score_breakdown import field_dots, field_parts
+from structured_features import PreferenceTargets, score_attributes
+
+
+def _structured_choices(targets):
+    return {
+        'language': targets.languages,
+        'length': targets.length,
+        'maturity': targets.maturity,
+    }
+
+
+def _single_feature_targets(feature, value):
+    """PreferenceTargets with only one feature set, to score it on its own"""
+    if feature == 'language':
+        return PreferenceTargets(languages=value)
+    return PreferenceTargets(**{feature: value})
+
+
+class CandidatePool:
+    def __init__(self, queries, book_list, candidates_fp, field_matrix, attributes, model_version):
+        self.queries = tuple(queries or ())
+        self.book_list = book_list
+        self.candidates_fp = candidates_fp
+        self.field_matrix = field_matrix.tocsr()
+        self.attributes = attributes
+        self.model_version = model_version
+
+        self.field_texts = {}     # field -> the text its partial score was computed for
+        self.field_vectors = {}   # field -> raw (unnormalised) user vector for that text
+        self.field_dots = {}      # field -> (book fields x books) dot products with the field vector
+        self.choices = {}         # structured feature -> the user's choice
+        self.attribute_scores = {}
+        self.fields_recomputed = 0
+        self.lock = threading.Lock()
+
+    def _update_text_fields(self, fields, model):
+        for field in set(self.field_texts) | set(fields):
+            text = fields.get(field)
+            if self.field_texts.get(field) == text:
+                continue
+            self.fields_recomputed += 1
+            if text:
+                vector = model.transform_raw([text])
+                self.field_texts[field] = text
+                self.field_vectors[field] = vector
+                self.field_dots[field] = field_dots(self.field_matrix, vector, len(self.book_list))
+            else:
+                self.field_texts.pop(field, None)
+                self.field_vectors.pop(field, None)
+                self.field_dots.pop(field, None)
+
+    def _update_structured(self, targets):
+        for feature, choice in _structured_choices(targets).items():
+            if feature in self.choices and self.choices[feature] == choice:
+                continue
+            self.fields_recomputed += 1
+            self.choices[feature] = choice
+            scores = score_attributes(_single_feature_targets(feature, choice), self.attributes)
+            if feature in scores:
+                self.attribute_scores[feature] = scores[feature]
+            else:
+                self.attribute_scores.pop(feature, None)
+
+    def text_parts(self):
+        """Cosine of the combined preference text with every book, split by book field"""
+        if not self.field_vectors:
+            return {}
+        user_vector = sum(self.field_vectors.values())
+        norm = np.sqrt(user_vector.multiply(user_vector).sum())
+        if norm == 0:
+            return {}
+        return field_parts(sum(self.field_dots.values()) / norm)
+
+    def score_parts(self, profile, model):
+        """Same as BookRecommender.score_parts, recomputing only what changed since last time"""
+        self._update_text_fields(profile.fields, model)
+        self._update_structured(profile.targets)
+        return self.text_parts(), dict(self.attribute_scores), bool(profile.match_text.strip())
@@ -0,0 +1,209 @@
+"""In-process candidate generation from the local Book catalog.
+
+Books users have added to the catalog can be recommended without asking
+Google Books. Three inverted indexes map a term to the sorted positions of
+the books that contain it:
+
+  * genre terms (Book.genre),
+  * language codes (Book.language, see structured_features.language_code), and
+  * title and summary terms.
+
+Terms are those the scorer's tokenizer finds (see tokenizer.py). Only books
+the candidate filter accepts are indexed, as for Google Books volumes; books
+saved from Google Books were filtered on the way in and are always indexed.
+
+A lookup adds up the postings of the user's preference terms (genre matches
+count more than description matches), drops books in languages the user
+didn't choose and returns the best-matching books, as many as the number of
+preference terms warrants. That is a handful of array additions, so it takes
+well under a millisecond even for large catalogs.
+
+The index is built once per process and rebuilt when books are added or
+removed in this process, or when an edit changes a column the candidates are
+made from (the Book mapper events say so, without a query).
+Other workers' edits don't reach this process's events, so the index is also
+rebuilt once it is REBUILD_INTERVAL seconds old.
+"""
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import event, inspect
+
+from book_features import book_from_catalog, external_id
+from candidate_filter import get_candidate_filter
+from models import Book
+from structured_features import language_code
+from tokenizer import default_tokenizer
+
+# A genre match outweighs a word in the summary
+GENRE_WEIGHT = 3.0
+
+# Candidates returned per preference term, within these bounds
+CANDIDATES_PER_TERM = 20
+MIN_CANDIDATES = 20
+MAX_CANDIDATES = 200
+
+# Book columns candidate_book() reads; edits to other columns keep the index
+CANDIDATE_COLUMNS = ('title', 'author', 'genre', 'summary', 'language', 'cover_image')
+
+# Seconds an index is used for before it is rebuilt to pick up other workers'
+# catalog changes
+REBUILD_INTERVAL = 300
+
+
+def tokenize(text):
+    """The terms the scorer finds in `text` (lowercase, without English stop words)"""
+    return default_tokenizer().tokenize(text or '')
+
+
+def preference_terms(fields):
+    """Distinct terms of a profile's text fields (genres, theme, mood, style)
+
+    The fields read 'genres:fantasy,mystery'; the field labels aren't terms.
+    """
+    return list(dict.fromkeys(
+        term
+        for field, text in fields.items()
+        for term in tokenize(text[len(field) + 1:] if text.startswith(f"{field}:") else text)
+    ))
+
+
+def candidate_limit(n_terms):
+    return int(np.clip(CANDIDATES_PER_TERM * n_terms, MIN_CANDIDATES, MAX_CANDIDATES))
+
+
+def candidate_id(book):
+    """The ID a Book row has as a candidate: its Google Books ID when it came from Google
+
+    The recommendation page links covers and reading-list buttons by that ID,
+    and it lets a book found both locally and remotely be de-duplicated.
+    """
+    google_id = external_id(book.summary)
+    return google_id if google_id is not None else book.id
+
+
+def candidate_book(book):
+    """book_from_catalog(), keyed by candidate_id()
+
+    'local_id' is always the Book ID, so the page can list this very row. Books
+    that aren't Google Books volumes also carry their own 'cover_image', as
+    there is no Google cover for them.
+    """
+    data = book_from_catalog(book)
+    data['id'] = candidate_id(book)
+    data['local_id'] = book.id
+    if external_id(book.summary) is None:
+        data['cover_image'] = book.cover_image
+    return data
+
+
+def _postings(term_lists):
+    positions = {}
+    for position, terms in enumerate(term_lists):
+        for term in set(terms):
+            positions.setdefault(term, []).append(position)
+    return {term: np.asarray(books, dtype=np.int32) for term, books in positions.items()}
+
+
+class CatalogIndex:
+    def __init__(self, books, book_ids=()):
+        """Index processed book dicts (see candidate_book()); `book_ids` are their Book IDs, ascending"""
+        self.books = list(books)
+        self.book_ids = np.asarray(book_ids, dtype=np.int64)
+        self.genres = _postings([tokenize(' '.join(book['categories'])) for book in self.books])
+        self.languages = _postings([[language_code(book['language'])] for book in self.books])
+        self.terms = _postings([tokenize(f"{book['title']} {book['description']}") for book in self.books])
+
+    @classmethod
+    def from_catalog(cls, candidate_filter=None):
+        """Index the Book table, without the books the candidate filter rejects"""
+        candidate_filter = candidate_filter or get_candidate_filter()
+        books, book_ids = [], []
+        for book in Book.query.order_by(Book.id).all():
+            data = candidate_book(book)
+            if external_id(book.summary) is not None or candidate_filter.accepts(data):
+                books.append(data)
+                book_ids.append(book.id)
+        return cls(books, book_ids)
+
+    def __len__(self):
+        return len(self.books)
+
+    def candidates(self, terms, languages=(), limit=None):
+        """Books matching any of `terms`, best first
+
+        With `languages`, books in other languages are left out (books
+        without a language are kept).
+        """
+        if not terms or not self.books:
+            return []
+        scores = np.zeros(len(self.books))
+        for term in terms:
+            if term in self.genres:
+                scores[self.genres[term]] += GENRE_WEIGHT
+            if term in self.terms:
+                scores[self.terms[term]] += 1.0
+
+        if languages:
+            allowed = np.zeros(len(self.books), dtype=bool)
+            for code in set(languages) | {''}:
+                if code in self.languages:
+                    allowed[self.languages[code]] = True
+            scores[~allowed] = 0.0
+
+        matched = np.flatnonzero(scores)
+        limit = limit or candidate_limit(len(terms))
+        best = matched[np.argsort(-scores[matched], kind='stable')[:limit]]
+        return [self.books[position] for position in best]
+
+
+# Process-wide index, rebuilt when the catalog changes
+_cached = None
+_cached_generation = None
+_built_at = 0.0
+_generation = 0
+_lock = threading.Lock()
+
+
+def _book_changed(mapper, connection, target):
+    global _generation
+    _generation += 1
+
+
+def _book_updated(mapper, connection, target):
+    """Count an update only when it changed what candidate_book() reads
+
+    after_update fires for every flushed Book, even one whose columns were
+    set to the values they had. A Google Books volume's cover isn't read.
+    """
+    state = inspect(target)
+    columns = CANDIDATE_COLUMNS if external_id(target.summary) is None else [
+        column for column in CANDIDATE_COLUMNS if column != 'cover_image'
+    ]
+    if any(state.attrs[column].history.has_changes() for column in columns):
+        _book_changed(mapper, connection, target)
+
+
+event.listen(Book, 'after_insert', _book_changed)
+event.listen(Book, 'after_update', _book_updated)
+event.listen(Book, 'after_delete', _book_changed)
+
+
+def get_catalog_index():
+    """The index for the current catalog, built on first use"""
+    global _cached, _cached_generation, _built_at
+    with _lock:
+        # Read before building, so an edit made during the build still
+        # triggers the next rebuild
+        generation = _generation
+        if (_cached is not None and _cached_generation == generation
+                and time.monotonic() - _built_at < REBUILD_INTERVAL):
+            return _cached
+
+    index = CatalogIndex.from_catalog()
+    with _lock:
+        _cached = index
+        _cached_generation = generation
+        _built_at = time.monotonic()
+    return index
@@ -0,0 +1,202 @@
+"""Collaborative filtering from implicit feedback in the ReadingList table.
+
+Putting a book on a reading list says something about a reader even without
+a rating. The user x book matrix of reading-list entries (weighted by status:
+finished counts more than want-to-read) is factorized offline with implicit
+alternating least squares (Hu, Koren & Volinsky, 2008): every entry is a
+positive preference with confidence 1 + alpha * weight, every missing entry a
+weak negative, and the user and book factors are solved for in turn with
+plain NumPy least squares.
+
+'python build_recommender.py collaborative' trains the factors and writes
+them to a small versioned .npz file. At request time a user's score for a
+candidate is one dot product of two short float32 vectors, however long the
+book's description is. Books nobody has shelved score 0, and so do the books
+already on the user's own reading list when the model was trained (the model
+keeps those), as recommending them again tells the reader nothing. The score
+is mixed into the recommendation score as the 'collaborative' feature (see
+RECOMMENDER_FEATURE_WEIGHTS).
+"""
+import hashlib
+
+import numpy as np
+import scipy.sparse as sp
+
+from catalog_index import candidate_id
+from extensions import db
+from models import Book, ReadingList
+
+# Bump this whenever the file layout changes
+CF_FORMAT_VERSION = 2
+
+# How strongly each reading-list status says "I like this"
+STATUS_WEIGHTS = {
+    'want': 1.0,
+    'current': 2.0,
+    'finished': 3.0,
+}
+DEFAULT_STATUS_WEIGHT = 1.0
+
+DEFAULT_FACTORS = 32
+DEFAULT_REGULARIZATION = 0.1
+DEFAULT_ALPHA = 10.0
+DEFAULT_ITERATIONS = 15
+
+
+def interaction_matrix():
+    """(user IDs, book keys, users x books CSR of status weights) from the ReadingList table
+
+    Books are keyed by their candidate ID (see catalog_index.candidate_id) as a
+    string, so they line up with the IDs of recommendation candidates.
+    """
+    rows = db.session.query(ReadingList.user_id, ReadingList.status, Book).join(
+        Book, Book.id == ReadingList.book_id
+    ).all()
+    # A book listed twice by the same user keeps its strongest status
+    weights = {}
+    for row in rows:
+        key = (row.user_id, str(candidate_id(row.Book)))
+        weights[key] = max(weights.get(key, 0.0), STATUS_WEIGHTS.get(row.status, DEFAULT_STATUS_WEIGHT))
+
+    user_ids = sorted({user_id for user_id, _ in weights})
+    book_keys = sorted({book_key for _, book_key in weights})
+    user_index = {user_id: i for i, user_id in enumerate(user_ids)}
+    book_index = {key: i for i, key in enumerate(book_keys)}
+    matrix = sp.csr_matrix(
+        (list(weights.values()),
+         ([user_index[user_id] for user_id, _ in weights], [book_index[book_key] for _, book_key in weights])),
+        shape=(len(user_ids), len(book_keys))
+    )
+    return np.array(user_ids, dtype=np.int64), np.array(book_keys, dtype=str), matrix
+
+
+def _solve_factors(matrix, fixed, regularization, alpha):
+    """Least-squares factors for every row of `matrix`, given the other side's factors"""
+    n_factors = fixed.shape[1]
+    gram = fixed.T @ fixed
+    ridge = regularization * np.eye(n_factors)
+    factors = np.zeros((matrix.shape[0], n_factors))
+    for row in range(matrix.shape[0]):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        if start == end:
+            continue
+        items = fixed[matrix.indices[start:end]]
+        confidence = alpha * matrix.data[start:end]
+        # (Y'Y + Y'(C - I)Y + lambda I) x = Y'C p, with p = 1 on the observed items only
+        a = gram + (items.T * confidence) @ items + ridge
+        b = items.T @ (1.0 + confidence)
+        factors[row] = np.linalg.solve(a, b)
+    return factors
+
+
+def als(matrix, factors=DEFAULT_FACTORS, regularization=DEFAULT_REGULARIZATION, alpha=DEFAULT_ALPHA,
+        iterations=DEFAULT_ITERATIONS, seed=0):
+    """Implicit ALS on a users x items confidence-weight matrix; returns (user, item) factors"""
+    matrix = sp.csr_matrix(matrix, dtype=np.float64)
+    rng = np.random.default_rng(seed)
+    item_factors = rng.normal(scale=0.01, size=(matrix.shape[1], factors))
+    user_factors = np.zeros((matrix.shape[0], factors))
+    transposed = matrix.T.tocsr()
+    for _ in range(iterations):
+        user_factors = _solve_factors(matrix, item_factors, regularization, alpha)
+        item_factors = _solve_factors(transposed, user_factors, regularization, alpha)
+    return user_factors, item_factors
+
+
+class CollaborativeModel:
+    def __init__(self, user_ids, book_keys, user_factors, item_factors, listed=None):
+        """`listed` is the users x books matrix of reading-list entries (any nonzero), if known"""
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.book_keys = np.asarray(book_keys, dtype=str)
+        self.user_factors = np.asarray(user_factors, dtype=np.float32)
+        self.item_factors = np.asarray(item_factors, dtype=np.float32)
+
+        if len(self.user_ids) != len(self.user_factors) or len(self.book_keys) != len(self.item_factors):
+            raise ValueError("Collaborative model IDs and factors have different lengths")
+        shape = (len(self.user_ids), len(self.book_keys))
+        self.listed = sp.csr_matrix(listed if listed is not None else shape, dtype=bool)
+        if self.listed.shape != shape:
+            raise ValueError("Collaborative model reading lists don't match its users and books")
+        self.listed.eliminate_zeros()
+        self.listed.sort_indices()
+
+        self._user_rows = {int(user_id): row for row, user_id in enumerate(self.user_ids)}
+        self._book_rows = {str(key): row for row, key in enumerate(self.book_keys)}
+        self.version = self._compute_version()
+
+    @classmethod
+    def train(cls, factors=DEFAULT_FACTORS, regularization=DEFAULT_REGULARIZATION, alpha=DEFAULT_ALPHA,
+              iterations=DEFAULT_ITERATIONS):
+        """Fit the factors on the current ReadingList table (inside the app context)"""
+        user_ids, book_keys, matrix = interaction_matrix()
+        factors = min(factors, max(1, min(matrix.shape)))
+        user_factors, item_factors = als(matrix, factors, regularization, alpha, iterations)
+        return cls(user_ids, book_keys, user_factors, item_factors, matrix)
+
+    def _compute_version(self):
+        digest = hashlib.sha1()
+        digest.update(self.user_ids.tobytes())
+        digest.update('\n'.join(self.book_keys.tolist()).encode('utf-8'))
+        digest.update(self.user_factors.tobytes())
+        digest.update(self.item_factors.tobytes())
+        digest.update(self.listed.indptr.astype(np.int64).tobytes())
+        digest.update(self.listed.indices.astype(np.int64).tobytes())
+        return 'als-' + digest.hexdigest()[:12]
+
+    @property
+    def n_factors(self):
+        return self.user_factors.shape[1]
+
+    def knows_user(self, user_id):
+        return user_id in self._user_rows
+
+    def scores(self, user_id, book_list):
+        """Predicted preference (clipped to [0, 1]) of a user for every candidate, or None for unknown users
+
+        Books already on the user's reading list score 0.
+        """
+        row = self._user_rows.get(user_id)
+        if row is None:
+            return None
+        positions = np.array([self._book_rows.get(str(book.get('id')), -1) for book in book_list], dtype=np.intp)
+        scores = np.zeros(len(book_list), dtype=np.float32)
+        known = positions >= 0
+        if known.any():
+            scores[known] = self.item_factors[positions[known]] @ self.user_factors[row]
+            listed = self.listed.indices[self.listed.indptr[row]:self.listed.indptr[row + 1]]
+            scores[known & np.isin(positions, listed)] = 0.0
+        return np.clip(scores, 0.0, 1.0).astype(np.float64)
+
+    def save(self, path):
+        """Write the factors to a versioned .npz file"""
+        with open(path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                format_version=np.array(CF_FORMAT_VERSION),
+                model_version=np.array(self.version),
+                user_ids=self.user_ids,
+                book_keys=self.book_keys,
+                user_factors=self.user_factors,
+                item_factors=self.item_factors,
+                listed_indptr=self.listed.indptr,
+                listed_indices=self.listed.indices
+            )
+
+    @classmethod
+    def load(cls, path):
+        """Read factors written by save(), rejecting unknown format versions"""
+        with np.load(path, allow_pickle=False) as data:
+            format_version = int(data['format_version'])
+            if format_version != CF_FORMAT_VERSION:
+                raise ValueError(
+                    f"Unsupported collaborative model format {format_version} "
+                    f"(expected {CF_FORMAT_VERSION}); retrain it with build_recommender.py"
+                )
+            listed = sp.csr_matrix(
+                (np.ones(len(data['listed_indices']), dtype=bool), data['listed_indices'], data['listed_indptr']),
+                shape=(len(data['user_ids']), len(data['book_keys']))
+            )
+            model = cls(data['user_ids'], data['book_keys'], data['user_factors'], data['item_factors'], listed)
+            if model.version != str(data['model_version']):
+                raise ValueError("Collaborative model file is corrupt (version checksum mismatch)")
+        return model
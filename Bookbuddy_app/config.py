@@ -11,4 +11,67 @@ class Config:
     if not os.path.exists('instance'):
         os.makedirs('instance')
     GOOGLE_BOOKS_API_KEY = os.getenv('GOOGLE_BOOKS_API_KEY')
-    CACHE_TIMEOUT = 3600  # Cache timeout in seconds
\ No newline at end of file
+    CACHE_TIMEOUT = 3600  # Cache timeout in seconds
+    # Pre-fitted recommender text model, built offline with build_recommender.py
+    RECOMMENDER_MODEL_PATH = os.getenv(
+        'RECOMMENDER_MODEL_PATH',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'recommender_model.npz')
+    )
+    # 'tfidf' uses the fitted model above; 'hashing' needs no model file and
+    # hashes terms into RECOMMENDER_HASH_FEATURES columns instead
+    RECOMMENDER_FEATURIZER = os.getenv('RECOMMENDER_FEATURIZER', 'tfidf')
+    RECOMMENDER_HASH_FEATURES = int(os.getenv('RECOMMENDER_HASH_FEATURES', 2 ** 18))
+    # How much the text similarity and each structured feature count towards a
+    # recommendation score (features the user left blank are skipped)
+    RECOMMENDER_FEATURE_WEIGHTS = {
+        'text': 1.0,
+        'language': 0.3,
+        'length': 0.15,
+        'maturity': 0.3,
+        'collaborative': 0.5,
+    }
+    # Attach per-feature score explanations to /recommendation results
+    RECOMMENDER_EXPLAIN = os.getenv('RECOMMENDER_EXPLAIN', '').lower() in ('1', 'true', 'yes')
+    # Score Google Books pages as they arrive and skip the remaining queries once
+    # the top results have stayed the same for RECOMMENDER_STREAM_PATIENCE pages
+    # and all score at least RECOMMENDER_STREAM_MIN_SCORE. Only takes effect with
+    # a fixed-vocabulary featurizer (the model file, or RECOMMENDER_FEATURIZER=hashing)
+    RECOMMENDER_STREAMING = os.getenv('RECOMMENDER_STREAMING', '').lower() in ('1', 'true', 'yes')
+    RECOMMENDER_STREAM_MIN_SCORE = float(os.getenv('RECOMMENDER_STREAM_MIN_SCORE', 0.3))
+    RECOMMENDER_STREAM_PATIENCE = int(os.getenv('RECOMMENDER_STREAM_PATIENCE', 1))
+    # Optional JSON file overriding the Google Books filter rules (see candidate_filter.py)
+    RECOMMENDER_FILTER_RULES_PATH = os.getenv('RECOMMENDER_FILTER_RULES_PATH')
+    # Local catalog candidates needed before Google Books is skipped entirely;
+    # with fewer, the local books are mixed with remote results
+    RECOMMENDER_LOCAL_MIN_CANDIDATES = int(os.getenv('RECOMMENDER_LOCAL_MIN_CANDIDATES', 20))
+    # Progress file for 'build_recommender.py precompute', removed when a run completes
+    RECOMMENDER_PRECOMPUTE_CHECKPOINT = os.getenv(
+        'RECOMMENDER_PRECOMPUTE_CHECKPOINT',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'precompute_checkpoint.json')
+    )
+    # Optional reading-list factors for collaborative scores, trained with
+    # 'build_recommender.py collaborative'
+    RECOMMENDER_CF_PATH = os.getenv(
+        'RECOMMENDER_CF_PATH',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'collaborative_model.npz')
+    )
+    # Memory-budgeted scoring (see memory_budget.py): float32 vectors with int32
+    # indices, at most RECOMMENDER_MAX_VOCABULARY terms and
+    # RECOMMENDER_MAX_DOC_TOKENS tokens of each description
+    RECOMMENDER_MEMORY_BUDGET = os.getenv('RECOMMENDER_MEMORY_BUDGET', '').lower() in ('1', 'true', 'yes')
+    RECOMMENDER_MAX_VOCABULARY = int(os.getenv('RECOMMENDER_MAX_VOCABULARY', 50000))
+    RECOMMENDER_MAX_DOC_TOKENS = int(os.getenv('RECOMMENDER_MAX_DOC_TOKENS', 300))
+    # Book fields whose description tokens are kept between requests (tokenizer.py)
+    RECOMMENDER_TOKEN_CACHE_SIZE = int(os.getenv('RECOMMENDER_TOKEN_CACHE_SIZE', 50000))
+    # Books kept per book in the "readers also added" co-occurrence index
+    RECOMMENDER_COOCCURRENCE_NEIGHBOURS = int(os.getenv('RECOMMENDER_COOCCURRENCE_NEIGHBOURS', 50))
+    # "Readers also added" counts built with 'build_recommender.py cooccurrence'
+    RECOMMENDER_COOCCURRENCE_PATH = os.getenv(
+        'RECOMMENDER_COOCCURRENCE_PATH',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'cooccurrence_index.npz')
+    )
+    # Optional approximate nearest-neighbour index over the catalog's book vectors
+    RECOMMENDER_INDEX_PATH = os.getenv(
+        'RECOMMENDER_INDEX_PATH',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'recommender_index.npz')
+    )
\ No newline at end of file
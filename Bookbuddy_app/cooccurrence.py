@@ -0,0 +1,197 @@
+"""'Readers who added this also added' from the ReadingList table.
+
+Two books co-occur when the same user has both on their reading list. The
+index is a sparse book x book matrix of co-occurrence counts, stored as one
+small dict of neighbour counts per book, and it is never rebuilt: it keeps the
+highest ReadingList ID it has seen and only applies the entries added since.
+An entry pairs its book with the books already on that user's list, so every
+pair is counted once, by whichever entry came second.
+
+Each book keeps at most `max_neighbours` counts. When a new neighbour turns up
+for a book that is full, it takes the place of the weakest one and inherits
+its count plus one (the Space-Saving scheme), so memory stays bounded while
+books that are often listed together stay in. Counts past the limit can
+therefore be slight overestimates. Removed entries and status changes don't
+change the counts.
+
+A lookup sorts one book's neighbours, so it costs O(neighbours) however large
+the reading lists get, and it never queries the ReadingList table.
+
+'python build_recommender.py cooccurrence' counts the whole table offline and
+saves the index as a versioned .npz file, which every worker loads at
+start-up. A worker only catches up on newer entries when a reading list is
+written to (see catch_up()), so the first catch-up reads the entries added
+since the build rather than the whole table. Entries other workers add show up
+in this worker after its next write, or after the next build.
+"""
+import logging
+import os
+import threading
+
+import numpy as np
+
+from catalog_index import candidate_id
+from extensions import db
+from models import Book, ReadingList
+
+logger = logging.getLogger(__name__)
+
+# Bump this whenever the file layout changes
+COOCCURRENCE_FORMAT_VERSION = 1
+
+# Default for RECOMMENDER_COOCCURRENCE_NEIGHBOURS
+DEFAULT_MAX_NEIGHBOURS = 50
+# Books shown under "Readers also added"
+DEFAULT_LIMIT = 5
+
+
+class CooccurrenceIndex:
+    def __init__(self, max_neighbours=DEFAULT_MAX_NEIGHBOURS):
+        self.max_neighbours = max_neighbours
+        self.last_entry_id = 0
+        self._neighbours = {}  # book ID -> {book ID: count}
+        self._book_ids = {}    # candidate ID (see candidate_id) -> book ID
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._neighbours)
+
+    def _count(self, book_id, other_id):
+        counts = self._neighbours.setdefault(book_id, {})
+        if other_id in counts or len(counts) < self.max_neighbours:
+            counts[other_id] = counts.get(other_id, 0) + 1
+            return
+        weakest = min(counts, key=counts.get)
+        counts[other_id] = counts.pop(weakest) + 1
+
+    def add(self, book_id, listed_book_ids):
+        """Count a book added to a list that already holds `listed_book_ids`"""
+        with self._lock:
+            for other_id in listed_book_ids:
+                if other_id != book_id:
+                    self._count(book_id, other_id)
+                    self._count(other_id, book_id)
+
+    def catch_up(self):
+        """Apply the reading-list entries added since the last call (or the build); returns how many there were"""
+        with self._lock:
+            new_entries = db.session.query(
+                ReadingList.id.label('entry_id'), ReadingList.user_id, Book.id, Book.summary
+            ).join(Book, Book.id == ReadingList.book_id).filter(
+                ReadingList.id > self.last_entry_id
+            ).order_by(ReadingList.id).all()
+            if not new_entries:
+                return 0
+
+            # What the users were already reading before their new entries
+            listed = {}
+            earlier = db.session.query(ReadingList.user_id, ReadingList.book_id).filter(
+                ReadingList.user_id.in_({entry.user_id for entry in new_entries}),
+                ReadingList.id <= self.last_entry_id
+            )
+            for user_id, book_id in earlier:
+                listed.setdefault(user_id, set()).add(book_id)
+
+            for entry in new_entries:
+                self._book_ids[str(candidate_id(entry))] = entry.id
+                user_books = listed.setdefault(entry.user_id, set())
+                if entry.id not in user_books:
+                    self.add(entry.id, user_books)
+                    user_books.add(entry.id)
+            self.last_entry_id = new_entries[-1].entry_id
+            return len(new_entries)
+
+    def save(self, path):
+        """Write the counts to a versioned .npz file"""
+        with self._lock:
+            pairs = [(book_id, other_id, count)
+                     for book_id, counts in self._neighbours.items()
+                     for other_id, count in counts.items()]
+            keys = list(self._book_ids.items())
+            last_entry_id = self.last_entry_id
+        pairs = np.array(pairs, dtype=np.int64).reshape(-1, 3)
+        with open(path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                format_version=np.array(COOCCURRENCE_FORMAT_VERSION),
+                max_neighbours=np.array(self.max_neighbours),
+                last_entry_id=np.array(last_entry_id),
+                pairs=pairs,
+                keys=np.array([key for key, _ in keys], dtype=str),
+                key_book_ids=np.array([book_id for _, book_id in keys], dtype=np.int64)
+            )
+
+    @classmethod
+    def load(cls, path):
+        """Read counts written by save(), rejecting unknown format versions"""
+        with np.load(path, allow_pickle=False) as data:
+            format_version = int(data['format_version'])
+            if format_version != COOCCURRENCE_FORMAT_VERSION:
+                raise ValueError(
+                    f"Unsupported co-occurrence index format {format_version} "
+                    f"(expected {COOCCURRENCE_FORMAT_VERSION}); rebuild it with build_recommender.py"
+                )
+            index = cls(int(data['max_neighbours']))
+            index.last_entry_id = int(data['last_entry_id'])
+            for book_id, other_id, count in data['pairs'].tolist():
+                index._neighbours.setdefault(book_id, {})[other_id] = count
+            index._book_ids = dict(zip(data['keys'].tolist(), data['key_book_ids'].tolist()))
+        return index
+
+    def book_id(self, key):
+        """The book ID behind a candidate ID (a Google Books ID or a book ID), if anyone listed it"""
+        return self._book_ids.get(str(key))
+
+    def neighbours(self, book_id, limit=DEFAULT_LIMIT):
+        """[(book ID, count), ...] of the books most often listed with this one"""
+        with self._lock:
+            counts = list(self._neighbours.get(book_id, {}).items())
+        counts.sort(key=lambda item: (-item[1], item[0]))
+        return counts[:limit]
+
+
+# Process-wide index, see load_cooccurrence_index()
+_index = CooccurrenceIndex()
+
+
+def load_cooccurrence_index(config):
+    """Load the index built offline (RECOMMENDER_COOCCURRENCE_PATH), or start an empty one
+
+    Either way it learns about newer reading-list entries on the next write.
+    """
+    global _index
+    _index = CooccurrenceIndex(config.get('RECOMMENDER_COOCCURRENCE_NEIGHBOURS', DEFAULT_MAX_NEIGHBOURS))
+    path = config.get('RECOMMENDER_COOCCURRENCE_PATH')
+    if path and os.path.exists(path):
+        try:
+            _index = CooccurrenceIndex.load(path)
+            logger.info(f"Loaded co-occurrence index ({len(_index)} books, up to entry "
+                        f"{_index.last_entry_id}) from {path}")
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Could not load co-occurrence index from {path}: {str(e)}")
+    return _index
+
+
+def get_cooccurrence_index():
+    """The process-wide index; call its catch_up() after writing to a reading list"""
+    return _index
+
+
+def also_added(keys, limit=DEFAULT_LIMIT):
+    """{key: [Book, ...]} of the books most often listed together with each book
+
+    `keys` are candidate IDs (see catalog_index.candidate_id); books nobody
+    has listed get an empty list. Only the Book rows of the neighbours are
+    queried.
+    """
+    index = get_cooccurrence_index()
+    neighbours = {}
+    for key in keys:
+        book_id = index.book_id(key)
+        neighbours[key] = [other_id for other_id, _ in index.neighbours(book_id, limit)] if book_id else []
+    wanted = {other_id for other_ids in neighbours.values() for other_id in other_ids}
+    books = {book.id: book for book in Book.query.filter(Book.id.in_(wanted))} if wanted else {}
+    return {
+        key: [books[other_id] for other_id in other_ids if other_id in books]
+        for key, other_ids in neighbours.items()
+    }
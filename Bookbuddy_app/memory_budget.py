@@ -0,0 +1,192 @@
+"""Memory-budgeted scoring and peak-RSS reporting for the recommender.
+
+By default text vectors are scikit-learn's float64 sparse matrices. With
+RECOMMENDER_MEMORY_BUDGET on, every vectorizer produces float32 data with
+int32 indices instead (like the stored catalog vectors in book_features.py),
+which halves the size of the candidate matrices and of the dense score blocks
+computed from them. Two caps bound the rest:
+
+  * RECOMMENDER_MAX_VOCABULARY: at most this many terms (columns). A loaded
+    model keeps its most widespread terms, the per-request vectorizer its most
+    frequent ones, and the hashing featurizer hashes into no more columns.
+  * RECOMMENDER_MAX_DOC_TOKENS: book descriptions are cut after this many
+    tokens before they are vectorized.
+
+Scores move by float32 rounding only (about 1e-7), unless a cap drops terms.
+Rebuild the stored book vectors ('build_recommender.py vectors') after
+changing RECOMMENDER_MAX_DOC_TOKENS.
+
+track_peak_rss() reports the peak resident set size of a block of code, for
+benchmarks (benchmarks/bench_memory_budget.py) and one-off diagnostics. On
+Linux it resets the kernel's high-water mark (/proc/self/clear_refs) at the
+start of the block; elsewhere it reports the peak of the process so far. The
+reset is process-wide, so a reading is only the block's own peak when nothing
+else runs in the process meanwhile: keep it off the request path, where other
+threads would reset and inflate each other's peaks.
+
+On the request path, record_peak_rss() adds per-call figures to a timing span
+instead (see request_timing.py). It only reads the process's lifetime peak
+(ru_maxrss) before and after the call, so nothing is reset: the growth is how
+far the call raised that peak, 0 when it stayed under an earlier one.
+"""
+import logging
+import re
+import resource
+import sys
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import scipy.sparse as sp
+
+from recommender_model import TOKEN_PATTERN
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(TOKEN_PATTERN)
+
+
+def truncate_tokens(text, max_tokens):
+    """The text up to and including its max_tokens-th token"""
+    if not text or not max_tokens:
+        return text
+    for count, match in enumerate(_TOKEN.finditer(text), 1):
+        if count == max_tokens:
+            return text[:match.end()]
+    return text
+
+
+def compact_csr(matrix, dtype=np.float32):
+    """CSR copy of a sparse matrix with `dtype` data and int32 indices (no copy if it already is)"""
+    matrix = sp.csr_matrix(matrix, dtype=dtype)
+    if matrix.nnz < np.iinfo(np.int32).max and matrix.indices.dtype != np.int32:
+        matrix.indices = matrix.indices.astype(np.int32)
+        matrix.indptr = matrix.indptr.astype(np.int32)
+    return matrix
+
+
+def _proc_status_kb(field):
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def current_rss_kb():
+    """Resident set size now, in KiB (None where /proc is unavailable)"""
+    return _proc_status_kb('VmRSS')
+
+
+def peak_rss_kb():
+    """Peak resident set size since the last reset_peak_rss(), in KiB"""
+    peak = _proc_status_kb('VmHWM')
+    if peak is not None:
+        return peak
+    # Without /proc: the peak of the whole process
+    return process_peak_rss_kb()
+
+
+def process_peak_rss_kb():
+    """Peak resident set size of the process since it started, in KiB (never reset)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def reset_peak_rss():
+    """Restart the kernel's peak-RSS counter at the current RSS; False where that isn't possible"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+class RSSUsage:
+    """Peak RSS of one tracked call, filled in when it ends"""
+
+    def __init__(self, label, start_kb):
+        self.label = label
+        self.start_kb = start_kb
+        self.peak_kb = None
+        self.seconds = None
+
+    @property
+    def growth_kb(self):
+        """How far the peak rose above the RSS at the start of the call"""
+        if self.start_kb is None or self.peak_kb is None:
+            return None
+        return max(0, self.peak_kb - self.start_kb)
+
+
+@contextmanager
+def track_peak_rss(label, **details):
+    """Log the peak RSS of the block as '<label>: peak RSS ...' at DEBUG level
+
+    Single-threaded use only: the reset and the peak are process-wide.
+    """
+    reset_peak_rss()
+    usage = RSSUsage(label, current_rss_kb())
+    started = time.perf_counter()
+    try:
+        yield usage
+    finally:
+        usage.seconds = time.perf_counter() - started
+        usage.peak_kb = peak_rss_kb()
+        extra = ''.join(f", {key}={value}" for key, value in details.items())
+        growth = f" (+{usage.growth_kb / 1024:.1f} MiB)" if usage.growth_kb is not None else ''
+        logger.debug(f"{label}: peak RSS {usage.peak_kb / 1024:.1f} MiB{growth} "
+                     f"in {usage.seconds * 1000:.1f} ms{extra}")
+
+
+@contextmanager
+def record_peak_rss(fields):
+    """Add 'peak_rss_kb' and 'peak_rss_growth_kb' for the block to `fields` (e.g. a timing span)
+
+    Safe to use concurrently, as nothing is reset; a block running alongside
+    another can still be credited with growth the other one caused.
+    """
+    before = process_peak_rss_kb()
+    try:
+        yield fields
+    finally:
+        after = process_peak_rss_kb()
+        fields['peak_rss_kb'] = after
+        fields['peak_rss_growth_kb'] = max(0, after - before)
+
+
+class MemoryBudget:
+    def __init__(self, compact=False, max_vocabulary=None, max_doc_tokens=None):
+        self.compact = bool(compact)
+        self.max_vocabulary = int(max_vocabulary) if max_vocabulary else None
+        self.max_doc_tokens = int(max_doc_tokens) if max_doc_tokens else None
+
+    @classmethod
+    def from_config(cls, config):
+        """Budget from RECOMMENDER_MEMORY_BUDGET and friends; the caps only apply with the budget on"""
+        compact = config.get('RECOMMENDER_MEMORY_BUDGET', False)
+        return cls(compact,
+                   config.get('RECOMMENDER_MAX_VOCABULARY') if compact else None,
+                   config.get('RECOMMENDER_MAX_DOC_TOKENS') if compact else None)
+
+    @property
+    def dtype(self):
+        """dtype for text vectors"""
+        return np.float32 if self.compact else np.float64
+
+    def vocabulary_size(self, n_features):
+        """n_features, capped at max_vocabulary"""
+        return min(n_features, self.max_vocabulary) if self.max_vocabulary else n_features
+
+    def truncate(self, text):
+        """A description cut to max_doc_tokens tokens"""
+        return truncate_tokens(text, self.max_doc_tokens)
+
+    def matrix(self, matrix):
+        """A vectorizer output as a compact CSR matrix in budget mode, unchanged otherwise"""
+        return compact_csr(matrix, self.dtype) if self.compact else matrix
@@ -105,5 +105,39 @@ class Book(db.Model):
     # Links to ReadingList to track who's reading this book
     readers = db.relationship('ReadingList', backref='book', lazy='dynamic')
     
+    # Precomputed recommender features, kept up to date by book_features.py
+    feature_vector = db.relationship('BookVector', backref='book', uselist=False,
+                                     cascade='all, delete-orphan')
+    
+    def __repr__(self):
+        return f'<Book {self.title}>'
+
+# BookVector class - Stores a book's recommender feature vector
+# Computed once when the book is added or changed, so scoring never re-reads its text
+class BookVector(db.Model):
+    id = db.Column(db.Integer, primary_key=True)  # Unique ID for each vector
+    book_id = db.Column(db.Integer, db.ForeignKey('book.id'), nullable=False, unique=True)  # Which book
+    model_version = db.Column(db.String(32), nullable=False)  # Recommender model that produced it
+    indices = db.Column(db.LargeBinary, nullable=False)  # Term indices (int32 bytes)
+    weights = db.Column(db.LargeBinary, nullable=False)  # L2-normalised TF-IDF weights (float32 bytes)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # When it was computed
+    
+    def __repr__(self):
+        return f'<BookVector {self.book_id} ({self.model_version})>' 
+
+# PrecomputedRecommendation class - Stores a user's recommendations generated offline
+# by 'build_recommender.py precompute', so the recommendation page can show them straight away
+class PrecomputedRecommendation(db.Model):
+    id = db.Column(db.Integer, primary_key=True)  # Unique ID for each row
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)  # Which user
+    rank = db.Column(db.Integer, nullable=False)  # Position in the list (1 = best match)
+    book_id = db.Column(db.String(64), nullable=False)  # Google Books volume ID
+    book_data = db.Column(db.Text, nullable=False)  # The processed book as JSON
+    similarity = db.Column(db.Float, nullable=False)  # Recommendation score
+    preference_fingerprint = db.Column(db.String(40), nullable=False)  # Preferences it was generated for
+    generated_at = db.Column(db.DateTime, default=datetime.utcnow)  # When it was generated
+    
+    __table_args__ = (db.UniqueConstraint('user_id', 'rank'),)
+    
     def __repr__(self):
-        return f'<Book {self.title}>' 
\ No newline at end of file
+        return f'<PrecomputedRecommendation {self.user_id} #{self.rank}>'
@@ -0,0 +1,269 @@
+"""Offline generation of precomputed recommendations.
+
+'python build_recommender.py precompute' walks every user with saved
+preferences in user ID order. For each batch of users a worker process builds
+the search queries, fetches and filters candidates and scores them, exactly as
+the /recommendation route does (users who end up with the same candidates are
+scored together, see get_recommendations_bulk()); the parent process stores each user's top N
+in the PrecomputedRecommendation table. Progress is written to a checkpoint
+file after every batch, so an interrupted run resumes where it stopped.
+
+The /recommendation page shows these rows straight away for as long as they
+match the user's current preferences (see preference_fingerprint()).
+"""
+import json
+import logging
+import multiprocessing
+import os
+from datetime import datetime
+from types import SimpleNamespace
+
+from sqlalchemy import and_, or_
+
+from extensions import db
+from models import PrecomputedRecommendation, UserPreferences
+from recommendation_cache import PREFERENCE_FIELDS, candidate_fingerprint, preference_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Bump this whenever the checkpoint layout changes
+CHECKPOINT_VERSION = 1
+
+DEFAULT_TOP_N = 5
+# Users handed to a worker at once; the checkpoint advances per batch
+USERS_PER_TASK = 25
+
+
+def preference_snapshot(preferences):
+    """The scoring fields of a UserPreferences row as a plain, picklable object"""
+    return SimpleNamespace(**{field: getattr(preferences, field) for field in PREFERENCE_FIELDS})
+
+
+def save_precomputed(user_id, preferences, recommendations, generated_at=None):
+    """Replace a user's precomputed recommendations; the caller commits"""
+    generated_at = generated_at or datetime.utcnow()
+    fingerprint = preference_fingerprint(preferences)
+    PrecomputedRecommendation.query.filter_by(user_id=user_id).delete()
+    db.session.add_all(
+        PrecomputedRecommendation(user_id=user_id,
+                                  rank=rank,
+                                  book_id=str(rec['book'].get('id')),
+                                  book_data=json.dumps(rec['book']),
+                                  similarity=rec['similarity'],
+                                  preference_fingerprint=fingerprint,
+                                  generated_at=generated_at)
+        for rank, rec in enumerate(recommendations, start=1)
+    )
+
+
+def load_precomputed(user_id, preferences=None):
+    """A user's precomputed recommendations, best first, or None
+
+    When `preferences` is given, rows generated for different preferences
+    count as missing.
+    """
+    rows = PrecomputedRecommendation.query.filter_by(user_id=user_id).order_by(
+        PrecomputedRecommendation.rank
+    ).all()
+    if not rows:
+        return None
+    if preferences is not None and rows[0].preference_fingerprint != preference_fingerprint(preferences):
+        return None
+    return [
+        {
+            'book': json.loads(row.book_data),
+            'similarity': row.similarity,
+            'generated_at': row.generated_at
+        }
+        for row in rows
+    ]
+
+
+def users_with_preferences(after_user_id=0):
+    """UserPreferences rows with at least one answer, in user ID order"""
+    answered = or_(*[
+        and_(getattr(UserPreferences, field).isnot(None), getattr(UserPreferences, field) != '')
+        for field in PREFERENCE_FIELDS
+    ])
+    return UserPreferences.query.filter(UserPreferences.user_id > after_user_id, answered).order_by(
+        UserPreferences.user_id
+    ).all()
+
+
+def fetch_candidates(recommender, user_id, preferences):
+    """(search queries, de-duplicated candidate books) for one user, as the route builds them"""
+    from flask import current_app
+    from Recommendation_test import (
+        get_search_queries_from_preferences, fetch_books_from_google_api, process_google_books_response
+    )
+    user_prefs = recommender.get_user_preference_text(user_id, preferences)
+    queries = get_search_queries_from_preferences(user_prefs)
+    local_books = recommender.local_candidates(user_id, preferences)
+    books = {book['id']: book for book in local_books}
+    if len(local_books) < current_app.config['RECOMMENDER_LOCAL_MIN_CANDIDATES']:
+        for query in queries:
+            for book in process_google_books_response(fetch_books_from_google_api(query)):
+                books[book['id']] = book
+    return queries, list(books.values())
+
+
+def catalog_recommendations(recommender, user_id, preferences, top_n):
+    """Top N from the stored catalog vectors, as the route ranks them, or None when that path doesn't apply
+
+    The route takes it when the local catalog alone has enough candidates and
+    the book vectors for the current model are stored.
+    """
+    from flask import current_app
+    if not recommender.catalog_ready():
+        return None
+    local_books = recommender.local_candidates(user_id, preferences)
+    if len(local_books) < current_app.config['RECOMMENDER_LOCAL_MIN_CANDIDATES']:
+        return None
+    return recommender.recommend_from_catalog(user_id, top_n, preferences)
+
+
+class Checkpoint:
+    """Last user ID whose recommendations were stored, kept in a small JSON file"""
+
+    def __init__(self, path, last_user_id=0, processed=0, started_at=None):
+        self.path = path
+        self.last_user_id = last_user_id
+        self.processed = processed
+        self.started_at = started_at or datetime.utcnow().isoformat()
+
+    @classmethod
+    def load(cls, path):
+        if not path or not os.path.exists(path):
+            return cls(path)
+        with open(path) as f:
+            data = json.load(f)
+        if data.get('version') != CHECKPOINT_VERSION:
+            logger.warning(f"Ignoring checkpoint {path} with unknown version {data.get('version')}")
+            return cls(path)
+        return cls(path, data['last_user_id'], data['processed'], data['started_at'])
+
+    def save(self):
+        if not self.path:
+            return
+        # Write then rename, so a crash never leaves a half-written checkpoint
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({
+                'version': CHECKPOINT_VERSION,
+                'last_user_id': self.last_user_id,
+                'processed': self.processed,
+                'started_at': self.started_at,
+            }, f)
+        os.replace(temp_path, self.path)
+
+    def remove(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _init_worker():
+    """Pool initializer: every worker process runs inside the app context
+
+    Workers read the catalog (local candidates, stored book vectors), so each
+    drops any connections copied from the parent and opens its own.
+    """
+    from app import app
+    app.app_context().push()
+    db.engine.dispose()
+
+
+def _generate_batch(task):
+    """Worker: [(user_id, recommendations or None), ...] for one batch of users
+
+    Users the route would rank from the stored catalog vectors are ranked
+    the same way here. Of the others, those whose candidates came out the
+    same (e.g. the same answers) are scored together with
+    get_recommendations_bulk().
+    """
+    from Recommendation import get_recommender
+    top_n, users = task
+    recommender = get_recommender()
+    generated = {}
+    groups = {}
+    for user_id, preferences in users:
+        try:
+            from_catalog = catalog_recommendations(recommender, user_id, preferences, top_n)
+            if from_catalog is not None:
+                generated[user_id] = from_catalog
+                continue
+            queries, books = fetch_candidates(recommender, user_id, preferences)
+        except Exception as e:
+            logger.error(f"Could not fetch candidates for user {user_id}: {str(e)}")
+            continue
+        group = groups.setdefault(candidate_fingerprint(books), (queries, books, {}))
+        group[2][user_id] = preferences
+
+    for queries, books, group_preferences in groups.values():
+        try:
+            if len(group_preferences) == 1:
+                [(user_id, preferences)] = group_preferences.items()
+                generated[user_id] = recommender.get_recommendations(user_id, books, top_n, preferences,
+                                                                     queries=queries)
+            else:
+                generated.update(recommender.get_recommendations_bulk(list(group_preferences), books, top_n,
+                                                                      group_preferences))
+        except Exception as e:
+            logger.error(f"Could not generate recommendations for users {list(group_preferences)}: {str(e)}")
+    return [(user_id, generated.get(user_id)) for user_id, _ in users]
+
+
+def run(workers=None, top_n=DEFAULT_TOP_N, checkpoint_path=None, restart=False, changed_only=False,
+        batch_size=USERS_PER_TASK):
+    """Generate and store recommendations for every user; returns how many users were stored
+
+    Must be called inside the app context. With workers=1 everything runs in
+    this process. `changed_only` skips users whose stored rows already match
+    their preferences.
+    """
+    checkpoint = Checkpoint(checkpoint_path) if restart else Checkpoint.load(checkpoint_path)
+    if checkpoint.last_user_id:
+        logger.info(f"Resuming after user {checkpoint.last_user_id} ({checkpoint.processed} users done)")
+
+    users = [(row.user_id, preference_snapshot(row)) for row in users_with_preferences(checkpoint.last_user_id)]
+    if changed_only:
+        stored = dict(db.session.query(PrecomputedRecommendation.user_id,
+                                       PrecomputedRecommendation.preference_fingerprint).filter_by(rank=1))
+        users = [(user_id, preferences) for user_id, preferences in users
+                 if stored.get(user_id) != preference_fingerprint(preferences)]
+    tasks = [(top_n, users[start:start + batch_size]) for start in range(0, len(users), batch_size)]
+
+    workers = workers or os.cpu_count() or 1
+    pool = None
+    if workers > 1 and len(tasks) > 1:
+        # Workers read the catalog over connections of their own (see
+        # _init_worker()); don't let them inherit ours
+        db.engine.dispose()
+        pool = multiprocessing.Pool(workers, initializer=_init_worker)
+        results = pool.imap(_generate_batch, tasks)
+    else:
+        results = map(_generate_batch, tasks)
+
+    stored = 0
+    generated_at = datetime.utcnow()
+    try:
+        # imap keeps task order, so the checkpoint only ever moves forward
+        for (_, batch), batch_results in zip(tasks, results):
+            snapshots = dict(batch)
+            for user_id, recommendations in batch_results:
+                # Keep the old rows when nothing could be generated (e.g. API errors)
+                if recommendations:
+                    save_precomputed(user_id, snapshots[user_id], recommendations, generated_at)
+                    stored += 1
+            db.session.commit()
+
+            checkpoint.last_user_id = batch[-1][0]
+            checkpoint.processed += len(batch)
+            checkpoint.save()
+            logger.info(f"Precomputed recommendations up to user {checkpoint.last_user_id}")
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    checkpoint.remove()
+    return stored
@@ -0,0 +1,99 @@
+"""Cache of finished recommendation lists.
+
+Results are keyed by what they depend on rather than by user:
+
+  * a fingerprint of the preference fields that affect scoring, so users with
+    identical answers share entries and a changed profile simply misses, and
+  * a fingerprint of the candidate books that were scored: their IDs and a
+    hash of the fields they are scored on, as a local copy of a Google Books
+    volume has the volume's ID but not always its description.
+
+The cache also remembers which candidate pool each preference fingerprint was
+last scored against, so a repeat form submission can be answered before any
+Google Books query is made. Entries expire after a TTL and the least recently
+used ones are evicted first.
+"""
+import hashlib
+import json
+import threading
+
+from cachetools import TTLCache
+
+# UserPreferences fields that change the search queries or the scores
+# (pace, reading_goal etc. don't)
+PREFERENCE_FIELDS = ('genres', 'theme', 'mood', 'style', 'language', 'length', 'maturity')
+# Comma-separated multi-select fields; their order doesn't matter
+LIST_FIELDS = ('genres', 'theme', 'language')
+# Book fields the scores are computed from: the text (see
+# BookRecommender.get_book_fields) and the structured features
+SCORED_BOOK_FIELDS = ('categories', 'description', 'authors', 'language', 'pageCount', 'maturityRating')
+
+
+def preference_fingerprint(preference):
+    """Canonical hash of a UserPreferences row's scoring fields"""
+    canonical = {}
+    for field in PREFERENCE_FIELDS:
+        value = (getattr(preference, field, None) or '').strip().lower() if preference else ''
+        if field in LIST_FIELDS:
+            value = ','.join(sorted(item.strip() for item in value.split(',') if item.strip()))
+        canonical[field] = value
+    return hashlib.sha1(json.dumps(canonical, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def book_content_hash(book):
+    """Hash of the fields a book is scored on (like the text hash TokenCache keeps)"""
+    return hash(tuple(
+        tuple(value) if isinstance(value, list) else value
+        for value in (book.get(field) for field in SCORED_BOOK_FIELDS)
+    ))
+
+
+def candidate_fingerprint(book_list):
+    """Order-independent hash of the candidate book IDs and contents"""
+    digest = hashlib.sha1()
+    for book_id, content in sorted((str(book.get('id')), book_content_hash(book)) for book in book_list):
+        digest.update(book_id.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(str(content).encode('ascii'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class RecommendationCache:
+    def __init__(self, maxsize, ttl):
+        # (preference fp, candidate fp, k) -> recommendation list
+        self._results = TTLCache(maxsize=maxsize, ttl=ttl)
+        # preference fp -> candidate fp of the pool it was last scored against
+        self._pools = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, preference_fp, candidate_fp, k):
+        """Cached recommendations, or None"""
+        with self._lock:
+            recommendations = self._results.get((preference_fp, candidate_fp, k))
+            if recommendations is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        # Callers add per-user fields (e.g. reading status) to the result dicts
+        return [dict(rec) for rec in recommendations]
+
+    def latest(self, preference_fp, k):
+        """Recommendations for the pool these preferences were last scored against"""
+        with self._lock:
+            candidate_fp = self._pools.get(preference_fp)
+        if candidate_fp is None:
+            return None
+        return self.get(preference_fp, candidate_fp, k)
+
+    def put(self, preference_fp, candidate_fp, k, recommendations):
+        with self._lock:
+            self._results[(preference_fp, candidate_fp, k)] = [dict(rec) for rec in recommendations]
+            self._pools[preference_fp] = candidate_fp
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+            self._pools.clear()
@@ -0,0 +1,128 @@
+"""Streaming fetch -> filter -> score for the /recommendation route.
+
+Instead of fetching every search query, collecting all the books and scoring
+them at the end, candidate pages are pulled one at a time from a generator:
+each page is fetched, filtered, de-duplicated and scored as it arrives, and
+only the k best books seen so far are kept (TopK, a bounded min-heap).
+
+Once the top k has come through `patience` pages unchanged and even the k-th
+book scores at least `min_score`, the remaining queries are never fetched:
+the generator is simply not advanced. Only the top k are kept, and they are
+the result: their explanations come from re-scoring just those k books, so
+no candidate is scored twice and nothing is pooled (the pages never fetched
+would be missing from a pool).
+
+A book that comes up again on a later page keeps its first copy, as in the
+route's de-duplication (local books come first).
+
+Pages can only be compared with a fixed vocabulary (the pre-fitted TF-IDF
+model or the hashing featurizer, see can_stream()). The per-request TF-IDF
+fallback fits its IDF on each page, so the top k and the early stop would
+compare scores on different scales.
+"""
+import heapq
+
+# Defaults for RECOMMENDER_STREAM_MIN_SCORE / RECOMMENDER_STREAM_PATIENCE
+DEFAULT_MIN_SCORE = 0.3
+DEFAULT_PATIENCE = 1
+
+
+class TopK:
+    """The k best (score, book) pairs offered so far
+
+    Ties keep the book offered first, like top_k_indices().
+    """
+
+    def __init__(self, k):
+        self.k = k
+        self._heap = []  # (score, -arrival, book); the worst kept book is at the top
+        self._arrivals = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    @property
+    def full(self):
+        return len(self._heap) >= self.k
+
+    def threshold(self):
+        """Score of the k-th best book, or None until k books were offered"""
+        return self._heap[0][0] if self.full and self.k > 0 else None
+
+    def offer(self, scores, books):
+        """Add scored books; True when any of them made it into the top k"""
+        changed = False
+        for score, book in zip(scores, books):
+            entry = (float(score), -self._arrivals, book)
+            self._arrivals += 1
+            if len(self._heap) < self.k:
+                heapq.heappush(self._heap, entry)
+                changed = True
+            elif self.k > 0 and entry[:2] > self._heap[0][:2]:
+                heapq.heapreplace(self._heap, entry)
+                changed = True
+        return changed
+
+    def ranked(self):
+        """[{'book', 'similarity'}, ...], best first"""
+        return [
+            {'book': book, 'similarity': score}
+            for score, _, book in sorted(self._heap, key=lambda entry: entry[:2], reverse=True)
+        ]
+
+    def books(self):
+        """The kept books, best first"""
+        return [rec['book'] for rec in self.ranked()]
+
+
+def can_stream(recommender):
+    """Whether page scores are comparable: the recommender has a fixed-vocabulary featurizer"""
+    return recommender.model is not None
+
+
+def fetch_pages(queries, fetch, process):
+    """Lazily yield (query, processed books); a query is only fetched when asked for"""
+    for query in queries:
+        yield query, process(fetch(query))
+
+
+class StreamResult:
+    def __init__(self, recommendations, pages_scored, books_scored, stopped_early):
+        self.recommendations = recommendations
+        self.pages_scored = pages_scored
+        self.books_scored = books_scored
+        self.stopped_early = stopped_early
+
+
+def stream_recommendations(recommender, user_id, pages, k=5, preferences=None,
+                           min_score=DEFAULT_MIN_SCORE, patience=DEFAULT_PATIENCE, explain=False):
+    """Score candidate pages as they arrive and stop once the top k is settled
+
+    `pages` yields (source, books) pairs, e.g. from fetch_pages(). Returns a
+    StreamResult; its recommendations are what get_recommendations() returns
+    (explanations included with explain=True). Check can_stream() first.
+    """
+    profile = recommender.get_user_profile(user_id, preferences)
+    top = TopK(k)
+    seen = set()
+    unchanged = 0
+    pages_scored = books_scored = 0
+    stopped_early = False
+
+    for _, books in pages:
+        fresh = []
+        for book in books:
+            if book['id'] not in seen:
+                seen.add(book['id'])
+                fresh.append(book)
+        pages_scored += 1
+        books_scored += len(fresh)
+
+        changed = bool(fresh) and top.offer(recommender.score_books(profile, fresh, user_id), fresh)
+        unchanged = 0 if changed else unchanged + 1
+        if top.full and unchanged >= patience and top.threshold() >= min_score:
+            stopped_early = True
+            break
+
+    recommendations = recommender.rank_books(user_id, profile, top.books(), k, explain)
+    return StreamResult(recommendations, pages_scored, books_scored, stopped_early)
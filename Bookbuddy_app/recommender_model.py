@@ -0,0 +1,171 @@
+"""Pre-fitted text model for the book recommender.
+
+The model (vocabulary, IDF weights and stop-word handling) is fitted offline on
+the book catalog with build_recommender.py and saved as a versioned .npz file.
+At request time it is only ever used to transform text, so no vectorizer is
+fitted while a user is waiting and scores are comparable across requests.
+
+HashingFeaturizer is a stateless alternative with the same interface: terms
+are hashed into a fixed number of columns, so there is nothing to fit, save or
+share, and every worker process produces identical vectors.
+
+Both tokenize with tokenizer.Tokenizer; pass `keys` (e.g. (book ID, field))
+to transform() or transform_raw() to reuse the cached tokens of book texts
+seen before. Both take a `dtype` for the vectors they produce: float64 by default, float32
+in the memory-budgeted mode (see memory_budget.py).
+"""
+import hashlib
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import CountVectorizer, HashingVectorizer, TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+from tokenizer import Tokenizer, pretokenized
+
+# Bump this whenever the on-disk layout changes
+MODEL_FORMAT_VERSION = 1
+
+TOKEN_PATTERN = r'\b\w+\b'
+
+# Columns used by HashingFeaturizer; 2**18 keeps collisions rare for book text
+DEFAULT_HASH_FEATURES = 2 ** 18
+
+
+class RecommenderModel:
+    def __init__(self, terms, idf, stop_words, token_pattern=TOKEN_PATTERN, dtype=np.float64):
+        self.terms = [str(term) for term in terms]
+        self.idf = np.asarray(idf, dtype=np.float64)
+        self.dtype = np.dtype(dtype)
+        self.stop_words = sorted(str(word) for word in stop_words)
+        self.token_pattern = str(token_pattern)
+
+        if len(self.terms) != len(self.idf):
+            raise ValueError("Model vocabulary and IDF weights have different lengths")
+
+        self.vocabulary = {term: index for index, term in enumerate(self.terms)}
+        self.version = self._compute_version()
+
+        # Counting only - the IDF weights are applied in transform_raw()
+        self.tokenizer = Tokenizer(self.token_pattern, self.stop_words)
+        self._counter = CountVectorizer(vocabulary=self.vocabulary,
+                                        analyzer=pretokenized,
+                                        dtype=self.dtype)
+        self._idf_diagonal = sp.diags(self.idf.astype(self.dtype))
+
+    @classmethod
+    def fit(cls, texts, stop_words='english', min_df=1, max_features=None):
+        """Fit vocabulary and IDF weights on a catalog of book texts"""
+        vectorizer = TfidfVectorizer(stop_words=stop_words,
+                                     min_df=min_df,
+                                     max_features=max_features,
+                                     analyzer='word',
+                                     token_pattern=TOKEN_PATTERN)
+        vectorizer.fit(texts)
+        return cls(vectorizer.get_feature_names_out(),
+                   vectorizer.idf_,
+                   vectorizer.get_stop_words() or [])
+
+    def truncated(self, max_terms):
+        """The same model keeping only the max_terms terms found in most books (lowest IDF)"""
+        if max_terms is None or max_terms >= self.n_features:
+            return self
+        keep = np.sort(np.argsort(self.idf, kind='stable')[:max_terms])
+        return type(self)([self.terms[i] for i in keep], self.idf[keep], self.stop_words, self.token_pattern,
+                          self.dtype)
+
+    def _compute_version(self):
+        digest = hashlib.sha1()
+        digest.update('\n'.join(self.terms).encode('utf-8'))
+        digest.update(self.idf.tobytes())
+        digest.update('\n'.join(self.stop_words).encode('utf-8'))
+        digest.update(self.token_pattern.encode('utf-8'))
+        return digest.hexdigest()[:12]
+
+    @property
+    def n_features(self):
+        return len(self.terms)
+
+    def transform_raw(self, texts, keys=None):
+        """TF-IDF weights without length normalisation (CSR, one row per text)"""
+        counts = self._counter.transform(self.tokenizer.tokenize_all(texts, keys))
+        return (counts @ self._idf_diagonal).tocsr()
+
+    def transform(self, texts, keys=None):
+        """L2-normalised TF-IDF vectors, same as a fitted TfidfVectorizer"""
+        return normalize(self.transform_raw(texts, keys), norm='l2', copy=False)
+
+    def save(self, path):
+        """Write the model to a versioned .npz file"""
+        with open(path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                format_version=np.array(MODEL_FORMAT_VERSION),
+                model_version=np.array(self.version),
+                terms=np.array(self.terms, dtype=str),
+                idf=self.idf,
+                stop_words=np.array(self.stop_words, dtype=str),
+                token_pattern=np.array(self.token_pattern)
+            )
+
+    @classmethod
+    def load(cls, path, dtype=np.float64):
+        """Read a model written by save(), rejecting unknown format versions"""
+        with np.load(path, allow_pickle=False) as data:
+            format_version = int(data['format_version'])
+            if format_version != MODEL_FORMAT_VERSION:
+                raise ValueError(
+                    f"Unsupported recommender model format {format_version} "
+                    f"(expected {MODEL_FORMAT_VERSION}); rebuild it with build_recommender.py"
+                )
+            model = cls(data['terms'].tolist(),
+                        data['idf'],
+                        data['stop_words'].tolist(),
+                        str(data['token_pattern']),
+                        dtype)
+
+            if model.version != str(data['model_version']):
+                raise ValueError("Recommender model file is corrupt (version checksum mismatch)")
+        return model
+
+
+class HashingFeaturizer:
+    """Fixed-width hashed term counts in place of a fitted vocabulary
+
+    Nothing is learned from the catalog, so there are no IDF weights: every
+    term a user and a book share counts equally. Vectors only depend on
+    `n_features`, the stop words and the token pattern, which is what the
+    version string encodes.
+    """
+
+    def __init__(self, n_features=DEFAULT_HASH_FEATURES, stop_words='english', token_pattern=TOKEN_PATTERN,
+                 dtype=np.float64):
+        self.token_pattern = str(token_pattern)
+        self.dtype = np.dtype(dtype)
+        self.tokenizer = Tokenizer(self.token_pattern, stop_words)
+        self._hasher = HashingVectorizer(n_features=int(n_features),
+                                         analyzer=pretokenized,
+                                         alternate_sign=False,
+                                         norm=None,
+                                         dtype=self.dtype)
+        self.stop_words = sorted(self.tokenizer.stop_words)
+        self.version = self._compute_version()
+
+    def _compute_version(self):
+        digest = hashlib.sha1()
+        digest.update(str(self.n_features).encode('utf-8'))
+        digest.update('\n'.join(self.stop_words).encode('utf-8'))
+        digest.update(self.token_pattern.encode('utf-8'))
+        return 'hash-' + digest.hexdigest()[:12]
+
+    @property
+    def n_features(self):
+        return self._hasher.n_features
+
+    def transform_raw(self, texts, keys=None):
+        """Hashed term counts without length normalisation (CSR, one row per text)"""
+        return self._hasher.transform(self.tokenizer.tokenize_all(texts, keys)).tocsr()
+
+    def transform(self, texts, keys=None):
+        """L2-normalised hashed term counts"""
+        return normalize(self.transform_raw(texts, keys), norm='l2', copy=False)
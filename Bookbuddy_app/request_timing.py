@@ -0,0 +1,195 @@
+"""Per-stage timing of recommendation requests.
+
+A RequestTimer follows one request through named stages (saving preferences,
+query generation, each Google Books fetch, filtering, scoring, the reading
+list lookups, ...). Spans can nest: the streaming loop fetches pages inside
+its own span, so every span records its self time, without the spans inside
+it. Each stage belongs to a component (google, scorer, database, cache or
+app), and per-request totals by component show at a glance whether a slow
+request waited on Google Books, the scorer or the database.
+
+When the request finishes the timer
+  * logs one structured record on the 'bookbuddy.timing' logger: the record
+    as JSON in the message, and as `record.timing` for log handlers that
+    ship fields, and
+  * adds the total, every stage and every component to process-wide
+    LatencyHistograms (fixed millisecond buckets, so p50 / p90 / p99 can be
+    read off at any time without keeping samples).
+"""
+import bisect
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+timing_logger = logging.getLogger('bookbuddy.timing')
+
+# Upper bounds of the histogram buckets, in milliseconds; the last bucket is open
+BUCKET_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+
+# Which part of the system a stage waits on; unknown stages count as 'app'
+STAGE_COMPONENTS = {
+    'save_preferences': 'database',
+    'cached_results': 'cache',
+    'precomputed_results': 'database',
+    'query_generation': 'app',
+    'pool_lookup': 'cache',
+    'local_candidates': 'database',
+    'google_fetch': 'google',
+    'filter': 'app',
+    'stream': 'scorer',
+    'dedupe': 'app',
+    'catalog_score': 'scorer',
+    'score': 'scorer',
+    'save_precomputed': 'database',
+    'reading_status': 'database',
+    'also_added': 'database',
+    'render': 'app',
+}
+
+
+class Histogram:
+    """Counts of observations (in ms) per bucket of BUCKET_BOUNDS_MS"""
+
+    def __init__(self, bounds=BUCKET_BOUNDS_MS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect.bisect_left(self.bounds, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (the maximum for the open bucket)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for position, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return float(self.bounds[position]) if position < len(self.bounds) else self.max
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum_ms': round(self.total, 3),
+            'max_ms': round(self.max, 3),
+            'p50_ms': self.quantile(0.5),
+            'p90_ms': self.quantile(0.9),
+            'p99_ms': self.quantile(0.99),
+            # In order; the open last bucket has no upper bound
+            'buckets': [{'le_ms': bound, 'count': count}
+                        for bound, count in zip(self.bounds + (None,), self.counts)],
+        }
+
+
+class LatencyHistograms:
+    """Histograms of one route's total, per-stage and per-component times"""
+
+    def __init__(self, bounds=BUCKET_BOUNDS_MS):
+        self.bounds = bounds
+        self.total = Histogram(bounds)
+        self.stages = {}
+        self.components = {}
+        self._lock = threading.Lock()
+
+    def observe(self, record):
+        with self._lock:
+            self.total.observe(record['total_ms'])
+            for stage, ms in record['stage_ms'].items():
+                self.stages.setdefault(stage, Histogram(self.bounds)).observe(ms)
+            for component, ms in record['component_ms'].items():
+                self.components.setdefault(component, Histogram(self.bounds)).observe(ms)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'total': self.total.snapshot(),
+                'stages': {stage: histogram.snapshot() for stage, histogram in self.stages.items()},
+                'components': {name: histogram.snapshot() for name, histogram in self.components.items()},
+            }
+
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def get_latency_histograms(route):
+    with _histograms_lock:
+        return _histograms.setdefault(route, LatencyHistograms())
+
+
+def latency_snapshot():
+    """{route: histograms snapshot} for every route timed so far"""
+    with _histograms_lock:
+        routes = dict(_histograms)
+    return {route: histograms.snapshot() for route, histograms in routes.items()}
+
+
+def reset_latency_histograms():
+    with _histograms_lock:
+        _histograms.clear()
+
+
+class RequestTimer:
+    def __init__(self, route, clock=time.perf_counter, **fields):
+        self.route = route
+        self.fields = dict(fields)
+        self.spans = []
+        self._clock = clock
+        self._started = clock()
+        self._children = [0.0]  # time spent in nested spans, per open span
+        self.finished = False
+
+    def annotate(self, **fields):
+        """Add request-level fields (candidate counts, where results came from, ...)"""
+        self.fields.update(fields)
+
+    @contextmanager
+    def span(self, stage, **fields):
+        """Time a stage; the yielded dict takes more fields (e.g. counts) while it runs"""
+        span_fields = dict(fields)
+        self._children.append(0.0)
+        start = self._clock()
+        try:
+            yield span_fields
+        finally:
+            elapsed = self._clock() - start
+            self_time = elapsed - self._children.pop()
+            self._children[-1] += elapsed
+            self.spans.append({'stage': stage, 'ms': round(self_time * 1000, 3), **span_fields})
+
+    def record(self, **fields):
+        """The structured record of this request so far"""
+        stage_ms, component_ms = {}, {}
+        for span in self.spans:
+            stage_ms[span['stage']] = stage_ms.get(span['stage'], 0.0) + span['ms']
+            component = STAGE_COMPONENTS.get(span['stage'], 'app')
+            component_ms[component] = component_ms.get(component, 0.0) + span['ms']
+        return {
+            'route': self.route,
+            **self.fields,
+            **fields,
+            'total_ms': round((self._clock() - self._started) * 1000, 3),
+            'stage_ms': {stage: round(ms, 3) for stage, ms in stage_ms.items()},
+            'component_ms': {component: round(ms, 3) for component, ms in component_ms.items()},
+            'spans': self.spans,
+        }
+
+    def finish(self, **fields):
+        """Log the request's record and add it to the route's histograms (once)"""
+        if self.finished:
+            return None
+        self.finished = True
+        record = self.record(**fields)
+        get_latency_histograms(self.route).observe(record)
+        timing_logger.info('%s timing %s', self.route, json.dumps(record, default=str), extra={'timing': record})
+        return record
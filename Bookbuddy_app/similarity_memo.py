@@ -0,0 +1,92 @@
+"""Memo of (preference profile, book) scores.
+
+Most of the recommendation form is select boxes, so many users share the same
+preference fingerprint, and popular Google Books volumes come back for many
+queries. With the pre-fitted model a pair's score only depends on the
+preference fields, the book and the model, so get_recommendations() looks
+each candidate up under (preference fingerprint, book ID, hash of the book's
+scored fields, model version) and only scores the books it hasn't seen with
+these preferences. The hash keeps a local copy of a Google Books volume (same
+ID, often no description) apart from the volume itself.
+
+A memo row keeps the pair's per-feature parts (text fields and structured
+features), not just the total, so cached pairs still get the same scores and
+explanations. Collaborative scores are per user and are added afterwards.
+Rows are evicted least recently used first, and expire after a TTL. hits / misses count pairs, for sizing.
+"""
+import threading
+
+import numpy as np
+from cachetools import TTLCache
+
+from recommendation_cache import book_content_hash
+
+
+class SimilarityMemo:
+    def __init__(self, maxsize, ttl):
+        # (preference fp, book ID, content hash, model version) -> ((text fields, attribute features), values)
+        self._rows = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._rows)
+
+    def lookup(self, preference_fp, model_version, book_list):
+        """The memo row of every book, or None for books not scored with these preferences yet"""
+        rows = []
+        with self._lock:
+            for book in book_list:
+                book_id = book.get('id')
+                row = (self._rows.get((preference_fp, book_id, book_content_hash(book), model_version))
+                       if book_id is not None else None)
+                rows.append(row)
+                if row is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+        return rows
+
+    def store(self, preference_fp, model_version, book_list, text_parts, attribute_scores):
+        """Remember freshly scored books; returns their rows"""
+        layout = (tuple(text_parts), tuple(attribute_scores))
+        columns = [np.asarray(scores, dtype=np.float64).tolist()
+                   for scores in list(text_parts.values()) + list(attribute_scores.values())]
+        rows = [(layout, values) for values in zip(*columns)] if columns else [(layout, ())] * len(book_list)
+        with self._lock:
+            for book, row in zip(book_list, rows):
+                if book.get('id') is not None:
+                    self._rows[(preference_fp, book.get('id'), book_content_hash(book), model_version)] = row
+        return rows
+
+    @staticmethod
+    def assemble(rows):
+        """(text parts, attribute scores) arrays, as score_parts() returns them, from memo rows"""
+        text_fields, attribute_features = {}, {}
+        for (text_names, attribute_names), _ in rows:
+            text_fields.update(dict.fromkeys(text_names))
+            attribute_features.update(dict.fromkeys(attribute_names))
+        text_parts = {field: np.zeros(len(rows)) for field in text_fields}
+        attribute_scores = {feature: np.zeros(len(rows)) for feature in attribute_features}
+        for position, ((text_names, attribute_names), values) in enumerate(rows):
+            for name, value in zip(text_names, values):
+                text_parts[name][position] = value
+            for name, value in zip(attribute_names, values[len(text_names):]):
+                attribute_scores[name][position] = value
+        return text_parts, attribute_scores
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._rows),
+                'maxsize': self._rows.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
@@ -97,6 +97,8 @@ function addToReadingList(bookId, listType) {
         },
         body: JSON.stringify({
             book_id: bookId,
+            // Set when the book came from the local catalog
+            local_id: bookSlide.dataset.localId || null,
             status: listType,
             title: bookTitle,
             author: bookAuthor,
@@ -0,0 +1,171 @@
+"""Structured book attributes scored next to the text similarity.
+
+Language, length and maturity are categorical: a book is either in one of the
+user's languages or it isn't. Rather than turning them into words for TF-IDF
+to match, each candidate's attributes are encoded once into small arrays and
+compared with the user's choices using vectorized comparisons. The per-feature
+scores (all in [0, 1]) are then mixed with the text similarity using the
+configurable RECOMMENDER_FEATURE_WEIGHTS.
+"""
+import numpy as np
+
+# The preferences form sends language names; Google Books uses ISO 639-1 codes
+LANGUAGE_CODES = {
+    'english': 'en',
+    'spanish': 'es',
+    'french': 'fr',
+    'german': 'de',
+}
+
+# Length buckets as worded on the preferences form:
+# short is under 300 pages, medium 300-500, long over 500
+LENGTH_BUCKETS = ('short', 'medium', 'long')
+SHORT_PAGES = 300
+LONG_PAGES = 500
+
+MATURITY_LEVELS = ('NOT_MATURE', 'MATURE')
+
+# Code for an attribute the book doesn't have (e.g. no page count)
+UNKNOWN = -1
+# A missing attribute neither matches nor contradicts the user's choice
+UNKNOWN_SCORE = 0.5
+
+# Maturity score by [user choice][book rating]; the last column is picked by
+# UNKNOWN (-1). Readers who want general content should not get mature books,
+# while readers who are fine with mature content still like general books.
+MATURITY_SCORES = np.array([
+    # book: NOT_MATURE, MATURE, unknown
+    [1.0, 0.0, UNKNOWN_SCORE],  # user: NOT_MATURE
+    [0.5, 1.0, UNKNOWN_SCORE],  # user: MATURE
+])
+
+STRUCTURED_FEATURES = ('language', 'length', 'maturity')
+
+DEFAULT_FEATURE_WEIGHTS = {
+    'text': 1.0,
+    'language': 0.3,
+    'length': 0.15,
+    'maturity': 0.3,
+    # Reading-list factors (collaborative.py); only used when a model is loaded
+    'collaborative': 0.5,
+}
+
+
+def language_code(value):
+    """'English', 'en' and 'en-GB' all become 'en'"""
+    value = (value or '').strip().lower()
+    value = LANGUAGE_CODES.get(value, value)
+    return value.split('-')[0]
+
+
+class PreferenceTargets:
+    """The structured choices from one UserPreferences row (None = no preference)"""
+
+    def __init__(self, languages=(), length=None, maturity=None):
+        self.languages = frozenset(languages)
+        self.length = length
+        self.maturity = maturity
+
+    @classmethod
+    def from_preferences(cls, preference):
+        if not preference:
+            return cls()
+        languages = {language_code(value) for value in (preference.language or '').split(',') if value.strip()}
+        length = (preference.length or '').strip().lower()
+        maturity = (preference.maturity or '').strip().upper()
+        return cls(
+            languages,
+            LENGTH_BUCKETS.index(length) if length in LENGTH_BUCKETS else None,
+            MATURITY_LEVELS.index(maturity) if maturity in MATURITY_LEVELS else None,
+        )
+
+    def __bool__(self):
+        return bool(self.languages) or self.length is not None or self.maturity is not None
+
+
+class BookAttributes:
+    """Encoded language, length bucket and maturity for a list of candidates"""
+
+    def __init__(self, language, length, maturity):
+        self.language = np.asarray(language, dtype=str)
+        self.length = np.asarray(length, dtype=np.int8)
+        self.maturity = np.asarray(maturity, dtype=np.int8)
+
+    def __len__(self):
+        return len(self.language)
+
+    @classmethod
+    def from_books(cls, books):
+        """Encode processed book dicts (missing fields become UNKNOWN)"""
+        pages = np.array([book.get('pageCount') or 0 for book in books], dtype=np.int64)
+        length = np.select([pages <= 0, pages < SHORT_PAGES, pages <= LONG_PAGES], [UNKNOWN, 0, 1], 2)
+        maturity = [
+            MATURITY_LEVELS.index(book.get('maturityRating')) if book.get('maturityRating') in MATURITY_LEVELS
+            else UNKNOWN
+            for book in books
+        ]
+        return cls([language_code(book.get('language')) for book in books], length, maturity)
+
+    def take(self, positions):
+        """Attributes for a subset of the candidates"""
+        return BookAttributes(self.language[positions], self.length[positions], self.maturity[positions])
+
+
+def score_attributes(targets, attributes):
+    """Per-feature scores in [0, 1] for every candidate, for the features the user chose"""
+    scores = {}
+    if targets.languages:
+        matches = np.isin(attributes.language, sorted(targets.languages)).astype(np.float64)
+        scores['language'] = np.where(attributes.language == '', UNKNOWN_SCORE, matches)
+
+    if targets.length is not None:
+        # One bucket off is half a match (a 'medium' reader may take a short book)
+        distance = np.abs(attributes.length - targets.length)
+        scores['length'] = np.select(
+            [attributes.length == UNKNOWN, distance == 0, distance == 1],
+            [UNKNOWN_SCORE, 1.0, 0.5],
+            0.0
+        )
+
+    if targets.maturity is not None:
+        scores['maturity'] = MATURITY_SCORES[targets.maturity][attributes.maturity]
+    return scores
+
+
+def _weight_sum(attribute_scores, weights, use_text):
+    total = weights.get('text', 0.0) if use_text else 0.0
+    return total + sum(weights.get(name, 0.0) for name in attribute_scores)
+
+
+def combine_scores(text_scores, attribute_scores, weights, use_text=True):
+    """Weighted mean of the text similarity and the structured feature scores
+
+    Only features the user expressed a preference for take part, so a user
+    with no structured choices gets exactly the text similarity.
+    """
+    total = np.zeros(len(text_scores))
+    if use_text:
+        total += weights.get('text', 0.0) * np.asarray(text_scores)
+    for name, scores in attribute_scores.items():
+        total += weights.get(name, 0.0) * scores
+    weight_sum = _weight_sum(attribute_scores, weights, use_text)
+    return total / weight_sum if weight_sum else total
+
+
+def explain_score(text_parts, attribute_scores, weights, index, use_text=True):
+    """Each feature's share of one candidate's combined score
+
+    `text_parts` splits the text similarity by book field (see
+    score_breakdown.py). The values add up to what combine_scores() gives
+    that candidate.
+    """
+    weight_sum = _weight_sum(attribute_scores, weights, use_text)
+    if not weight_sum:
+        return {}
+    explanation = {}
+    if use_text:
+        for field, parts in text_parts.items():
+            explanation[field] = float(weights.get('text', 0.0) * parts[index] / weight_sum)
+    for name, scores in attribute_scores.items():
+        explanation[name] = float(weights.get(name, 0.0) * scores[index] / weight_sum)
+    return explanation
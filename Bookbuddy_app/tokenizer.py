@@ -0,0 +1,125 @@
+"""Tokenizer for book and preference text, with a cache of book token lists.
+
+Produces exactly the tokens of scikit-learn's 'word' analyzer (lowercase,
+token_pattern matches, stop words removed), so vectors don't change. The
+pattern (recommender_model.TOKEN_PATTERN for the default tokenizer) and the
+stop-word set are compiled once per tokenizer instead of per vectorizer call.
+
+The same popular books come back for many users' queries, so the tokens of
+each book field are kept in a bounded LRU keyed by (book ID, field). An
+entry also remembers a hash of the text it was made from, and a book whose
+text changed is simply tokenized again. Tokens are stored as one space-joined string per
+field (terms never contain whitespace), which is far smaller than a list of
+separate strings and is split back in C on a hit. The vectorizers in
+recommender_model.py and the per-request fallback in Recommendation.py count
+these token lists directly.
+"""
+import re
+import threading
+
+from cachetools import LRUCache
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+# Default for RECOMMENDER_TOKEN_CACHE_SIZE: book fields whose tokens are kept
+DEFAULT_CACHE_SIZE = 50000
+
+
+def pretokenized(tokens):
+    """Analyzer for vectorizers fed with token lists"""
+    return tokens
+
+
+class TokenCache:
+    """Bounded LRU of token lists, shared by every tokenizer in the process"""
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self._entries = LRUCache(maxsize=maxsize)  # key -> (hash of the text, space-joined tokens)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def maxsize(self):
+        return self._entries.maxsize
+
+    def get(self, key, text):
+        """Space-joined tokens cached for `key`, if they were made from this same text"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == hash(text):
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, key, text, tokens):
+        with self._lock:
+            self._entries[key] = (hash(text), tokens)
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
+
+
+_cache = TokenCache()
+
+
+def set_token_cache_size(maxsize):
+    """Start a new, empty token cache holding up to `maxsize` book fields"""
+    global _cache
+    _cache = TokenCache(maxsize)
+    return _cache
+
+
+def get_token_cache():
+    return _cache
+
+
+class Tokenizer:
+    def __init__(self, token_pattern, stop_words='english'):
+        self.token_pattern = str(token_pattern)
+        self.stop_words = frozenset(ENGLISH_STOP_WORDS if stop_words == 'english' else stop_words or ())
+        self._findall = re.compile(self.token_pattern).findall
+        # Tokenizers with other settings must not share cache entries
+        self._namespace = (self.token_pattern, hash(self.stop_words))
+
+    def tokenize(self, text):
+        """The terms of `text`, as the 'word' analyzer of a scikit-learn vectorizer finds them"""
+        stop_words = self.stop_words
+        return [term for term in self._findall(text.lower()) if term not in stop_words]
+
+    def book_tokens(self, key, text):
+        """tokenize(text), cached under `key` (e.g. (book ID, field))"""
+        if not text:
+            return []
+        cache = _cache
+        cache_key = (self._namespace, key)
+        joined = cache.get(cache_key, text)
+        if joined is not None:
+            return joined.split()
+        tokens = self.tokenize(text)
+        cache.put(cache_key, text, ' '.join(tokens))
+        return tokens
+
+    def tokenize_all(self, texts, keys=None):
+        """Token lists for many texts, lazily; those with a key (not None) go through the cache"""
+        if keys is None:
+            return (self.tokenize(text) for text in texts)
+        return (self.tokenize(text) if key is None else self.book_tokens(key, text)
+                for text, key in zip(texts, keys))
+
+
+_default_tokenizer = None
+
+
+def default_tokenizer():
+    """The tokenizer matching TfidfVectorizer(stop_words='english', token_pattern=TOKEN_PATTERN)"""
+    global _default_tokenizer
+    if _default_tokenizer is None:
+        # recommender_model imports this module, so its pattern is looked up on first use
+        from recommender_model import TOKEN_PATTERN
+        _default_tokenizer = Tokenizer(TOKEN_PATTERN)
+    return _default_tokenizer
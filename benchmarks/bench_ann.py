@@ -0,0 +1,98 @@
+"""Benchmark: recall and latency of the IVF index vs. exact catalog scoring.
+
+Builds a synthetic, topic-structured catalog of TF-IDF vectors (no database
+needed), clusters it with IVFIndex and compares the top-k from probing
+`n_probe` clusters against exact brute-force scoring.
+
+Usage:
+    python benchmarks/bench_ann.py [--books 200000] [--queries 200] [--k 10]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.preprocessing import normalize
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Bookbuddy_app')))
+
+from ann_index import IVFIndex  # noqa: E402
+from book_features import CatalogVectors  # noqa: E402
+from Recommendation import top_k_indices  # noqa: E402
+
+
+def synthetic_vectors(n_docs, rng, vocab_size, topic_terms, doc_length, topic_share=0.7):
+    """L2-normalised TF-IDF-like rows; each doc mostly draws terms from one topic"""
+    topics = rng.integers(0, len(topic_terms), n_docs)
+    n_topic = int(doc_length * topic_share)
+    n_background = doc_length - n_topic
+
+    rows = np.repeat(np.arange(n_docs), doc_length)
+    topic_cols = topic_terms[topics][:, None, :].squeeze(1)[
+        np.arange(n_docs)[:, None], rng.integers(0, topic_terms.shape[1], (n_docs, n_topic))
+    ]
+    # Zipf-distributed background vocabulary
+    background_cols = np.minimum(rng.zipf(1.3, (n_docs, n_background)) - 1, vocab_size - 1)
+    cols = np.concatenate([topic_cols, background_cols], axis=1).ravel()
+
+    counts = sp.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(n_docs, vocab_size))
+    counts.sum_duplicates()
+    return counts
+
+
+def idf_weighted(counts, idf):
+    return normalize((counts @ sp.diags(idf)).tocsr().astype(np.float32), norm='l2')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--books', type=int, default=200_000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--vocab', type=int, default=30_000)
+    parser.add_argument('--topics', type=int, default=300)
+    parser.add_argument('--lists', type=int, default=None)
+    parser.add_argument('--probes', type=int, nargs='*', default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    topic_terms = rng.integers(0, args.vocab, (args.topics, 200))
+
+    book_counts = synthetic_vectors(args.books, rng, args.vocab, topic_terms, doc_length=60)
+    query_counts = synthetic_vectors(args.queries, rng, args.vocab, topic_terms, doc_length=12)
+    df = np.bincount(book_counts.indices, minlength=args.vocab)
+    idf = np.log((1 + args.books) / (1 + df)) + 1
+    catalog = CatalogVectors(np.arange(args.books), idf_weighted(book_counts, idf))
+    queries = idf_weighted(query_counts, idf)
+
+    start = time.perf_counter()
+    index = IVFIndex.build(catalog, 'bench', n_lists=args.lists)
+    print(f"Built IVF index: {args.books:,} books, {index.n_lists} lists in {time.perf_counter() - start:.1f}s\n")
+
+    exact_top = []
+    start = time.perf_counter()
+    for q in range(args.queries):
+        scores = (catalog.matrix @ queries[q].T).toarray().ravel()
+        exact_top.append(set(top_k_indices(scores, args.k).tolist()))
+    exact_ms = (time.perf_counter() - start) * 1000 / args.queries
+
+    print(f"{'method':>12} {'recall@' + str(args.k):>10} {'ms/query':>10} {'speed-up':>9}")
+    print(f"{'exact':>12} {1.0:>10.3f} {exact_ms:>10.2f} {1:>8.1f}x")
+    for n_probe in args.probes:
+        if n_probe > index.n_lists:
+            continue
+        hits = 0
+        start = time.perf_counter()
+        for q in range(args.queries):
+            positions, scores = index.candidates(queries[q], catalog, n_probe=n_probe)
+            top = positions[top_k_indices(scores, args.k)]
+            hits += len(exact_top[q] & set(top.tolist()))
+        ann_ms = (time.perf_counter() - start) * 1000 / args.queries
+        recall = hits / (args.k * args.queries)
+        print(f"{'probe=' + str(n_probe):>12} {recall:>10.3f} {ann_ms:>10.2f} {exact_ms / ann_ms:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Benchmark: columnar (pandas) vs. per-dict processing of Google Books items.
+
+Generates synthetic Google Books `items` (a mix of volumes that pass and fail
+each filter rule) and times the work needed before scoring:
+
+  * per-dict  - process_google_books_response(), then BookAttributes.from_books()
+                and get_book_text() per book, as the app does
+  * columnar  - the same steps as column operations on one pandas frame: the
+                filter rules with Series.str.contains, length buckets and
+                maturity codes with numpy, the feature texts by string
+                concatenation over whole columns
+
+Both paths must produce the same books, attributes and texts. The columnar
+version only lives here: with object-dtype string columns pandas still runs
+one Python call per cell, so it is slower and the app keeps the per-dict path.
+Re-run this before revisiting that, e.g. once arrow-backed strings are
+available.
+
+Usage:
+    python benchmarks/bench_book_batch.py [--items 10000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Bookbuddy_app')))
+
+from Recommendation import BookRecommender  # noqa: E402
+from candidate_filter import REJECTION_REASONS, CandidateFilter, compile_terms  # noqa: E402
+from score_breakdown import BOOK_TEXT_FIELDS  # noqa: E402
+from structured_features import (  # noqa: E402
+    LANGUAGE_CODES, LONG_PAGES, MATURITY_LEVELS, SHORT_PAGES, UNKNOWN, BookAttributes
+)
+
+CATEGORIES = ['Fiction', 'Juvenile Fiction / Action & Adventure', 'Fantasy', 'Adventure', 'Science',
+              'Non-Fiction', 'Education', 'Self-Help', 'Action and Adventure', 'Romance']
+WORDS = ['hero', 'quest', 'journey', 'magic', 'explore', 'dark', 'discovery', 'love', 'city',
+         'expedition', 'family', 'secret', 'kingdom', 'war', 'island', 'ship', 'storm', 'night']
+
+# Processed book fields, in the order process_google_books_response() builds them
+RECORD_COLUMNS = ('id', 'title', 'authors', 'categories', 'description', 'language', 'pageCount',
+                  'averageRating', 'maturityRating', 'series')
+
+
+def make_items(n, rng):
+    items = []
+    for i in range(n):
+        info = {
+            'title': f"{rng.choice(['The', 'A', 'Series of'])} {rng.choice(WORDS).title()} {i}",
+            'authors': [f'Author {rng.integers(500)}'],
+            'description': ' '.join(rng.choice(WORDS, rng.integers(20, 80))).capitalize(),
+            'categories': list(rng.choice(CATEGORIES, rng.integers(1, 3), replace=False)),
+            'language': str(rng.choice(['en', 'en-GB', 'es', 'fr'])),
+            'pageCount': int(rng.choice([0, 150, 320, 480, 650])),
+            'averageRating': float(rng.choice([3.5, 4.0, 4.5])),
+            'maturityRating': str(rng.choice(['NOT_MATURE', 'MATURE'])),
+        }
+        if rng.random() < 0.05:
+            del info['description']
+        items.append({'id': f'vol{i}', 'volumeInfo': info})
+    return items
+
+
+def per_dict(items, recommender):
+    books = CandidateFilter.from_rules().process(items)
+    return books, BookAttributes.from_books(books), [recommender.get_book_text(book) for book in books]
+
+
+def volumes_frame(items):
+    """One row per volume, with the volumeInfo fields the recommender reads"""
+    infos = [item.get('volumeInfo', {}) for item in items]
+
+    def column(values):
+        # object dtype keeps the values exactly as Google sent them (ints stay ints)
+        return pd.Series(values, dtype=object)
+
+    return pd.DataFrame({
+        'id': column([item.get('id') for item in items]),
+        'title': column([info.get('title') for info in infos]),
+        'authors': column([info.get('authors') for info in infos]),
+        'categories': column([info.get('categories', []) for info in infos]),
+        'description': column([info.get('description') for info in infos]),
+        'language': column([info.get('language', 'unknown') for info in infos]),
+        'pageCount': column([info.get('pageCount', 0) for info in infos]),
+        'averageRating': column([info.get('averageRating', 0) for info in infos]),
+        'maturityRating': column([info.get('maturityRating', 'NOT_MATURE') for info in infos]),
+    })
+
+
+def filter_frame(frame, rules):
+    """The rows passing every rule, with the columns process_google_books_response() returns"""
+    description = frame['description'].fillna('').str.lower()
+    # Categories are lowercased one by one, then matched as one string
+    joined_categories = frame['categories'].str.join(' ').str.lower()
+    reasons = [
+        ~(frame['title'].astype(bool) & frame['authors'].astype(bool) & description.astype(bool)).to_numpy(bool)
+    ]
+    for rule, texts, rejected_when in (('include_categories', joined_categories, False),
+                                       ('exclude_categories', joined_categories, True),
+                                       ('description_keywords', description, False)):
+        pattern = compile_terms(rules[rule])
+        if pattern is None:
+            reasons.append(np.zeros(len(frame), dtype=bool))
+        else:
+            reasons.append(texts.str.contains(pattern, regex=True).to_numpy(bool) == rejected_when)
+    assert len(reasons) == len(REJECTION_REASONS)
+    rejected = np.logical_or.reduce(reasons)
+
+    kept = frame[~rejected].copy()
+    kept['description'] = description[~rejected]
+    kept['categories'] = kept['categories'].map(lambda categories: [cat.lower() for cat in categories])
+    kept['series'] = np.where(kept['title'].str.lower().str.contains('series', regex=False),
+                              'series', 'standalone')
+    return kept[list(RECORD_COLUMNS)].reset_index(drop=True)
+
+
+def frame_attributes(frame):
+    language = frame['language'].fillna('').astype(str).str.strip().str.lower()
+    language = language.replace(LANGUAGE_CODES).str.split('-').str[0]
+    pages = pd.to_numeric(frame['pageCount'], errors='coerce').fillna(0).to_numpy(dtype=np.int64)
+    length = np.select([pages <= 0, pages < SHORT_PAGES, pages <= LONG_PAGES], [UNKNOWN, 0, 1], 2)
+    maturity = frame['maturityRating'].map({level: code for code, level in enumerate(MATURITY_LEVELS)})
+    return BookAttributes(language.to_numpy(), length, maturity.fillna(UNKNOWN).to_numpy(dtype=np.int8))
+
+
+def frame_book_texts(frame):
+    categories = frame['categories'].str.join(' ')
+    authors = frame['authors'].str.join(' ')
+    columns = {
+        'genres': ('genres: ' + categories).where(categories != '', ''),
+        'theme': ('theme: ' + frame['description']).where(frame['description'] != '', ''),
+        'author': ('author: ' + authors).where(authors != '', ''),
+    }
+    texts = columns[BOOK_TEXT_FIELDS[0]].str.lower()
+    for field in BOOK_TEXT_FIELDS[1:]:
+        right = columns[field].str.lower()
+        # Join with a space, skipping empty values
+        joined = texts.where(right == '', texts + ' ' + right)
+        texts = joined.where(texts != '', right)
+    return texts.tolist()
+
+
+def columnar(items):
+    frame = filter_frame(volumes_frame(items), CandidateFilter.from_rules().rules)
+    columns = [frame[column].tolist() for column in RECORD_COLUMNS]
+    books = [dict(zip(RECORD_COLUMNS, row)) for row in zip(*columns)]
+    return books, frame_attributes(frame), frame_book_texts(frame)
+
+
+def best_time(func, *args, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    items = make_items(args.items, rng)
+    recommender = BookRecommender()
+
+    dict_time, (books, attributes, texts) = best_time(per_dict, items, recommender, repeat=args.repeat)
+    frame_time, (frame_books, frame_attrs, frame_texts) = best_time(columnar, items, repeat=args.repeat)
+    assert frame_books == books, "Columnar records differ from process_google_books_response"
+    assert frame_texts == texts, "Columnar texts differ from get_book_text"
+    for name in ('language', 'length', 'maturity'):
+        assert np.array_equal(getattr(frame_attrs, name), getattr(attributes, name)), name
+
+    print(f"{args.items:,} items, {len(books):,} kept")
+    print(f"{'path':>10} {'total (ms)':>11} {'us/item':>8}")
+    for name, seconds in (('per-dict', dict_time), ('columnar', frame_time)):
+        print(f"{name:>10} {seconds * 1000:>11.1f} {seconds / args.items * 1e6:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
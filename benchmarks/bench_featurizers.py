@@ -0,0 +1,145 @@
+"""Benchmark: hashing featurizer vs. the fitted TF-IDF model.
+
+Generates a synthetic catalog of book dicts (topic-structured descriptions,
+categories, authors) and preference profiles, then compares the two
+featurizers on:
+
+  * memory     - bytes held by the featurizer itself, and per stored vector
+  * latency    - featurizing a candidate page and scoring it for one user
+  * agreement  - overlap of each user's top-10 and Spearman correlation of
+                 the full score lists, taking TF-IDF as the reference
+
+Usage:
+    python benchmarks/bench_featurizers.py [--books 20000] [--users 200]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import numpy as np
+from scipy.stats import spearmanr
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Bookbuddy_app')))
+
+from Recommendation import BookRecommender, top_k_indices  # noqa: E402
+from recommender_model import RecommenderModel, HashingFeaturizer  # noqa: E402
+
+GENRES = ['fantasy', 'mystery', 'romance', 'science fiction', 'history', 'thriller',
+          'biography', 'horror', 'poetry', 'juvenile fiction', 'self help', 'travel']
+SYLLABLES = ['ka', 'lo', 'mi', 'ren', 'tha', 'vor', 'el', 'dun', 'sa', 'qui', 'bra', 'ost', 'ne', 'pha']
+
+
+def make_vocabulary(size, rng):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES, rng.integers(2, 5))))
+    return np.array(sorted(words))
+
+
+def make_books(n_books, vocabulary, topic_words, rng):
+    books = []
+    for i in range(n_books):
+        topic = rng.integers(len(topic_words))
+        words = np.concatenate([
+            rng.choice(topic_words[topic], 40),
+            vocabulary[np.minimum(rng.zipf(1.3, 20) - 1, len(vocabulary) - 1)],
+        ])
+        books.append({
+            'id': f'vol{i}',
+            'title': f'Book {i}',
+            'authors': [f'author{rng.integers(n_books // 5 + 1)}'],
+            'categories': [GENRES[topic % len(GENRES)]],
+            'description': ' '.join(words),
+            'language': rng.choice(['en', 'en', 'en', 'fr', 'es']),
+            'pageCount': int(rng.integers(80, 800)),
+            'maturityRating': rng.choice(['NOT_MATURE', 'MATURE'], p=[0.9, 0.1]),
+        })
+    return books
+
+
+def make_preferences(n_users, topic_words, rng):
+    return [
+        SimpleNamespace(
+            genres=GENRES[topic % len(GENRES)],
+            theme=','.join(rng.choice(topic_words[topic], 3)),
+            mood=rng.choice(['dark', 'uplifting', 'curious']),
+            language=rng.choice(['en', 'fr', 'es']),
+            length=rng.choice(['short', 'medium', 'long']),
+            maturity=rng.choice(['NOT_MATURE', 'MATURE']),
+            style=None,
+        )
+        for topic in rng.integers(len(topic_words), size=n_users)
+    ]
+
+
+def measure(label, build):
+    tracemalloc.start()
+    start = time.perf_counter()
+    featurizer = build()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"{label:>8}: built in {elapsed * 1000:8.1f} ms, holds {current / 1e6:6.2f} MB "
+          f"(peak {peak / 1e6:.1f} MB while building)")
+    return featurizer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--books', type=int, default=20_000)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--page', type=int, default=200, help="Candidates scored per request")
+    parser.add_argument('--hash-features', type=int, default=2 ** 18)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    vocabulary = make_vocabulary(20_000, rng)
+    topic_words = [rng.choice(vocabulary, 150, replace=False) for _ in range(60)]
+    books = make_books(args.books, vocabulary, topic_words, rng)
+    users = make_preferences(args.users, topic_words, rng)
+
+    text_source = BookRecommender(model=object())
+    book_texts = [text_source.get_book_text(book) for book in books]
+    user_texts = [text_source.preference_to_match_text(preference) for preference in users]
+
+    print(f"{args.books:,} synthetic books, {args.users} users, {args.page} candidates per request\n")
+    featurizers = {
+        'tfidf': measure('tfidf', lambda: RecommenderModel.fit(book_texts)),
+        'hashing': measure('hashing', lambda: HashingFeaturizer(args.hash_features)),
+    }
+    print()
+
+    scores = {}
+    for name, featurizer in featurizers.items():
+        book_matrix = featurizer.transform(book_texts)
+        user_matrix = featurizer.transform(user_texts)
+        scores[name] = (user_matrix @ book_matrix.T).toarray()
+
+        # Featurize one page of candidates + one user, then score it
+        pages = [book_texts[start:start + args.page] for start in range(0, len(book_texts), args.page)][:50]
+        start = time.perf_counter()
+        for i, page in enumerate(pages):
+            user_vector = featurizer.transform([user_texts[i % len(user_texts)]])
+            (featurizer.transform(page) @ user_vector.T).toarray()
+        per_request = (time.perf_counter() - start) * 1000 / len(pages)
+
+        bytes_per_vector = book_matrix.nnz * 8 / book_matrix.shape[0]  # int32 index + float32 weight
+        print(f"{name:>8}: {featurizer.n_features:>7} features, {bytes_per_vector:6.0f} B/stored vector, "
+              f"{per_request:6.2f} ms per {args.page}-candidate request")
+
+    overlaps, correlations = [], []
+    for row in range(args.users):
+        reference = set(top_k_indices(scores['tfidf'][row], 10).tolist())
+        hashed = set(top_k_indices(scores['hashing'][row], 10).tolist())
+        overlaps.append(len(reference & hashed) / 10)
+        correlations.append(spearmanr(scores['tfidf'][row], scores['hashing'][row]).statistic)
+    print(f"\nRanking agreement vs tfidf: top-10 overlap {np.mean(overlaps):.3f}, "
+          f"Spearman {np.nanmean(correlations):.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Benchmark: memory-budgeted (float32, int32 indices, capped) scoring vs. the default float64.
+
+Scores one large candidate set for one user (BookRecommender.score_books) and
+a block of users against it (the dense block get_recommendations_bulk
+computes), once per mode. Every mode runs in a fresh process, so the peak RSS
+of one doesn't hide the other's. Reported per mode:
+
+  * matrix    - bytes held by the per-field candidate matrix
+  * peak      - growth of the peak RSS while scoring (memory_budget.track_peak_rss)
+  * agreement - overlap of the top 10 with the default mode
+
+Usage:
+    python benchmarks/bench_memory_budget.py [--books 50000] [--users 512]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Bookbuddy_app')))
+
+from bench_featurizers import make_books, make_preferences, make_vocabulary  # noqa: E402
+from Recommendation import BookRecommender, top_k_indices  # noqa: E402
+from memory_budget import MemoryBudget, track_peak_rss  # noqa: E402
+from recommender_model import RecommenderModel  # noqa: E402
+
+MODES = {
+    'default': dict(),
+    'float32': dict(compact=True),
+    'budget': dict(compact=True, max_vocabulary=5000, max_doc_tokens=40),
+}
+
+
+def matrix_bytes(matrix):
+    return matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+
+
+def run_mode(args):
+    rng = np.random.default_rng(0)
+    vocabulary = make_vocabulary(20_000, rng)
+    topic_words = [rng.choice(vocabulary, 150, replace=False) for _ in range(60)]
+    books = make_books(args.books, vocabulary, topic_words, rng)
+    users = make_preferences(args.users, topic_words, rng)
+
+    budget = MemoryBudget(**MODES[args.mode])
+    text_source = BookRecommender(model=object(), budget=budget)
+    fitted = RecommenderModel.fit([text_source.get_book_text(book) for book in books])
+    model = RecommenderModel(fitted.terms, fitted.idf, fitted.stop_words, dtype=budget.dtype)
+    model = model.truncated(budget.max_vocabulary)
+    recommender = BookRecommender(model=model, budget=budget)
+    user_texts = [recommender.preference_to_match_text(preference) for preference in users]
+
+    with track_peak_rss('score_books') as single:
+        scores = recommender.score_books(user_texts[0], books)
+    field_matrix = recommender.vectorize_fields(user_texts[:1], books)[1]
+
+    with track_peak_rss('bulk') as bulk:
+        start = time.perf_counter()
+        user_matrix, book_matrix = recommender.vectorize(user_texts, [recommender.get_book_text(b) for b in books])
+        block = (user_matrix @ book_matrix.T.tocsr()).toarray()
+        bulk_seconds = time.perf_counter() - start
+
+    print(json.dumps({
+        'mode': args.mode,
+        'terms': model.n_features,
+        'matrix_mb': matrix_bytes(field_matrix) / 1e6,
+        'single_peak_mb': single.growth_kb / 1024,
+        'single_ms': single.seconds * 1000,
+        'bulk_peak_mb': bulk.growth_kb / 1024,
+        'bulk_ms': bulk_seconds * 1000,
+        'block_mb': block.nbytes / 1e6,
+        'top10': top_k_indices(scores, 10).tolist(),
+    }))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--books', type=int, default=50_000)
+    parser.add_argument('--users', type=int, default=512)
+    parser.add_argument('--mode', choices=sorted(MODES), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.mode:
+        return run_mode(args)
+
+    print(f"{args.books:,} synthetic candidates, {args.users}-user bulk block\n")
+    print(f"{'mode':>8} {'terms':>7} {'matrix':>9} {'score_books peak':>17} {'bulk peak':>10} "
+          f"{'dense block':>12} {'top-10 overlap':>15}")
+    reference = None
+    for mode in MODES:
+        output = subprocess.run(
+            [sys.executable, __file__, '--books', str(args.books), '--users', str(args.users), '--mode', mode],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        reference = reference or set(result['top10'])
+        overlap = len(reference & set(result['top10'])) / 10
+        print(f"{mode:>8} {result['terms']:>7} {result['matrix_mb']:7.1f}MB "
+              f"{result['single_peak_mb']:9.1f}MB {result['single_ms']:4.0f}ms "
+              f"{result['bulk_peak_mb']:8.1f}MB {result['block_mb']:10.1f}MB {overlap:15.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""Benchmark: how the recommendation pipeline scales with the number of candidates.
+
+For every size (100, 1k, 10k and 100k by default) it generates that many
+synthetic Google Books volumes (the `items` of an API response, most of them
+passing the candidate filter) and UserPreferences rows, then times each stage
+on its own:
+
+  * process_google_books_response  - filtering all the volumes
+  * get_search_queries_from_preferences - one call per preference row
+  * get_book_text                  - one call per kept book
+  * get_recommendations            - top 5 of all kept books for one user, with
+                                     empty caches (a new recommender and token
+                                     cache every repeat)
+  * get_recommendations_warm       - the same for another user's preferences,
+                                     with the book tokens already cached
+
+The text model is fitted on the kept books beforehand (not timed), as
+build_recommender.py would. Results are printed and written as JSON, so runs
+on different commits or machines can be compared; --compare prints the
+speed-up over an earlier results file.
+
+Usage:
+    python benchmarks/bench_scaling.py [--sizes 100 1000 10000 100000] [--repeat 3]
+                                       [--output bench_scaling.json] [--compare old.json]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import scipy
+import sklearn
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Bookbuddy_app')))
+
+from models import UserPreferences  # noqa: E402
+from Recommendation import BookRecommender  # noqa: E402
+from Recommendation_test import get_search_queries_from_preferences, process_google_books_response  # noqa: E402
+from recommender_model import RecommenderModel, HashingFeaturizer  # noqa: E402
+from tokenizer import DEFAULT_CACHE_SIZE, set_token_cache_size  # noqa: E402
+
+DEFAULT_SIZES = (100, 1_000, 10_000, 100_000)
+
+GENRES = ['fantasy', 'mystery', 'romance', 'science fiction', 'history', 'thriller', 'horror', 'adventure']
+CATEGORIES = ['Fiction', 'Juvenile Fiction', 'Fiction / Action & Adventure', 'Adventure',
+              'Fiction / Fantasy', 'Science', 'Education', 'Biography & Autobiography']
+KEYWORDS = ['adventure', 'quest', 'journey', 'expedition', 'explore', 'discovery']
+THEMES = ['magic', 'friendship', 'heroism', 'betrayal', 'survival', 'love', 'war', 'family', 'identity']
+MOODS = ['exciting', 'dark', 'uplifting', 'curious', 'tense', 'funny']
+SYLLABLES = ['ka', 'lo', 'mi', 'ren', 'tha', 'vor', 'el', 'dun', 'sa', 'qui', 'bra', 'ost', 'ne', 'pha']
+
+
+def make_vocabulary(size, rng):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES, rng.integers(2, 5))))
+    return np.array(sorted(words))
+
+
+def make_volumes(n, rng, vocabulary):
+    """Google Books API `items`; about half pass the default candidate filter"""
+    items = []
+    for i in range(n):
+        words = list(vocabulary[np.minimum(rng.zipf(1.3, rng.integers(40, 160)) - 1, len(vocabulary) - 1)])
+        words += list(rng.choice(THEMES + GENRES, 8))
+        if rng.random() < 0.9:
+            words.append(str(rng.choice(KEYWORDS)))
+        rng.shuffle(words)
+        info = {
+            'title': f"The {str(rng.choice(vocabulary)).title()} {i}",
+            'authors': [f'Author {rng.integers(n // 4 + 1)}'],
+            'publisher': f'Press {rng.integers(50)}',
+            'publishedDate': str(rng.integers(1950, 2025)),
+            'description': ' '.join(words).capitalize() + '.',
+            'categories': [str(category) for category in rng.choice(CATEGORIES, rng.integers(1, 3), replace=False)],
+            'language': str(rng.choice(['en', 'en', 'en', 'fr', 'es'])),
+            'pageCount': int(rng.integers(60, 900)),
+            'averageRating': float(rng.choice([3.0, 3.5, 4.0, 4.5, 5.0])),
+            'maturityRating': str(rng.choice(['NOT_MATURE', 'MATURE'], p=[0.9, 0.1])),
+            'imageLinks': {'thumbnail': f'http://books.google.com/books/content?id=vol{i}&img=1'},
+            'previewLink': f'http://books.google.com/books?id=vol{i}',
+        }
+        if rng.random() < 0.05:
+            del info['description']
+        items.append({'kind': 'books#volume', 'id': f'vol{i}', 'volumeInfo': info})
+    return items
+
+
+def make_preferences(n, rng):
+    """Unsaved UserPreferences rows, filled in like the recommendation form does"""
+    return [
+        UserPreferences(
+            user_id=user_id,
+            genres=','.join(rng.choice(GENRES, rng.integers(1, 3), replace=False)),
+            theme=','.join(rng.choice(THEMES, rng.integers(1, 4), replace=False)),
+            mood=str(rng.choice(MOODS)),
+            style=str(rng.choice(['series', 'standalone', ''])),
+            language=str(rng.choice(['en', 'en,fr', 'es'])),
+            length=str(rng.choice(['short', 'medium', 'long', ''])),
+            maturity=str(rng.choice(['NOT_MATURE', 'MATURE', ''])),
+            pace=str(rng.choice(['slow', 'fast'])),
+        )
+        for user_id in range(1, n + 1)
+    ]
+
+
+def time_stage(run, repeat, setup=None):
+    """Wall-clock seconds of `repeat` runs of run(); setup() runs untimed before each"""
+    timings = []
+    for attempt in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        run(attempt)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def fit_featurizer(name, books):
+    if name == 'hashing':
+        return HashingFeaturizer()
+    if name == 'tfidf':
+        text_source = BookRecommender()
+        return RecommenderModel.fit([text_source.get_book_text(book) for book in books])
+    return None  # 'none': a vectorizer fitted per request
+
+
+def run_size(size, args, rng, vocabulary):
+    items = make_volumes(size, rng, vocabulary)
+    preferences = make_preferences(size, rng)
+    results = []
+
+    def record(stage, timings, calls):
+        results.append({
+            'size': size,
+            'stage': stage,
+            'calls': calls,
+            'seconds': {'min': min(timings), 'median': statistics.median(timings), 'mean': statistics.mean(timings)},
+            'us_per_call': min(timings) / calls * 1e6,
+        })
+
+    books = process_google_books_response(items)
+    record('process_google_books_response',
+           time_stage(lambda _: process_google_books_response(items), args.repeat), 1)
+
+    text_source = BookRecommender()
+    preference_texts = [text_source.preference_to_text(preference) for preference in preferences]
+    record('get_search_queries_from_preferences',
+           time_stage(lambda _: [get_search_queries_from_preferences(text) for text in preference_texts],
+                      args.repeat), len(preference_texts))
+
+    record('get_book_text',
+           time_stage(lambda _: [text_source.get_book_text(book) for book in books], args.repeat), len(books))
+
+    model = fit_featurizer(args.featurizer, books)
+    recommenders = []
+
+    def cold_setup():
+        set_token_cache_size(DEFAULT_CACHE_SIZE if size <= DEFAULT_CACHE_SIZE // 3 else size * 3)
+        recommender = BookRecommender(model=model)
+        recommender.model = model
+        recommenders.append(recommender)
+
+    def recommend(attempt, offset=0):
+        preference = preferences[(attempt + offset) % len(preferences)]
+        recommenders[-1].get_recommendations(preference.user_id, books, 5, preference)
+
+    record('get_recommendations', time_stage(recommend, args.repeat, cold_setup), 1)
+    # Caches still hold this size's book tokens; new preferences miss the result cache
+    record('get_recommendations_warm', time_stage(lambda attempt: recommend(attempt, args.repeat), args.repeat), 1)
+
+    for result in results:
+        result['candidates'] = len(books)
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'scipy': scipy.__version__,
+        'scikit-learn': sklearn.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'commit': commit,
+    }
+
+
+def print_table(results, baseline=None):
+    previous = {(result['size'], result['stage']): result for result in (baseline or {}).get('results', [])}
+    print(f"{'size':>7} {'stage':<38} {'min (ms)':>10} {'us/call':>10}" + (f" {'speed-up':>9}" if baseline else ''))
+    for result in results:
+        line = (f"{result['size']:>7} {result['stage']:<38} {result['seconds']['min'] * 1000:>10.2f} "
+                f"{result['us_per_call']:>10.2f}")
+        before = previous.get((result['size'], result['stage']))
+        if before is not None:
+            line += f" {before['seconds']['min'] / result['seconds']['min']:>8.2f}x"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--featurizer', choices=['tfidf', 'hashing', 'none'], default='tfidf',
+                        help="'none' fits a vectorizer per request, as without a model file")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_scaling.json', help="JSON results file ('-' for stdout)")
+    parser.add_argument('--compare', help="Earlier results file to compute speed-ups against")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    vocabulary = make_vocabulary(20_000, rng)
+    results = []
+    for size in args.sizes:
+        results.extend(run_size(size, args, rng, vocabulary))
+        print(f"{size:,} volumes done", file=sys.stderr)
+
+    report = {
+        'benchmark': 'scaling',
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'environment': environment(),
+        'config': {'sizes': args.sizes, 'repeat': args.repeat, 'featurizer': args.featurizer, 'seed': args.seed},
+        'results': results,
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print_table(results, baseline)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Benchmark: partial top-k selection vs. sorting every candidate.
+
+Compares the old get_recommendations ranking (a dict per candidate, then a
+full sorted()) with top_k_indices() on a score array.
+
+Usage:
+    python benchmarks/bench_topk.py [--sizes 10000 1000000] [--k 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Bookbuddy_app')))
+
+from Recommendation import top_k_indices  # noqa: E402
+
+
+def full_sort(books, scores, k):
+    """The ranking get_recommendations used before top-k selection"""
+    similarities = [{'book': book, 'similarity': float(score)} for book, score in zip(books, scores)]
+    return sorted(similarities, key=lambda x: x['similarity'], reverse=True)[:k]
+
+
+def partial_top_k(books, scores, k):
+    return [{'book': books[i], 'similarity': float(scores[i])} for i in top_k_indices(scores, k)]
+
+
+def best_time(func, *args, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='*', default=[10_000, 1_000_000])
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    print(f"{'candidates':>12} {'full sort (ms)':>15} {'top-k (ms)':>12} {'speed-up':>9}")
+    for n in args.sizes:
+        # Round the scores so there are plenty of ties to break
+        scores = np.round(rng.random(n), 3)
+        books = [{'id': f'book{i}'} for i in range(n)]
+
+        sort_time, expected = best_time(full_sort, books, scores, args.k, repeat=args.repeat)
+        topk_time, actual = best_time(partial_top_k, books, scores, args.k, repeat=args.repeat)
+        assert actual == expected, "top-k result differs from full sort"
+
+        print(f"{n:>12,} {sort_time * 1000:>15.2f} {topk_time * 1000:>12.2f} {sort_time / topk_time:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import importlib
+import sys
+from contextlib import contextmanager
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import event
+
+# The root conftest (and some of the mock-based tests) replace sklearn, numpy,
+# pandas and even our own models/extensions modules in sys.modules. Grab the
+# real ones now, before any test module in this folder is collected, so the
+# tests below can exercise the real Recommendation module.
+_MOCKED_PREFIXES = ('sklearn',)
+_REAL_PREFIXES = ('numpy', 'scipy', 'pandas', 'sklearn', 'models', 'extensions', 'config')
+# Our modules that copy sklearn names at import time; the root conftest's app
+# import may have loaded them against the mocks, so they are reloaded in place
+_RELOADED = ('tokenizer',)
+
+
+def _is_module_of(name, prefixes):
+    return any(name == prefix or name.startswith(prefix + '.') for prefix in prefixes)
+
+
+def _capture_real_modules():
+    mocked = {name: module for name, module in sys.modules.items()
+              if _is_module_of(name, _MOCKED_PREFIXES)}
+    for name in mocked:
+        del sys.modules[name]
+
+    import numpy  # noqa: F401
+    import scipy.sparse  # noqa: F401
+    import pandas  # noqa: F401
+    import sklearn.feature_extraction.text  # noqa: F401
+    import sklearn.metrics.pairwise  # noqa: F401
+
+    real = {name: module for name, module in sys.modules.items()
+            if _is_module_of(name, _REAL_PREFIXES)}
+    for name in _RELOADED:
+        if name in sys.modules:
+            importlib.reload(sys.modules[name])
+
+    # Put the mocks back so the existing tests keep seeing what they expect
+    for name in [name for name in sys.modules if _is_module_of(name, _MOCKED_PREFIXES)]:
+        del sys.modules[name]
+    sys.modules.update(mocked)
+    return real
+
+
+REAL_MODULES = _capture_real_modules()
+
+
+@pytest.fixture
+def recommendation_module(test_app):
+    """The real Recommendation module, imported against the real sklearn/numpy"""
+    with patch.dict(sys.modules, REAL_MODULES):
+        sys.modules.pop('Recommendation', None)
+        module = importlib.import_module('Recommendation')
+        yield module
+        # Detach the session hook a loaded model installs for book vectors
+        module.book_features.activate(None)
+
+
+@pytest.fixture
+def count_preference_queries(test_db):
+    """Context manager that collects SELECTs against the user_preferences table"""
+    @contextmanager
+    def counter():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith('SELECT') and 'FROM user_preferences' in statement:
+                statements.append(statement)
+
+        event.listen(test_db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(test_db.engine, 'before_cursor_execute', before_cursor_execute)
+
+    return counter
+
+
+@pytest.fixture
+def sample_books():
+    """Processed books in the shape returned by process_google_books_response"""
+    return [
+        {
+            'id': 'book1',
+            'title': 'The Dragon Quest',
+            'authors': ['Author One'],
+            'categories': ['fiction', 'fantasy'],
+            'description': 'a magical adventure with dragons and heroic quests',
+            'language': 'en',
+            'pageCount': 320,
+            'averageRating': 4.5,
+            'maturityRating': 'NOT_MATURE',
+            'series': 'standalone'
+        },
+        {
+            'id': 'book2',
+            'title': 'Castle Mysteries',
+            'authors': ['Author Two'],
+            'categories': ['fiction', 'mystery'],
+            'description': 'a detective journey through a haunted castle',
+            'language': 'en',
+            'pageCount': 180,
+            'averageRating': 4.0,
+            'maturityRating': 'NOT_MATURE',
+            'series': 'series'
+        },
+        {
+            'id': 'book3',
+            'title': 'Stars Beyond',
+            'authors': ['Author Three'],
+            'categories': ['science fiction'],
+            'description': 'an expedition to distant planets',
+            'language': 'fr',
+            'pageCount': 520,
+            'averageRating': 3.5,
+            'maturityRating': 'MATURE',
+            'series': 'standalone'
+        },
+        {
+            'id': 'book4',
+            'title': 'Heroes of Magic',
+            'authors': ['Author Four'],
+            'categories': ['juvenile fiction', 'fantasy'],
+            'description': 'young heroes discover magic on an exciting journey',
+            'language': 'en',
+            'pageCount': 250,
+            'averageRating': 4.8,
+            'maturityRating': 'NOT_MATURE',
+            'series': 'series'
+        }
+    ]
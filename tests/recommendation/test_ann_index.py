@@ -0,0 +1,112 @@
+import sys
+
+import pytest
+
+from models import Book
+
+
+@pytest.fixture
+def catalog_model(recommendation_module, sample_books, tmp_path):
+    recommender = recommendation_module.BookRecommender()
+    path = tmp_path / 'model.npz'
+    recommendation_module.RecommenderModel.fit([recommender.get_book_text(book) for book in sample_books]).save(path)
+    return recommendation_module.load_recommender_model(str(path))
+
+
+@pytest.fixture
+def catalog_books(test_db, catalog_model, sample_books):
+    books = [
+        Book(title=book['title'], author=book['authors'][0], genre=book['categories'][0],
+             language=book['language'], summary=book['description'])
+        for book in sample_books
+    ]
+    test_db.session.add_all(books)
+    test_db.session.commit()
+    yield books
+    for book in Book.query.filter(Book.title.in_([book['title'] for book in sample_books] + ['Dragon Riders'])):
+        test_db.session.delete(book)
+    test_db.session.commit()
+
+
+@pytest.fixture
+def index_small_catalogs(recommendation_module, monkeypatch):
+    """Probe the index even for the few test books (normally scored exactly)"""
+    monkeypatch.setattr(sys.modules['ann_index'], 'MIN_INDEXED_BOOKS', 0)
+
+
+def build_index(recommendation_module, catalog_model, path, **kwargs):
+    catalog = recommendation_module.book_features.get_active_store().load()
+    recommendation_module.IVFIndex.build(catalog, catalog_model.version, **kwargs).save(path)
+    return recommendation_module.load_ann_index(str(path))
+
+
+def test_index_round_trip(recommendation_module, catalog_model, catalog_books, tmp_path):
+    index = build_index(recommendation_module, catalog_model, tmp_path / 'index.npz', n_lists=2, n_probe=1)
+
+    assert index.n_lists == 2
+    assert index.n_probe == 1
+    assert index.model_version == catalog_model.version
+    assert sorted(index.list_book_ids.tolist()) == sorted(book.id for book in catalog_books)
+    assert recommendation_module.get_ann_index() is index
+
+
+def test_unknown_index_format_is_ignored(recommendation_module, catalog_model, catalog_books, tmp_path,
+                                         monkeypatch):
+    path = tmp_path / 'index.npz'
+    monkeypatch.setattr(sys.modules['ann_index'], 'INDEX_FORMAT_VERSION', 99)
+    build_index(recommendation_module, catalog_model, path, n_lists=2)
+    monkeypatch.undo()
+
+    assert recommendation_module.load_ann_index(str(path)) is None
+    assert recommendation_module.load_ann_index(str(tmp_path / 'missing.npz')) is None
+
+
+def test_probing_every_list_matches_exact_scoring(recommendation_module, test_user, catalog_model,
+                                                  catalog_books, tmp_path, index_small_catalogs):
+    recommender = recommendation_module.get_recommender()
+    exact = recommender.recommend_from_catalog(test_user.id, num_recommendations=3)
+
+    build_index(recommendation_module, catalog_model, tmp_path / 'index.npz', n_lists=2, n_probe=2)
+    approximate = recommender.recommend_from_catalog(test_user.id, num_recommendations=3)
+
+    assert [rec['book']['id'] for rec in approximate] == [rec['book']['id'] for rec in exact]
+    assert [rec['similarity'] for rec in approximate] == pytest.approx([rec['similarity'] for rec in exact])
+
+
+def test_books_added_after_the_build_are_scored(recommendation_module, test_db, test_user, catalog_model,
+                                                catalog_books, tmp_path, index_small_catalogs):
+    build_index(recommendation_module, catalog_model, tmp_path / 'index.npz', n_lists=4, n_probe=1)
+
+    new_book = Book(title='Dragon Riders', author='Author Five', genre='fantasy fiction', language='en',
+                    summary='a magical adventure with dragons and heroic quests')
+    test_db.session.add(new_book)
+    test_db.session.commit()
+
+    ids = [rec['book']['id'] for rec in
+           recommendation_module.get_recommender().recommend_from_catalog(test_user.id, num_recommendations=4)]
+    assert new_book.id in ids
+
+
+def test_index_for_another_model_is_not_used(recommendation_module, test_user, catalog_model, catalog_books,
+                                             tmp_path, monkeypatch, index_small_catalogs):
+    index = build_index(recommendation_module, catalog_model, tmp_path / 'index.npz', n_lists=2)
+    index.model_version = 'stale'
+
+    def fail(*args, **kwargs):
+        raise AssertionError("stale index was probed")
+    monkeypatch.setattr(index, 'candidates', fail)
+
+    # Every book but Stars Beyond (science, left out by the candidate filter)
+    assert len(recommendation_module.get_recommender().recommend_from_catalog(test_user.id)) == len(catalog_books) - 1
+
+
+def test_small_catalogs_are_scored_exactly(recommendation_module, test_user, catalog_model, catalog_books,
+                                           tmp_path, monkeypatch):
+    index = build_index(recommendation_module, catalog_model, tmp_path / 'index.npz', n_lists=2)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("index was probed for a small catalog")
+    monkeypatch.setattr(index, 'candidates', fail)
+
+    # Every book but Stars Beyond (science, left out by the candidate filter)
+    assert len(recommendation_module.get_recommender().recommend_from_catalog(test_user.id)) == len(catalog_books) - 1
@@ -0,0 +1,47 @@
+import pytest
+from unittest.mock import patch
+
+
+def test_score_books_matches_pairwise_for_single_book(recommendation_module, test_user, sample_books):
+    """With one candidate the batch path is the old two-document comparison"""
+    recommender = recommendation_module.BookRecommender()
+    profile = recommender.get_user_profile(test_user.id)
+
+    for book in sample_books:
+        batch_score = recommender.score_books(profile, [book])[0]
+        assert batch_score == pytest.approx(recommender.calculate_similarity(test_user.id, book))
+
+
+def test_score_books_fits_vectorizer_once(recommendation_module, test_user, sample_books):
+    """The whole candidate pool is vectorized with a single fit"""
+    recommender = recommendation_module.BookRecommender()
+    profile = recommender.get_user_profile(test_user.id)
+    real_vectorizer = recommendation_module.TfidfVectorizer
+
+    with patch.object(recommendation_module, 'TfidfVectorizer', side_effect=real_vectorizer) as vectorizer:
+        scores = recommender.score_books(profile, sample_books * 10)
+
+    assert vectorizer.call_count == 1
+    assert len(scores) == len(sample_books) * 10
+
+
+def test_score_books_handles_empty_inputs(recommendation_module, sample_books):
+    recommender = recommendation_module.BookRecommender()
+
+    assert list(recommender.score_books('', sample_books)) == [0.0] * len(sample_books)
+    assert len(recommender.score_books('genres:fantasy', [])) == 0
+
+
+def test_get_recommendations_shape_and_order(recommendation_module, test_user, sample_books):
+    recommender = recommendation_module.BookRecommender()
+
+    recommendations = recommender.get_recommendations(test_user.id, sample_books, num_recommendations=3)
+
+    assert len(recommendations) == 3
+    for rec in recommendations:
+        assert set(rec) == {'book', 'similarity'}
+        assert isinstance(rec['similarity'], float)
+    scores = [rec['similarity'] for rec in recommendations]
+    assert scores == sorted(scores, reverse=True)
+    # The fantasy adventure book should beat the French science fiction one
+    assert recommendations[0]['book']['id'] in {'book1', 'book4'}
@@ -0,0 +1,113 @@
+import pytest
+
+from models import Book, BookVector
+
+
+@pytest.fixture
+def catalog_model(recommendation_module, sample_books, tmp_path):
+    """Fit and load a model so the book vector hook is active"""
+    recommender = recommendation_module.BookRecommender()
+    texts = [recommender.get_book_text(book) for book in sample_books]
+    path = tmp_path / 'model.npz'
+    recommendation_module.RecommenderModel.fit(texts).save(path)
+    return recommendation_module.load_recommender_model(str(path))
+
+
+@pytest.fixture
+def catalog_books(test_db, sample_books):
+    books = [
+        Book(title=book['title'], author=book['authors'][0], genre=book['categories'][0],
+             language=book['language'], summary=book['description'])
+        for book in sample_books
+    ]
+    test_db.session.add_all(books)
+    test_db.session.commit()
+    yield books
+    for book in books:
+        test_db.session.delete(book)
+    test_db.session.commit()
+
+
+def test_vectors_are_stored_when_books_are_added(recommendation_module, catalog_model, catalog_books):
+    store = recommendation_module.book_features.get_active_store()
+
+    for book in catalog_books:
+        assert book.feature_vector is not None
+        assert book.feature_vector.model_version == catalog_model.version
+
+    catalog = store.load()
+    assert sorted(catalog.book_ids.tolist()) == sorted(book.id for book in catalog_books)
+    assert catalog.matrix.dtype.name == 'float32'
+
+    # Stored vectors are the model's vectors for the book text
+    by_id = {book.id: book for book in catalog_books}
+    texts = [store.book_text(recommendation_module.book_from_catalog(by_id[book_id]))
+             for book_id in catalog.book_ids.tolist()]
+    expected = catalog_model.transform(texts).toarray()
+    assert abs(catalog.matrix.toarray() - expected).max() < 1e-6
+
+
+def test_vectors_follow_text_edits_only(recommendation_module, test_db, catalog_model, catalog_books):
+    book = catalog_books[0]
+    original = book.feature_vector.weights
+
+    book.cover_image = 'new-cover.jpg'
+    test_db.session.commit()
+    assert book.feature_vector.weights == original
+
+    book.summary = 'a castle detective mystery'
+    test_db.session.commit()
+    assert book.feature_vector.weights != original
+    assert BookVector.query.filter_by(book_id=book.id).count() == 1
+
+
+def test_recommend_from_catalog_scores_stored_vectors(recommendation_module, test_user, catalog_model,
+                                                      catalog_books):
+    recommender = recommendation_module.get_recommender()
+    by_title = {book.title: book for book in catalog_books}
+
+    recommendations = recommender.recommend_from_catalog(test_user.id, num_recommendations=2)
+
+    assert len(recommendations) == 2
+    assert recommendations[0]['similarity'] >= recommendations[1]['similarity']
+    assert recommendations[0]['book']['id'] in {by_title['The Dragon Quest'].id, by_title['Heroes of Magic'].id}
+
+
+def test_recommend_from_catalog_adds_collaborative_scores_by_candidate_id(recommendation_module, test_db, test_user,
+                                                                        catalog_model, catalog_books):
+    import numpy as np
+    from collaborative import CollaborativeModel
+    # A Google Books volume someone saved: known to the collaborative model by its Google ID
+    saved = Book(title='Saved Volume', author='Someone', genre='Fiction', language='en',
+                 summary='External ID: gvol1')
+    test_db.session.add(saved)
+    test_db.session.commit()
+    recommender = recommendation_module.get_recommender()
+    try:
+        plain = recommender.recommend_from_catalog(test_user.id, num_recommendations=5)
+        recommender.collaborative = CollaborativeModel([test_user.id], ['gvol1'], np.ones((1, 1)),
+                                                       np.array([[1.0]]))
+        boosted = recommender.recommend_from_catalog(test_user.id, num_recommendations=5)
+    finally:
+        test_db.session.delete(saved)
+        test_db.session.commit()
+
+    def similarity(results):
+        return next(rec['similarity'] for rec in results if rec['book']['id'] == 'gvol1')
+
+    assert similarity(boosted) > similarity(plain)
+    assert boosted[0]['book']['id'] == 'gvol1'
+
+
+def test_recommend_from_catalog_needs_a_model(recommendation_module, test_user, catalog_books):
+    assert recommendation_module.get_recommender().recommend_from_catalog(test_user.id) == []
+
+
+def test_rebuild_backfills_missing_vectors(recommendation_module, test_db, catalog_books, catalog_model):
+    # These books were added before any model was loaded
+    assert all(book.feature_vector is None for book in catalog_books)
+
+    store = recommendation_module.book_features.get_active_store()
+    assert store.rebuild() == len(catalog_books)
+    assert store.rebuild() == 0
+    assert len(store.load()) == len(catalog_books)
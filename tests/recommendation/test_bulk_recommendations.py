@@ -0,0 +1,93 @@
+import pytest
+
+from models import UserPreferences
+
+
+@pytest.fixture
+def extra_preferences(test_db, test_user):
+    """Preference rows for two more users next to the default test user"""
+    rows = [
+        UserPreferences(user_id=test_user.id + 1, genres='mystery', theme='detective castle',
+                        mood='curious', language='en', length='short', maturity='NOT_MATURE'),
+        UserPreferences(user_id=test_user.id + 2, genres='science fiction', theme='planets expedition',
+                        language='fr', length='long', maturity='MATURE'),
+    ]
+    test_db.session.add_all(rows)
+    test_db.session.commit()
+    yield [row.user_id for row in rows]
+    for row in rows:
+        test_db.session.delete(row)
+    test_db.session.commit()
+
+
+@pytest.fixture
+def fitted_recommender(recommendation_module, sample_books):
+    recommender = recommendation_module.BookRecommender()
+    recommender.model = recommendation_module.RecommenderModel.fit([recommender.get_book_text(book) for book in sample_books])
+    return recommender
+
+
+def test_bulk_matches_per_user_recommendations(fitted_recommender, test_user, extra_preferences, sample_books):
+    user_ids = [test_user.id] + extra_preferences
+
+    bulk = fitted_recommender.get_recommendations_bulk(user_ids, sample_books, k=2)
+
+    assert list(bulk) == user_ids
+    for user_id in user_ids:
+        single = fitted_recommender.get_recommendations(user_id, sample_books, num_recommendations=2)
+        assert [rec['book']['id'] for rec in bulk[user_id]] == [rec['book']['id'] for rec in single]
+        assert [rec['similarity'] for rec in bulk[user_id]] == pytest.approx([rec['similarity'] for rec in single])
+
+
+def test_bulk_scores_users_in_chunks(recommendation_module, fitted_recommender, test_user, extra_preferences,
+                                     sample_books, monkeypatch):
+    user_ids = [test_user.id] + extra_preferences
+    expected = fitted_recommender.get_recommendations_bulk(user_ids, sample_books, k=3)
+
+    monkeypatch.setattr(recommendation_module, 'BULK_SCORE_CHUNK', 2)
+    monkeypatch.setattr(recommendation_module, 'BULK_PREFERENCE_BATCH', 1)
+
+    assert fitted_recommender.get_recommendations_bulk(user_ids, sample_books, k=3) == expected
+
+
+def test_bulk_loads_preferences_in_one_query(fitted_recommender, test_user, extra_preferences, sample_books,
+                                             count_preference_queries):
+    with count_preference_queries() as queries:
+        fitted_recommender.get_recommendations_bulk([test_user.id] + extra_preferences, sample_books, k=1)
+
+    assert len(queries) == 1
+
+
+def test_bulk_handles_users_without_preferences(recommendation_module, test_user, sample_books):
+    recommender = recommendation_module.BookRecommender()
+
+    results = recommender.get_recommendations_bulk([test_user.id, 9999], sample_books, k=2)
+
+    assert [rec['similarity'] for rec in results[9999]] == [0.0, 0.0]
+    assert results[test_user.id][0]['similarity'] > 0
+    assert recommender.get_recommendations_bulk([], sample_books) == {}
+
+
+def test_bulk_adds_collaborative_scores_like_get_recommendations(fitted_recommender, test_user, extra_preferences,
+                                                                 sample_books):
+    import numpy as np
+    from collaborative import CollaborativeModel
+    user_ids = [test_user.id] + extra_preferences
+    plain = fitted_recommender.get_recommendations_bulk(user_ids, sample_books, k=4)
+    # The test user's reading list says they like book3, which their text scores rank last
+    fitted_recommender.collaborative = CollaborativeModel(
+        [test_user.id], [book['id'] for book in sample_books], np.ones((1, 1)),
+        np.array([[0.0], [0.0], [1.0], [0.0]])
+    )
+    fitted_recommender.result_cache.clear()
+
+    bulk = fitted_recommender.get_recommendations_bulk(user_ids, sample_books, k=4)
+
+    def similarity(results, book_id):
+        return next(rec['similarity'] for rec in results if rec['book']['id'] == book_id)
+
+    assert similarity(bulk[test_user.id], 'book3') > similarity(plain[test_user.id], 'book3')
+    for user_id in user_ids:
+        single = fitted_recommender.get_recommendations(user_id, sample_books, num_recommendations=4)
+        assert [rec['book']['id'] for rec in bulk[user_id]] == [rec['book']['id'] for rec in single]
+        assert [rec['similarity'] for rec in bulk[user_id]] == pytest.approx([rec['similarity'] for rec in single])
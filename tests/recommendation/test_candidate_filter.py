@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from candidate_filter import CandidateFilter, load_candidate_filter
+
+
+def _volume(volume_id, categories, description, **extra):
+    info = {'title': f'Title {volume_id}', 'authors': ['Someone'], 'categories': categories,
+            'description': description}
+    info.update(extra)
+    return {'id': volume_id, 'volumeInfo': info}
+
+
+@pytest.fixture(autouse=True)
+def default_rules():
+    yield
+    # Tests below swap the process-wide filter; put the defaults back
+    load_candidate_filter({})
+
+
+VOLUMES = [
+    _volume('keep', ['Fiction', 'Fantasy'], 'An Epic QUEST across the sea', pageCount=320),
+    _volume('untitled', ['Fiction'], 'a quest', title=''),
+    _volume('cookbook', ['Cooking'], 'a culinary journey'),
+    _volume('textbook', ['Juvenile Fiction', 'Science'], 'explore the stars'),
+    _volume('quiet', ['Fiction'], 'a gentle family story'),
+]
+
+
+def test_default_rules_keep_adventure_fiction_and_count_rejections():
+    candidate_filter = CandidateFilter.from_rules()
+
+    books = candidate_filter.process(VOLUMES)
+
+    assert [book['id'] for book in books] == ['keep']
+    assert books[0]['description'] == 'an epic quest across the sea'
+    assert books[0]['categories'] == ['fiction', 'fantasy']
+    assert books[0]['pageCount'] == 320
+    assert candidate_filter.stats() == {
+        'accepted': 1,
+        'rejected': {
+            'missing_fields': 1,
+            'include_categories': 1,
+            'exclude_categories': 1,
+            'description_keywords': 1,
+        },
+    }
+
+
+def test_rules_load_from_a_json_file(tmp_path):
+    rules_path = tmp_path / 'rules.json'
+    rules_path.write_text(json.dumps({'description_keywords': [], 'exclude_categories': ['fantasy']}))
+
+    candidate_filter = load_candidate_filter({'RECOMMENDER_FILTER_RULES_PATH': str(rules_path)})
+
+    # No keyword rule any more, and fantasy is now excluded
+    assert [book['id'] for book in candidate_filter.process(VOLUMES)] == ['textbook', 'quiet']
+
+
+def test_unknown_rule_is_rejected():
+    with pytest.raises(ValueError):
+        CandidateFilter.from_rules({'include_genres': ['fiction']})
+
+
+def test_unreadable_rules_fall_back_to_defaults(tmp_path):
+    candidate_filter = load_candidate_filter({'RECOMMENDER_FILTER_RULES_PATH': str(tmp_path / 'missing.json')})
+
+    assert candidate_filter.rules['include_categories'] == CandidateFilter.from_rules().rules['include_categories']
@@ -0,0 +1,173 @@
+from models import Book
+
+
+def _add_books(db):
+    db.session.add_all([
+        Book(title='Dragon Riders', author='A. Writer', genre='Fantasy Fiction', language='en',
+             summary='A young hero learns magic on a journey to save her village'),
+        Book(title='Harbour Lights', author='B. Writer', genre='Romance Fiction', language='en',
+             summary='Two strangers meet by the sea; a story of discovery full of magic moments'),
+        Book(title='El Dragon', author='C. Escritor', genre='Fantasy Fiction', language='es',
+             summary='Aventura con dragones: la gran quest'),
+        Book(title='The Quiet Ledger', author='D. Writer', genre='Mystery', language='en',
+             summary='External ID: abc123XYZ'),
+        Book(title='Magic for Beginners', author='E. Writer', genre='Education', language='en',
+             summary='A journey through fantasy magic tricks'),
+    ])
+    db.session.commit()
+
+
+def test_candidates_rank_genre_matches_first(recommendation_module, test_db):
+    from catalog_index import get_catalog_index
+    _add_books(test_db)
+
+    books = get_catalog_index().candidates(['fantasy', 'magic'])
+
+    assert [book['title'] for book in books] == ['Dragon Riders', 'El Dragon', 'Harbour Lights']
+
+
+def test_candidates_respect_language_choice(recommendation_module, test_db):
+    from catalog_index import get_catalog_index
+    _add_books(test_db)
+
+    books = get_catalog_index().candidates(['fantasy'], languages={'en'})
+
+    assert [book['title'] for book in books] == ['Dragon Riders']
+
+
+def test_books_from_google_keep_their_google_id(recommendation_module, test_db):
+    from catalog_index import get_catalog_index
+    _add_books(test_db)
+
+    books = get_catalog_index().candidates(['ledger'])
+
+    assert [book['id'] for book in books] == ['abc123XYZ']
+    assert books[0]['description'] == ''
+    assert books[0]['local_id'] == Book.query.filter_by(title='The Quiet Ledger').first().id
+    assert 'cover_image' not in books[0]
+
+
+def test_local_books_carry_their_row_and_cover(recommendation_module, test_db):
+    from catalog_index import get_catalog_index
+    _add_books(test_db)
+    row = Book.query.filter_by(title='Dragon Riders').first()
+    row.cover_image = 'dragon.jpg'
+    test_db.session.commit()
+
+    [book] = get_catalog_index().candidates(['riders'])
+
+    assert (book['id'], book['local_id'], book['cover_image']) == (row.id, row.id, 'dragon.jpg')
+
+
+def test_index_is_rebuilt_when_the_catalog_changes(recommendation_module, test_db):
+    from catalog_index import get_catalog_index
+    _add_books(test_db)
+    index = get_catalog_index()
+    assert get_catalog_index() is index
+
+    book = Book.query.filter_by(title='The Quiet Ledger').first()
+    book.genre = 'Fantasy'
+    test_db.session.commit()
+
+    assert get_catalog_index() is not index
+    assert 'The Quiet Ledger' in [book['title'] for book in get_catalog_index().candidates(['fantasy'])]
+
+
+def test_edits_the_candidates_dont_read_keep_the_index(recommendation_module, test_db):
+    from catalog_index import get_catalog_index
+    _add_books(test_db)
+    index = get_catalog_index()
+
+    # Same values written back, and a new cover for a Google Books volume
+    local = Book.query.filter_by(title='Dragon Riders').first()
+    local.title = 'Dragon Riders'
+    Book.query.filter_by(title='The Quiet Ledger').first().cover_image = 'ledger.jpg'
+    test_db.session.commit()
+    assert get_catalog_index() is index
+
+    local.cover_image = 'dragon.jpg'
+    test_db.session.commit()
+    assert get_catalog_index() is not index
+
+
+def test_index_is_reused_without_querying(recommendation_module, test_db, monkeypatch):
+    import catalog_index
+    from sqlalchemy import event
+    _add_books(test_db)
+    index = catalog_index.get_catalog_index()
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(test_db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        assert catalog_index.get_catalog_index() is index
+    finally:
+        event.remove(test_db.engine, 'before_cursor_execute', before_cursor_execute)
+    assert statements == []
+
+    # Other workers' edits are picked up once the index is old enough
+    monkeypatch.setattr(catalog_index, 'REBUILD_INTERVAL', 0)
+    assert catalog_index.get_catalog_index() is not index
+
+
+def test_local_candidates_use_the_profile(recommendation_module, test_user, test_db):
+    _add_books(test_db)
+    recommender = recommendation_module.BookRecommender()
+
+    # test_user likes fantasy adventure with magic, in English
+    books = recommender.local_candidates(test_user.id)
+
+    assert [book['title'] for book in books] == ['Dragon Riders', 'Harbour Lights']
+
+
+def test_books_the_candidate_filter_rejects_are_not_indexed(recommendation_module, test_db):
+    from catalog_index import get_catalog_index
+    _add_books(test_db)
+
+    titles = [book['title'] for book in get_catalog_index().candidates(['magic', 'fantasy'])]
+
+    # Not fiction, so filtered out; The Quiet Ledger (a mystery) came from
+    # Google Books and went through the filter then
+    assert 'Magic for Beginners' not in titles
+    assert 'The Quiet Ledger' in [book['title'] for book in get_catalog_index().candidates(['ledger'])]
+
+
+def test_preference_terms_leave_out_the_field_labels(recommendation_module):
+    from catalog_index import preference_terms
+
+    terms = preference_terms({'genres': 'genres:fantasy,science fiction', 'theme': 'theme:magic',
+                              'mood': 'mood:dark'})
+
+    assert terms == ['fantasy', 'science', 'fiction', 'magic', 'dark']
+
+
+def test_reading_list_adds_list_the_recommended_row(recommendation_module, test_client, test_db, test_user):
+    from models import ReadingList
+    _add_books(test_db)
+    local = Book.query.filter_by(title='Dragon Riders').first()
+    # A saved Google Books volume whose ID merely starts with the local book's ID
+    lookalike = Book(title='Lookalike', author='F. Writer', summary=f'External ID: {local.id}abc')
+    test_db.session.add(lookalike)
+    test_db.session.commit()
+    books_before = Book.query.count()
+    test_client.post('/login', data={'email': 'testuser@example.com', 'password': 'password123'})
+
+    response = test_client.post('/add-to-reading-list', json={
+        'book_id': str(local.id), 'local_id': local.id, 'title': 'Dragon Riders', 'author': 'A. Writer',
+        'cover_image': '01.jpg', 'status': 'want'
+    })
+    assert response.get_json()['success'] is True
+    # A Google Books ID is matched exactly, not as a prefix
+    response = test_client.post('/add-to-reading-list', json={
+        'book_id': str(local.id), 'title': 'Remote', 'author': 'G. Writer', 'cover_image': '01.jpg',
+        'status': 'want'
+    })
+    assert response.get_json()['success'] is True
+
+    entries = ReadingList.query.filter_by(user_id=test_user.id).all()
+    assert local.id in [entry.book_id for entry in entries]
+    assert lookalike.id not in [entry.book_id for entry in entries]
+    assert Book.query.count() == books_before + 1
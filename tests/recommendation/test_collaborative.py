@@ -0,0 +1,117 @@
+import pytest
+
+from models import Book, ReadingList, User
+
+
+def _two_taste_groups():
+    """Users 0-3 read books 0-3, users 4-7 read books 4-7; user 0 hasn't read book 3"""
+    import scipy.sparse as sp
+    rows, cols = [], []
+    for user in range(8):
+        group = range(0, 4) if user < 4 else range(4, 8)
+        for book in group:
+            if (user, book) != (0, 3):
+                rows.append(user)
+                cols.append(book)
+    return sp.csr_matrix(([1.0] * len(rows), (rows, cols)), shape=(8, 8))
+
+
+def test_als_ranks_unseen_books_of_the_same_taste_higher(recommendation_module):
+    from collaborative import als
+    user_factors, item_factors = als(_two_taste_groups(), factors=4, iterations=10)
+
+    predicted = item_factors @ user_factors[0]
+
+    assert predicted[3] > predicted[4:].max()
+    assert predicted[:3].min() > 0.5
+
+
+def test_interaction_matrix_weights_statuses_and_uses_google_ids(recommendation_module, test_user, test_db):
+    from collaborative import STATUS_WEIGHTS, interaction_matrix
+    local = Book(title='Local', author='A')
+    from_google = Book(title='Remote', author='B', summary='External ID: gid42')
+    test_db.session.add_all([local, from_google])
+    test_db.session.flush()
+    test_db.session.add_all([
+        ReadingList(user_id=test_user.id, book_id=local.id, status='finished'),
+        ReadingList(user_id=test_user.id, book_id=from_google.id, status='want'),
+        ReadingList(user_id=test_user.id, book_id=from_google.id, status='current'),
+    ])
+    test_db.session.commit()
+
+    user_ids, book_keys, matrix = interaction_matrix()
+
+    assert user_ids.tolist() == [test_user.id]
+    assert sorted(book_keys.tolist()) == sorted([str(local.id), 'gid42'])
+    weights = dict(zip(book_keys.tolist(), matrix.toarray()[0]))
+    assert weights == {str(local.id): STATUS_WEIGHTS['finished'], 'gid42': STATUS_WEIGHTS['current']}
+
+
+def test_model_round_trips_through_a_file(recommendation_module, tmp_path):
+    from collaborative import CollaborativeModel, als
+    user_factors, item_factors = als(_two_taste_groups(), factors=4, iterations=3)
+    model = CollaborativeModel(range(8), [f'b{i}' for i in range(8)], user_factors, item_factors,
+                               _two_taste_groups())
+    path = tmp_path / 'cf.npz'
+
+    model.save(path)
+    loaded = CollaborativeModel.load(path)
+
+    assert loaded.version == model.version
+    books = [{'id': 'b3'}, {'id': 'b5'}, {'id': 'unknown'}, {'id': 'b1'}]
+    assert loaded.scores(0, books).tolist() == model.scores(0, books).tolist()
+    assert loaded.scores(0, books)[2] == 0.0
+    # b1 is on user 0's reading list already
+    assert loaded.scores(0, books)[3] == 0.0
+    assert loaded.scores(99, books) is None
+
+
+def test_collaborative_scores_are_blended_per_user(recommendation_module, test_user, test_db, sample_books):
+    import numpy as np
+    from collaborative import CollaborativeModel
+    other = User(username='other', email='other@example.com')
+    other.set_password('password123')
+    test_db.session.add(other)
+    test_db.session.commit()
+
+    # test_user's factors point straight at book2, which otherwise ranks low
+    book_keys = [book['id'] for book in sample_books]
+    item_factors = np.eye(len(book_keys))
+    user_factors = np.zeros((1, len(book_keys)))
+    user_factors[0, book_keys.index('book2')] = 1.0
+    cf = CollaborativeModel([test_user.id], book_keys, user_factors, item_factors)
+
+    plain = recommendation_module.BookRecommender()
+    blended = recommendation_module.BookRecommender(
+        weights=dict(recommendation_module.DEFAULT_FEATURE_WEIGHTS, collaborative=5.0), collaborative=cf
+    )
+    before = plain.get_recommendations(test_user.id, sample_books, 1)
+    after = blended.get_recommendations(test_user.id, sample_books, 1, explain=True)
+
+    assert before[0]['book']['id'] != 'book2'
+    assert after[0]['book']['id'] == 'book2'
+    assert after[0]['explanation']['collaborative'] > 0
+    assert sum(after[0]['explanation'].values()) == pytest.approx(after[0]['similarity'])
+    # Results that include one user's reading list are not shared with others
+    assert blended.result_key(test_user.id, blended.get_user_profile(test_user.id)) != \
+        blended.result_key(other.id, blended.get_user_profile(test_user.id))
+
+
+def test_books_on_the_reading_list_are_not_boosted(recommendation_module, test_user, test_db, sample_books):
+    import numpy as np
+    import scipy.sparse as sp
+    from collaborative import CollaborativeModel
+    # test_user's factors like book2 and book3 equally; book2 is already on their list
+    book_keys = [book['id'] for book in sample_books]
+    user_factors = np.zeros((1, len(book_keys)))
+    user_factors[0, [book_keys.index('book2'), book_keys.index('book3')]] = 1.0
+    listed = sp.csr_matrix(([1.0], ([0], [book_keys.index('book2')])), shape=(1, len(book_keys)))
+    cf = CollaborativeModel([test_user.id], book_keys, user_factors, np.eye(len(book_keys)), listed)
+
+    assert cf.scores(test_user.id, sample_books).tolist() == [0.0, 0.0, 1.0, 0.0]
+
+    recommender = recommendation_module.BookRecommender(collaborative=cf)
+    explanations = {rec['book']['id']: rec['explanation']
+                    for rec in recommender.get_recommendations(test_user.id, sample_books, 4, explain=True)}
+    assert explanations['book2']['collaborative'] == 0.0
+    assert explanations['book3']['collaborative'] > 0
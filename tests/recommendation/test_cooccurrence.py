@@ -0,0 +1,107 @@
+from models import Book, ReadingList, User
+
+
+def _reader(test_db, name):
+    user = User(username=name, email=f'{name}@example.com')
+    user.set_password('password123')
+    test_db.session.add(user)
+    test_db.session.flush()
+    return user
+
+
+def _books(test_db, count):
+    books = [Book(title=f'Book {i}', author='Author') for i in range(count)]
+    test_db.session.add_all(books)
+    test_db.session.flush()
+    return books
+
+
+def _list(test_db, user, *books):
+    test_db.session.add_all([ReadingList(user_id=user.id, book_id=book.id, status='want') for book in books])
+    test_db.session.commit()
+
+
+def test_index_only_applies_new_entries(recommendation_module, test_db):
+    from cooccurrence import CooccurrenceIndex
+    ann, bob = _reader(test_db, 'ann'), _reader(test_db, 'bob')
+    a, b, c = _books(test_db, 3)
+    _list(test_db, ann, a, b)
+    _list(test_db, bob, a, b, c)
+    index = CooccurrenceIndex()
+
+    assert index.catch_up() == 5
+    assert index.neighbours(a.id) == [(b.id, 2), (c.id, 1)]
+    assert index.catch_up() == 0
+
+    # Ann adds c: paired with what she already had, nothing else is recounted
+    _list(test_db, ann, c)
+    assert index.catch_up() == 1
+    assert index.neighbours(c.id) == [(a.id, 2), (b.id, 2)]
+    assert index.neighbours(a.id) == [(b.id, 2), (c.id, 2)]
+
+
+def test_neighbours_are_truncated_but_keep_frequent_pairs(recommendation_module):
+    from cooccurrence import CooccurrenceIndex
+    index = CooccurrenceIndex(max_neighbours=3)
+
+    for _ in range(10):
+        index.add(1, [2])
+    for other in range(3, 10):
+        index.add(1, [other])
+
+    assert len(index.neighbours(1, limit=10)) == 3
+    assert index.neighbours(1, limit=1) == [(2, 10)]
+
+
+def test_also_added_looks_up_google_ids(recommendation_module, test_db):
+    from cooccurrence import also_added, get_cooccurrence_index, load_cooccurrence_index
+    ann = _reader(test_db, 'ann')
+    local = Book(title='Local', author='A')
+    remote = Book(title='Remote', author='B', summary='External ID: gid42')
+    test_db.session.add_all([local, remote])
+    test_db.session.flush()
+    _list(test_db, ann, local, remote)
+    load_cooccurrence_index({})
+    # Lookups don't read new entries; the write that added them catches up
+    assert all(books == [] for books in also_added(['gid42', local.id]).values())
+    get_cooccurrence_index().catch_up()
+
+    found = also_added(['gid42', local.id, 'unlisted'])
+
+    assert [book.title for book in found['gid42']] == ['Local']
+    assert [book.title for book in found[local.id]] == ['Remote']
+    assert found['unlisted'] == []
+
+
+def test_saved_index_only_reads_the_entries_added_since(recommendation_module, test_db, tmp_path):
+    from cooccurrence import CooccurrenceIndex, load_cooccurrence_index
+    ann, bob = _reader(test_db, 'ann'), _reader(test_db, 'bob')
+    a, b, c = _books(test_db, 3)
+    _list(test_db, ann, a, b)
+    built = CooccurrenceIndex()
+    built.catch_up()
+    path = tmp_path / 'cooccurrence.npz'
+    built.save(path)
+
+    _list(test_db, bob, a, c)
+    index = load_cooccurrence_index({'RECOMMENDER_COOCCURRENCE_PATH': str(path)})
+
+    assert index.neighbours(a.id) == [(b.id, 1)]
+    assert index.catch_up() == 2
+    assert index.neighbours(a.id) == [(b.id, 1), (c.id, 1)]
+    missing = load_cooccurrence_index({'RECOMMENDER_COOCCURRENCE_PATH': str(tmp_path / 'missing.npz')})
+    assert (len(missing), missing.last_entry_id) == (0, 0)
+
+
+def test_reading_list_write_succeeds_when_the_index_fails(recommendation_module, test_client, test_db, test_user):
+    from unittest.mock import patch
+    test_client.post('/login', data={'email': 'testuser@example.com', 'password': 'password123'})
+
+    with patch('app.get_cooccurrence_index', side_effect=RuntimeError('index unavailable')):
+        response = test_client.post('/add-to-reading-list', json={
+            'book_id': 'gid7', 'title': 'Saved', 'author': 'Someone', 'cover_image': '01.jpg', 'status': 'want'
+        })
+
+    assert response.status_code == 200
+    assert response.get_json()['success'] is True
+    assert ReadingList.query.filter_by(user_id=test_user.id).count() == 1
@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+
+def form_preferences(**fields):
+    defaults = dict(genres='fantasy', theme='magic,journey', mood='exciting', style='',
+                    language='english', length='medium', maturity='NOT_MATURE')
+    return SimpleNamespace(**dict(defaults, **fields))
+
+
+@pytest.fixture(params=['per_request', 'model'])
+def recommender(request, recommendation_module, sample_books):
+    recommender = recommendation_module.BookRecommender()
+    if request.param == 'model':
+        recommender.model = recommendation_module.RecommenderModel.fit(
+            [recommender.get_book_text(book) for book in sample_books]
+        )
+    return recommender
+
+
+def test_field_parts_add_up_to_the_text_cosine(recommendation_module, recommender, sample_books):
+    user_text = recommender.build_profile(form_preferences()).match_text
+    book_texts = [recommender.get_book_text(book) for book in sample_books]
+    user_vector, book_matrix = recommender.vectorize([user_text], book_texts)
+    expected = (book_matrix @ user_vector.T).toarray().ravel()
+
+    parts = recommender.text_parts(user_text, sample_books)
+
+    assert set(parts) == {'genres', 'theme', 'author'}
+    assert list(sum(parts.values())) == pytest.approx(list(expected))
+
+
+def test_explanations_add_up_to_the_similarity(recommender, sample_books):
+    recommendations = recommender.get_recommendations(1, sample_books, 4, preferences=form_preferences(),
+                                                      explain=True)
+
+    for rec in recommendations:
+        explanation = rec['explanation']
+        assert set(explanation) == {'genres', 'theme', 'author', 'language', 'length', 'maturity'}
+        assert sum(explanation.values()) == pytest.approx(rec['similarity'])
+    assert recommendations[0]['explanation']['genres'] > 0
+
+
+def test_explanations_only_cover_chosen_features(recommender, sample_books):
+    recommendations = recommender.get_recommendations(1, sample_books, 2, preferences=form_preferences(
+        language='', length='no_preference', maturity=''), explain=True)
+
+    assert set(recommendations[0]['explanation']) == {'genres', 'theme', 'author'}
+
+
+def test_explanations_are_optional_and_cost_no_rescoring(recommender, sample_books):
+    preferences = form_preferences()
+    plain = recommender.get_recommendations(1, sample_books, 3, preferences=preferences)
+    assert all('explanation' not in rec for rec in plain)
+
+    with patch.object(recommender, 'score_parts', side_effect=AssertionError("scored again")):
+        explained = recommender.get_recommendations(1, sample_books, 3, preferences=preferences, explain=True)
+
+    assert [rec['similarity'] for rec in explained] == [rec['similarity'] for rec in plain]
+    assert all('explanation' in rec for rec in explained)
+
+
+def test_debug_similarity_prints_the_breakdown(recommendation_module, test_user, sample_books, capsys):
+    recommender = recommendation_module.BookRecommender()
+
+    with patch.object(recommendation_module, 'TfidfVectorizer', wraps=recommendation_module.TfidfVectorizer) as fit:
+        recommender.debug_similarity(test_user.id, sample_books[0])
+
+    output = capsys.readouterr().out
+    assert fit.call_count == 1
+    assert "Score by Feature:" in output
+    assert "genres: " in output
@@ -0,0 +1,41 @@
+import pytest
+
+
+@pytest.fixture
+def book_texts(recommendation_module, sample_books):
+    recommender = recommendation_module.BookRecommender()
+    return [recommender.get_book_text(book) for book in sample_books]
+
+
+def test_hashing_vectors_are_identical_across_instances(recommendation_module, book_texts):
+    first = recommendation_module.HashingFeaturizer(2 ** 12)
+    second = recommendation_module.HashingFeaturizer(2 ** 12)
+
+    assert first.version == second.version
+    assert (first.transform(book_texts) != second.transform(book_texts)).nnz == 0
+    assert first.transform(book_texts).shape == (len(book_texts), 2 ** 12)
+    assert recommendation_module.HashingFeaturizer(2 ** 13).version != first.version
+
+
+def test_load_featurizer_selects_hashing(recommendation_module, test_user, sample_books, tmp_path):
+    model = recommendation_module.load_featurizer({
+        'RECOMMENDER_FEATURIZER': 'hashing',
+        'RECOMMENDER_HASH_FEATURES': 2 ** 12,
+        'RECOMMENDER_MODEL_PATH': str(tmp_path / 'missing.npz'),
+    })
+
+    assert isinstance(model, recommendation_module.HashingFeaturizer)
+    assert recommendation_module.book_features.get_active_store().model is model
+
+    recommender = recommendation_module.get_recommender()
+    assert recommender.model is model
+    recommendations = recommender.get_recommendations(test_user.id, sample_books, num_recommendations=2)
+    assert recommendations[0]['book']['id'] in {'book1', 'book4'}
+    assert recommendations[0]['similarity'] >= recommendations[1]['similarity'] > 0
+
+
+def test_load_featurizer_defaults_to_tfidf_model(recommendation_module, tmp_path):
+    config = {'RECOMMENDER_MODEL_PATH': str(tmp_path / 'missing.npz')}
+
+    assert recommendation_module.load_featurizer(config) is None
+    assert recommendation_module.load_featurizer(dict(config, RECOMMENDER_FEATURIZER='tfidf')) is None
@@ -0,0 +1,82 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+
+def form_preferences(**fields):
+    defaults = dict(genres='fantasy', theme='magic,journey', mood='exciting', style='series',
+                    language='english', length='medium', maturity='NOT_MATURE')
+    return SimpleNamespace(**dict(defaults, **fields))
+
+
+@pytest.fixture
+def recommender(recommendation_module, sample_books):
+    recommender = recommendation_module.BookRecommender()
+    recommender.model = recommendation_module.RecommenderModel.fit(
+        [recommender.get_book_text(book) for book in sample_books]
+    )
+    return recommender
+
+
+def full_scores(recommender, preferences, books):
+    return list(recommender.score_books(recommender.build_profile(preferences), books))
+
+
+def pool_of(recommender, user_id):
+    return recommender._pools[user_id]
+
+
+@pytest.mark.parametrize('change', [
+    {'mood': 'dark'},
+    {'mood': ''},
+    {'length': 'long'},
+    {'language': 'french,english'},
+    {'theme': 'detective', 'maturity': 'MATURE'},
+])
+def test_edited_preferences_rescore_like_a_full_pass(recommender, sample_books, change):
+    before = form_preferences()
+    after = form_preferences(**change)
+    recommender.get_recommendations(7, sample_books, num_recommendations=4, preferences=before)
+    recomputed = pool_of(recommender, 7).fields_recomputed
+
+    with patch.object(recommender, 'get_book_text', side_effect=AssertionError("books re-tokenized")):
+        recommendations = recommender.get_recommendations(7, sample_books, num_recommendations=4, preferences=after)
+
+    expected = full_scores(recommender, after, sample_books)
+    by_id = {book['id']: score for book, score in zip(sample_books, expected)}
+    assert [rec['similarity'] for rec in recommendations] == pytest.approx([by_id[rec['book']['id']]
+                                                                            for rec in recommendations])
+    assert sorted(by_id.values(), reverse=True) == pytest.approx([rec['similarity'] for rec in recommendations])
+    # Only the edited fields were recomputed
+    assert pool_of(recommender, 7).fields_recomputed - recomputed == len(change)
+
+
+def test_pool_books_are_reused_for_the_same_queries(recommender, sample_books):
+    queries = ['fantasy books with magic themes', 'exciting fantasy novels']
+    assert recommender.get_pool_books(7, queries) is None
+
+    recommender.get_recommendations(7, sample_books, preferences=form_preferences(), queries=queries)
+
+    assert recommender.get_pool_books(7, queries) is sample_books
+    assert recommender.get_pool_books(7, queries[:1]) is None
+    assert recommender.get_pool_books(8, queries) is None
+
+
+def test_new_candidates_start_a_new_pool(recommender, sample_books):
+    recommender.get_recommendations(7, sample_books, preferences=form_preferences())
+    first = pool_of(recommender, 7)
+
+    recommender.get_recommendations(7, sample_books[:3], preferences=form_preferences(mood='dark'))
+
+    assert pool_of(recommender, 7) is not first
+    assert len(pool_of(recommender, 7).book_list) == 3
+
+
+def test_without_a_model_every_call_is_a_full_pass(recommendation_module, sample_books):
+    recommender = recommendation_module.BookRecommender()
+
+    recommender.get_recommendations(7, sample_books, preferences=form_preferences())
+
+    assert recommender.get_pool_books(7, ['anything']) is None
+    assert 7 not in recommender._pools
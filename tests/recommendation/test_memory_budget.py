@@ -0,0 +1,65 @@
+import pytest
+
+
+def test_float32_scores_match_the_default(recommendation_module, sample_books):
+    import numpy as np
+    from memory_budget import MemoryBudget
+    texts = [recommendation_module.BookRecommender().get_book_text(book) for book in sample_books]
+    model = recommendation_module.RecommenderModel.fit(texts)
+    compact_model = recommendation_module.RecommenderModel(model.terms, model.idf, model.stop_words,
+                                                           dtype=np.float32)
+    user_text = 'genres:fantasy theme:magic,journey'
+
+    default = recommendation_module.BookRecommender(model=model)
+    compact = recommendation_module.BookRecommender(model=compact_model, budget=MemoryBudget(compact=True))
+
+    user_vector, field_matrix = compact.vectorize_fields([user_text], sample_books)
+    assert field_matrix.dtype == np.float32 and field_matrix.indices.dtype == np.int32
+    assert user_vector.dtype == np.float32
+    assert compact.score_books(user_text, sample_books) == pytest.approx(
+        default.score_books(user_text, sample_books), abs=1e-6)
+
+
+def test_caps_limit_terms_and_description_tokens(recommendation_module, sample_books):
+    from memory_budget import MemoryBudget, truncate_tokens
+    model = recommendation_module.RecommenderModel(['common', 'rare', 'middle'], [1.0, 3.0, 2.0], [])
+
+    assert model.truncated(2).terms == ['common', 'middle']
+    assert model.truncated(5) is model
+    assert truncate_tokens('One, two  three four.', 3) == 'One, two  three'
+    assert truncate_tokens('One two', 3) == 'One two'
+
+    budget = MemoryBudget(compact=True, max_doc_tokens=2)
+    fields = recommendation_module.BookRecommender(budget=budget).get_book_fields(sample_books[0])
+    assert fields['theme'] == 'theme: ' + truncate_tokens(sample_books[0]['description'], 2).lower()
+    # The caps only apply with the budget switched on
+    assert MemoryBudget.from_config({'RECOMMENDER_MAX_DOC_TOKENS': 2}).max_doc_tokens is None
+
+
+def test_track_peak_rss_logs_the_block(recommendation_module, sample_books, caplog):
+    from memory_budget import track_peak_rss
+    recommender = recommendation_module.BookRecommender()
+
+    with caplog.at_level('DEBUG', logger='memory_budget'):
+        with track_peak_rss('score_books', books=len(sample_books)) as usage:
+            recommender.score_books('genres:fantasy', sample_books)
+
+    assert usage.peak_kb is not None and usage.seconds >= 0
+    assert any(record.getMessage().startswith('score_books: peak RSS') for record in caplog.records)
+
+
+def test_record_peak_rss_fills_a_span_without_resetting(recommendation_module, sample_books, monkeypatch):
+    import memory_budget
+    from request_timing import RequestTimer
+
+    def no_reset():
+        raise AssertionError("the request path must not reset the peak")
+
+    monkeypatch.setattr(memory_budget, 'reset_peak_rss', no_reset)
+    timer = RequestTimer('/recommendation')
+    with timer.span('score') as span, memory_budget.record_peak_rss(span):
+        recommendation_module.BookRecommender().score_books('genres:fantasy', sample_books)
+
+    [recorded] = timer.spans
+    assert recorded['peak_rss_kb'] > 0
+    assert recorded['peak_rss_growth_kb'] >= 0
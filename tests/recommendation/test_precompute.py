@@ -0,0 +1,71 @@
+import json
+from unittest.mock import patch
+
+from models import PrecomputedRecommendation, User, UserPreferences
+
+
+def _add_user(db, user_id, **answers):
+    user = User(id=user_id, username=f'reader{user_id}', email=f'reader{user_id}@example.com')
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.add(UserPreferences(user_id=user_id, **answers))
+    db.session.commit()
+
+
+def _fake_candidates(sample_books):
+    return patch('precompute.fetch_candidates', return_value=(['subject:fantasy'], sample_books))
+
+
+def test_run_stores_top_n_per_user(recommendation_module, test_user, test_db, sample_books, tmp_path):
+    import precompute
+    _add_user(test_db, 2, genres='mystery', theme='detective')
+    _add_user(test_db, 3)  # no answers: skipped
+    checkpoint = tmp_path / 'checkpoint.json'
+
+    with _fake_candidates(sample_books):
+        stored = precompute.run(workers=1, top_n=2, checkpoint_path=str(checkpoint))
+
+    assert stored == 2
+    assert not checkpoint.exists()
+    rows = PrecomputedRecommendation.query.filter_by(user_id=2).order_by(PrecomputedRecommendation.rank).all()
+    assert [row.rank for row in rows] == [1, 2]
+    assert rows[0].book_id == json.loads(rows[0].book_data)['id'] == 'book2'
+    assert PrecomputedRecommendation.query.filter_by(user_id=3).count() == 0
+
+
+def test_run_resumes_after_checkpoint(recommendation_module, test_user, test_db, sample_books, tmp_path):
+    import precompute
+    _add_user(test_db, 2, genres='mystery')
+    checkpoint = precompute.Checkpoint(str(tmp_path / 'checkpoint.json'), last_user_id=1, processed=1)
+    checkpoint.save()
+
+    with _fake_candidates(sample_books):
+        stored = precompute.run(workers=1, checkpoint_path=checkpoint.path, batch_size=1)
+
+    assert stored == 1
+    assert PrecomputedRecommendation.query.filter_by(user_id=test_user.id).count() == 0
+    assert PrecomputedRecommendation.query.filter_by(user_id=2).count() > 0
+
+
+def test_load_precomputed_ignores_stale_preferences(recommendation_module, test_user, test_db, sample_books):
+    import precompute
+    _add_user(test_db, 2, genres='mystery')
+    with _fake_candidates(sample_books):
+        precompute.run(workers=1, top_n=3)
+
+    preferences = UserPreferences.query.filter_by(user_id=test_user.id).first()
+    loaded = precompute.load_precomputed(test_user.id, preferences)
+    assert [rec['book']['id'] for rec in loaded] == [
+        rec['book']['id']
+        for rec in recommendation_module.get_recommender().get_recommendations(test_user.id, sample_books, 3)
+    ]
+
+    preferences.length = 'long'
+    test_db.session.commit()
+    assert precompute.load_precomputed(test_user.id, preferences) is None
+
+    # Only the user whose answers changed is generated again
+    with _fake_candidates(sample_books) as fetch:
+        assert precompute.run(workers=1, changed_only=True) == 1
+    assert fetch.call_count == 1
+    assert precompute.load_precomputed(test_user.id, preferences) is not None
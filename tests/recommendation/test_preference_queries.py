@@ -0,0 +1,39 @@
+import pytest
+
+
+@pytest.fixture
+def many_books(sample_books):
+    return [dict(book, id=f"{book['id']}-{i}") for i in range(25) for book in sample_books]
+
+
+def test_get_recommendations_loads_preferences_once(recommendation_module, test_db, test_user, count_preference_queries, many_books):
+    recommender = recommendation_module.BookRecommender()
+    test_db.session.expire_all()
+
+    with count_preference_queries() as queries:
+        recommendations = recommender.get_recommendations(test_user.id, many_books, num_recommendations=5)
+
+    assert len(recommendations) == 5
+    assert len(queries) == 1
+
+
+def test_get_recommendations_reuses_resolved_preferences(recommendation_module, test_db, test_user, count_preference_queries, many_books):
+    recommender = recommendation_module.BookRecommender()
+    preferences = recommender.load_preferences(test_user.id)
+
+    with count_preference_queries() as queries:
+        with_profile = recommender.get_recommendations(test_user.id, many_books, preferences=preferences)
+
+    assert len(queries) == 0
+    assert with_profile == recommender.get_recommendations(test_user.id, many_books)
+
+
+def test_debug_similarity_loads_preferences_once(recommendation_module, test_db, test_user, count_preference_queries, sample_books, capsys):
+    recommender = recommendation_module.BookRecommender()
+    test_db.session.expire_all()
+
+    with count_preference_queries() as queries:
+        recommender.debug_similarity(test_user.id, sample_books[0])
+
+    assert len(queries) == 1
+    assert "Similarity Score:" in capsys.readouterr().out
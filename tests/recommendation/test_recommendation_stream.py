@@ -0,0 +1,104 @@
+from types import SimpleNamespace
+
+import pytest
+
+from recommendation_stream import TopK, can_stream, fetch_pages, stream_recommendations
+
+PREFERENCES = SimpleNamespace(genres='fantasy', theme='magic,journey', mood='exciting', style='series',
+                              language='english', length='medium', maturity='NOT_MATURE')
+
+
+@pytest.fixture
+def recommender(recommendation_module, sample_books):
+    recommender = recommendation_module.BookRecommender()
+    recommender.model = recommendation_module.RecommenderModel.fit(
+        [recommender.get_book_text(book) for book in sample_books]
+    )
+    return recommender
+
+
+def test_top_k_keeps_the_best_and_breaks_ties_by_arrival(recommendation_module):
+    scores = [0.2, 0.9, 0.5, 0.9, 0.1, 0.5]
+    books = [{'id': i} for i in range(len(scores))]
+    top = TopK(3)
+
+    assert top.offer(scores[:3], books[:3])
+    assert top.offer(scores[3:], books[3:])
+
+    expected = list(recommendation_module.top_k_indices(scores, 3))
+    assert [rec['book']['id'] for rec in top.ranked()] == expected
+    assert top.threshold() == 0.5
+    # Nothing better: the top 3 stays as it is
+    assert not top.offer([0.5, 0.3], [{'id': 6}, {'id': 7}])
+
+
+def test_stream_matches_scoring_everything(recommender, test_user, sample_books):
+    pages = [('first', sample_books[:2]), ('second', sample_books[2:] + sample_books[:1])]
+
+    result = stream_recommendations(recommender, test_user.id, iter(pages), k=3, preferences=PREFERENCES,
+                                    min_score=2.0, explain=True)
+
+    expected = recommender.get_recommendations(test_user.id, sample_books, 3, PREFERENCES, explain=True)
+    assert [rec['book']['id'] for rec in result.recommendations] == [rec['book']['id'] for rec in expected]
+    assert [rec['similarity'] for rec in result.recommendations] == pytest.approx(
+        [rec['similarity'] for rec in expected])
+    for rec, expected_rec in zip(result.recommendations, expected):
+        assert rec['explanation'] == pytest.approx(expected_rec['explanation'])
+    assert (result.pages_scored, result.books_scored, result.stopped_early) == (2, len(sample_books), False)
+
+
+def test_stream_scores_each_book_once(recommender, test_user, sample_books, monkeypatch):
+    scored = []
+    score_parts = recommender.score_parts
+
+    def counting_score_parts(profile, book_list):
+        scored.extend(book['id'] for book in book_list)
+        return score_parts(profile, book_list)
+
+    monkeypatch.setattr(recommender, 'score_parts', counting_score_parts)
+    result = stream_recommendations(recommender, test_user.id, iter([('only', sample_books)]), k=2,
+                                    preferences=PREFERENCES, min_score=2.0)
+
+    # Every book once while streaming, then just the top 2 for their explanations
+    assert sorted(scored[:len(sample_books)]) == sorted(book['id'] for book in sample_books)
+    assert scored[len(sample_books):] == [rec['book']['id'] for rec in result.recommendations]
+
+
+def test_stream_stops_fetching_once_the_top_k_settles(recommender, test_user, sample_books):
+    fetched = []
+
+    def fetch(query):
+        fetched.append(query)
+        return query
+
+    # Every query returns the same books, so the top 2 never changes after the first page
+    pages = fetch_pages(['q1', 'q2', 'q3', 'q4'], fetch, lambda query: sample_books)
+    result = stream_recommendations(recommender, test_user.id, pages, k=2, preferences=PREFERENCES,
+                                    min_score=0.0, patience=1)
+
+    assert fetched == ['q1', 'q2']
+    assert result.stopped_early
+    assert len(result.recommendations) == 2
+
+
+def test_low_scores_keep_the_stream_going(recommender, test_user, sample_books):
+    fetched = []
+
+    def fetch(query):
+        fetched.append(query)
+        return query
+
+    pages = fetch_pages(['q1', 'q2', 'q3'], fetch, lambda query: sample_books)
+    result = stream_recommendations(recommender, test_user.id, pages, k=2, preferences=PREFERENCES,
+                                    min_score=1.5)
+
+    assert fetched == ['q1', 'q2', 'q3']
+    assert not result.stopped_early
+
+
+def test_only_fixed_vocabularies_stream(recommender, recommendation_module):
+    assert can_stream(recommender)
+    # A vectorizer fitted per page would score each page on its own scale
+    per_request = recommendation_module.BookRecommender()
+    per_request.model = None
+    assert not can_stream(per_request)
@@ -0,0 +1,67 @@
+import pytest
+from unittest.mock import patch
+
+
+@pytest.fixture
+def book_texts(recommendation_module, sample_books):
+    recommender = recommendation_module.BookRecommender()
+    return [recommender.get_book_text(book) for book in sample_books]
+
+
+def test_model_transform_matches_fitted_vectorizer(recommendation_module, book_texts):
+    """A saved vocabulary/IDF reproduces sklearn's TF-IDF vectors"""
+    from recommender_model import RecommenderModel
+    vectorizer = recommendation_module.TfidfVectorizer(stop_words='english', token_pattern=r'\b\w+\b')
+    expected = vectorizer.fit_transform(book_texts).toarray()
+
+    model = RecommenderModel.fit(book_texts)
+    actual = model.transform(book_texts).toarray()
+
+    assert actual.shape == expected.shape
+    assert abs(actual - expected).max() == pytest.approx(0.0)
+
+
+def test_model_save_and_load_round_trip(recommendation_module, book_texts, tmp_path):
+    from recommender_model import RecommenderModel
+    model = RecommenderModel.fit(book_texts)
+    path = tmp_path / 'model.npz'
+
+    model.save(path)
+    loaded = RecommenderModel.load(path)
+
+    assert loaded.version == model.version
+    assert loaded.terms == model.terms
+    assert loaded.stop_words == model.stop_words
+    assert (loaded.transform(book_texts) != model.transform(book_texts)).nnz == 0
+
+
+def test_model_load_rejects_other_format_versions(recommendation_module, book_texts, tmp_path):
+    import recommender_model
+    model = recommender_model.RecommenderModel.fit(book_texts)
+    path = tmp_path / 'model.npz'
+    model.save(path)
+
+    with patch.object(recommender_model, 'MODEL_FORMAT_VERSION', recommender_model.MODEL_FORMAT_VERSION + 1):
+        with pytest.raises(ValueError):
+            recommender_model.RecommenderModel.load(path)
+
+
+def test_recommender_with_model_never_fits(recommendation_module, test_user, sample_books, book_texts, tmp_path):
+    """Once a model is loaded, scoring is transform-only"""
+    from recommender_model import RecommenderModel
+    path = tmp_path / 'model.npz'
+    RecommenderModel.fit(book_texts).save(path)
+    assert recommendation_module.load_recommender_model(str(path)) is not None
+
+    with patch.object(recommendation_module, 'TfidfVectorizer', side_effect=AssertionError("fitted at request time")):
+        recommender = recommendation_module.BookRecommender()
+        recommendations = recommender.get_recommendations(test_user.id, sample_books, num_recommendations=2)
+
+    assert recommender.model is recommendation_module.get_recommender_model()
+    assert len(recommendations) == 2
+    assert recommendations[0]['similarity'] >= recommendations[1]['similarity'] > 0
+
+
+def test_missing_model_falls_back_to_per_request_fit(recommendation_module, tmp_path):
+    assert recommendation_module.load_recommender_model(str(tmp_path / 'missing.npz')) is None
+    assert recommendation_module.BookRecommender().model is None
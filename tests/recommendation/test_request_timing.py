@@ -0,0 +1,94 @@
+import json
+import logging
+
+import pytest
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, ms):
+        self.now += ms / 1000
+
+
+@pytest.fixture
+def timing(recommendation_module):
+    import request_timing
+    request_timing.reset_latency_histograms()
+    yield request_timing
+    request_timing.reset_latency_histograms()
+
+
+def test_nested_spans_record_self_time_by_component(timing):
+    clock = FakeClock()
+    timer = timing.RequestTimer('recommendation', clock=clock, user_id=3)
+
+    with timer.span('save_preferences'):
+        clock.advance(4)
+    with timer.span('stream') as span:
+        clock.advance(10)
+        for query in ('fantasy', 'magic'):
+            with timer.span('google_fetch', query=query) as fetch:
+                clock.advance(100)
+                fetch['books'] = 40
+        span['pages'] = 2
+    clock.advance(1)
+
+    record = timer.record(results=5)
+    assert record['total_ms'] == pytest.approx(215)
+    assert record['stage_ms'] == pytest.approx({'save_preferences': 4, 'stream': 10, 'google_fetch': 200})
+    assert record['component_ms'] == pytest.approx({'database': 4, 'scorer': 10, 'google': 200})
+    assert [span['query'] for span in record['spans'] if span['stage'] == 'google_fetch'] == ['fantasy', 'magic']
+    assert (record['user_id'], record['results']) == (3, 5)
+
+
+def test_histogram_quantiles_come_from_buckets(timing):
+    histogram = timing.Histogram(bounds=(10, 100, 1000))
+    for ms in [5] * 90 + [50] * 9 + [4000]:
+        histogram.observe(ms)
+
+    assert (histogram.quantile(0.5), histogram.quantile(0.9), histogram.quantile(0.99)) == (10.0, 10.0, 100.0)
+    assert histogram.quantile(1.0) == 4000
+    snapshot = histogram.snapshot()
+    assert [(bucket['le_ms'], bucket['count']) for bucket in snapshot['buckets']] == \
+        [(10, 90), (100, 9), (1000, 0), (None, 1)]
+    assert snapshot['count'] == 100
+    assert timing.Histogram().quantile(0.5) is None
+
+
+def test_finish_logs_a_structured_record_and_fills_histograms_once(timing, caplog):
+    clock = FakeClock()
+    timer = timing.RequestTimer('recommendation', clock=clock)
+    with timer.span('score', candidates=120):
+        clock.advance(30)
+
+    with caplog.at_level(logging.INFO, logger='bookbuddy.timing'):
+        record = timer.finish(source='scored')
+        assert timer.finish() is None
+
+    [log] = caplog.records
+    assert log.timing == record
+    assert json.loads(log.getMessage().split(' timing ', 1)[1]) == record
+    assert record['spans'] == [{'stage': 'score', 'ms': 30.0, 'candidates': 120}]
+
+    snapshot = timing.latency_snapshot()['recommendation']
+    assert snapshot['total']['count'] == 1
+    assert snapshot['stages']['score']['p99_ms'] == 50.0
+    assert snapshot['components']['scorer']['sum_ms'] == 30.0
+
+
+def test_timings_route_is_debug_only(test_app, test_client, test_user):
+    test_client.post('/login', data={'email': 'testuser@example.com', 'password': 'password123'})
+
+    assert test_client.get('/recommendation/timings').status_code == 403
+    test_app.debug = True
+    try:
+        response = test_client.get('/recommendation/timings')
+    finally:
+        test_app.debug = False
+    assert response.status_code == 200
+    assert isinstance(response.get_json(), dict)
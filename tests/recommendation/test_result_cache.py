@@ -0,0 +1,78 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from models import UserPreferences
+
+
+def test_preference_fingerprint_ignores_order_case_and_unscored_fields(recommendation_module):
+    fingerprint = recommendation_module.preference_fingerprint
+    first = SimpleNamespace(genres='fantasy,mystery', theme='magic', mood='Exciting', language='english',
+                            length='short', maturity='NOT_MATURE', style='series', pace='fast')
+    second = SimpleNamespace(**dict(vars(first), genres='mystery, fantasy', mood='exciting', pace='slow'))
+    changed = SimpleNamespace(**dict(vars(first), length='long'))
+
+    assert fingerprint(first) == fingerprint(second)
+    assert fingerprint(first) != fingerprint(changed)
+    assert fingerprint(None) == fingerprint(SimpleNamespace())
+
+
+def test_candidate_fingerprint_ignores_order(recommendation_module, sample_books):
+    fingerprint = recommendation_module.candidate_fingerprint
+
+    assert fingerprint(sample_books) == fingerprint(list(reversed(sample_books)))
+    assert fingerprint(sample_books) != fingerprint(sample_books[:3])
+
+
+def test_candidate_fingerprint_tells_apart_copies_under_one_id(recommendation_module, sample_books):
+    fingerprint = recommendation_module.candidate_fingerprint
+    # A local copy of a Google Books volume: same ID, no description
+    local_copy = [dict(sample_books[0], description='')] + sample_books[1:]
+
+    assert fingerprint(sample_books) != fingerprint(local_copy)
+
+
+def test_repeat_request_skips_scoring(recommendation_module, test_user, sample_books):
+    recommender = recommendation_module.BookRecommender()
+    first = recommender.get_recommendations(test_user.id, sample_books, num_recommendations=2)
+
+    with patch.object(recommender, 'score_parts', side_effect=AssertionError("scored again")):
+        again = recommender.get_recommendations(test_user.id, list(reversed(sample_books)), num_recommendations=2)
+
+    assert again == first
+    assert recommender.result_cache.hits == 1
+
+    # Callers decorate the results; that must not leak into the cache
+    again[0]['reading_status'] = 'reading'
+    assert 'reading_status' not in recommender.get_recommendations(test_user.id, sample_books, 2)[0]
+
+
+def test_other_candidates_or_k_are_scored(recommendation_module, test_user, sample_books):
+    recommender = recommendation_module.BookRecommender()
+    recommender.get_recommendations(test_user.id, sample_books, num_recommendations=2)
+
+    with patch.object(recommender, 'score_parts', wraps=recommender.score_parts) as score_parts:
+        recommender.get_recommendations(test_user.id, sample_books[:3], num_recommendations=2)
+        recommender.get_recommendations(test_user.id, sample_books, num_recommendations=3)
+
+    assert score_parts.call_count == 2
+
+
+def test_cached_recommendations_follow_preference_changes(recommendation_module, test_db, test_user,
+                                                          sample_books):
+    recommender = recommendation_module.get_recommender()
+    assert recommender.get_cached_recommendations(test_user.id) is None
+
+    expected = recommender.get_recommendations(test_user.id, sample_books)
+    assert recommender.get_cached_recommendations(test_user.id) == expected
+
+    preferences = UserPreferences.query.filter_by(user_id=test_user.id).first()
+    preferences.length = 'long'
+    test_db.session.commit()
+    assert recommender.get_cached_recommendations(test_user.id) is None
+
+
+def test_empty_candidate_pool_is_not_cached(recommendation_module, test_user):
+    recommender = recommendation_module.BookRecommender()
+
+    assert recommender.get_recommendations(test_user.id, []) == []
+    assert recommender.get_cached_recommendations(test_user.id) is None
@@ -0,0 +1,45 @@
+from models import UserPreferences
+
+
+def test_get_recommender_returns_one_instance(recommendation_module):
+    first = recommendation_module.get_recommender()
+
+    assert recommendation_module.get_recommender() is first
+
+    recommendation_module.reset_recommender()
+    assert recommendation_module.get_recommender() is not first
+
+
+def test_building_recommender_does_not_scan_preferences(recommendation_module, test_user, count_preference_queries):
+    with count_preference_queries() as queries:
+        recommendation_module.BookRecommender()
+        recommendation_module.get_recommender()
+
+    assert queries == []
+
+
+def test_preference_text_is_cached_until_preferences_change(recommendation_module, test_db, test_user,
+                                                            count_preference_queries):
+    recommender = recommendation_module.get_recommender()
+    original = recommender.get_user_preference_text(test_user.id)
+
+    with count_preference_queries() as queries:
+        assert recommender.get_user_preference_text(test_user.id) == original
+    assert queries == []
+
+    # Saving the row invalidates the cached profile through the mapper events
+    preferences = UserPreferences.query.filter_by(user_id=test_user.id).first()
+    preferences.mood = 'curious'
+    test_db.session.commit()
+
+    updated = recommender.get_user_preference_text(test_user.id)
+    assert 'mood:curious' in updated
+    assert updated != original
+
+
+def test_loading_a_model_rebuilds_shared_recommender(recommendation_module, tmp_path):
+    first = recommendation_module.get_recommender()
+
+    recommendation_module.load_recommender_model(str(tmp_path / 'missing.npz'))
+
+    assert recommendation_module.get_recommender() is not first
@@ -0,0 +1,89 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+PREFERENCES = SimpleNamespace(genres='fantasy', theme='magic,journey', mood='exciting', style='series',
+                              language='english', length='medium', maturity='NOT_MATURE')
+
+
+@pytest.fixture
+def recommender(recommendation_module, sample_books):
+    recommender = recommendation_module.BookRecommender()
+    recommender.model = recommendation_module.RecommenderModel.fit(
+        [recommender.get_book_text(book) for book in sample_books]
+    )
+    return recommender
+
+
+def test_same_preferences_only_score_new_books(recommender, sample_books):
+    recommender.get_recommendations(7, sample_books[:3], 3, PREFERENCES)
+    assert recommender.similarity_memo.stats()['misses'] == 3
+
+    scored = []
+    score_parts = recommender.score_parts
+
+    def spy(profile, book_list):
+        scored.extend(book['id'] for book in book_list)
+        return score_parts(profile, book_list)
+
+    # Another user with the same answers and one more candidate
+    with patch.object(recommender, 'score_parts', side_effect=spy):
+        recommendations = recommender.get_recommendations(8, sample_books, 4, PREFERENCES, explain=True)
+
+    assert scored == [sample_books[3]['id']]
+    stats = recommender.similarity_memo.stats()
+    assert (stats['hits'], stats['misses'], stats['size']) == (3, 4, 4)
+    assert stats['hit_rate'] == pytest.approx(3 / 7)
+
+    expected = recommender.score_books(recommender.build_profile(PREFERENCES), sample_books)
+    by_id = {book['id']: score for book, score in zip(sample_books, expected)}
+    for rec in recommendations:
+        assert rec['similarity'] == pytest.approx(by_id[rec['book']['id']])
+        assert sum(rec['explanation'].values()) == pytest.approx(rec['similarity'])
+
+
+def test_other_preferences_and_models_miss(recommender, sample_books, recommendation_module):
+    recommender.get_recommendations(7, sample_books, 2, PREFERENCES)
+    other = SimpleNamespace(**dict(vars(PREFERENCES), mood='dark'))
+    recommender.get_recommendations(7, sample_books, 2, other)
+    assert recommender.similarity_memo.stats()['hits'] == 0
+
+    # Without a pre-fitted model scores depend on the whole candidate set
+    plain = recommendation_module.BookRecommender()
+    plain.model = None
+    plain.get_recommendations(7, sample_books, 2, PREFERENCES)
+    assert len(plain.similarity_memo) == 0
+
+
+def test_local_copy_of_a_google_book_is_scored_separately(recommender, sample_books):
+    recommender.get_recommendations(7, sample_books, 4, PREFERENCES)
+    # Saved locally: same ID, but the description wasn't kept
+    local_copy = [dict(sample_books[0], description='')] + sample_books[1:]
+
+    recommendations = recommender.get_recommendations(8, local_copy, 4, PREFERENCES)
+
+    assert recommender.similarity_memo.stats()['hits'] == 3
+    expected = recommender.score_books(recommender.build_profile(PREFERENCES), local_copy)
+    by_id = {book['id']: score for book, score in zip(local_copy, expected)}
+    for rec in recommendations:
+        assert rec['similarity'] == pytest.approx(by_id[rec['book']['id']])
+
+
+def test_rows_round_trip_exactly(recommendation_module):
+    import numpy as np
+    from similarity_memo import SimilarityMemo
+    memo = SimilarityMemo(10, 60)
+    books = [{'id': 'a'}, {'id': 'b'}, {'id': None}]
+    text_parts = {'genres': np.array([0.1, 0.2, 0.3]), 'theme': np.array([0.0, 0.5, 0.25])}
+    attribute_scores = {'language': np.array([1.0, 0.0, 1.0])}
+
+    rows = memo.store('fp', 'v1', books, text_parts, attribute_scores)
+    text, attributes = memo.assemble(rows)
+
+    assert {field: values.tolist() for field, values in text.items()} == \
+        {field: values.tolist() for field, values in text_parts.items()}
+    assert attributes['language'].tolist() == [1.0, 0.0, 1.0]
+    # Books without an ID are scored every time
+    assert memo.lookup('fp', 'v1', books)[2] is None
+    assert len(memo) == 2
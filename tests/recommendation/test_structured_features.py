@@ -0,0 +1,72 @@
+from types import SimpleNamespace
+
+import pytest
+
+
+def form_preferences(**fields):
+    """A stand-in UserPreferences row as saved by the /recommendation form"""
+    defaults = dict(genres='', theme='', mood='', style='', language='', length='', maturity='')
+    return SimpleNamespace(**dict(defaults, **fields))
+
+
+def test_targets_from_form_values(recommendation_module):
+    targets = recommendation_module.PreferenceTargets.from_preferences(
+        form_preferences(language='english,spanish', length='long', maturity='NOT_MATURE')
+    )
+
+    assert targets.languages == {'en', 'es'}
+    assert targets.length == 2
+    assert targets.maturity == 0
+
+    blank = recommendation_module.PreferenceTargets.from_preferences(
+        form_preferences(length='no_preference', maturity='young_adult')
+    )
+    assert not blank
+    assert not recommendation_module.PreferenceTargets.from_preferences(None)
+
+
+def test_attribute_scores_are_vectorized_comparisons(recommendation_module, sample_books):
+    attributes = recommendation_module.BookAttributes.from_books(sample_books + [{'id': 'bare'}])
+    targets = recommendation_module.PreferenceTargets({'fr'}, length=0, maturity=0)
+
+    scores = recommendation_module.score_attributes(targets, attributes)
+
+    # book1 320p en, book2 180p en, book3 520p fr MATURE, book4 250p en, then a book with nothing known
+    assert list(scores['language']) == [0.0, 0.0, 1.0, 0.0, 0.5]
+    assert list(scores['length']) == [0.5, 1.0, 0.0, 1.0, 0.5]
+    assert list(scores['maturity']) == [1.0, 1.0, 0.0, 1.0, 0.5]
+
+
+def test_book_text_leaves_out_structured_fields(recommendation_module, sample_books):
+    text = recommendation_module.BookRecommender().get_book_text(sample_books[2])
+
+    assert 'language' not in text
+    assert 'length' not in text
+    assert 'maturity' not in text
+    assert 'expedition' in text
+
+
+def test_structured_preferences_change_the_ranking(recommendation_module, sample_books):
+    preferences = form_preferences(genres='fiction', theme='journey', language='french', maturity='MATURE')
+    recommender = recommendation_module.BookRecommender()
+    text_only = recommendation_module.BookRecommender(weights={'text': 1.0, 'language': 0.0, 'maturity': 0.0})
+
+    assert recommender.get_recommendations(1, sample_books, 1, preferences=preferences)[0]['book']['id'] == 'book3'
+    assert text_only.get_recommendations(1, sample_books, 1, preferences=preferences)[0]['book']['id'] != 'book3'
+
+
+def test_text_only_profile_scores_are_the_text_similarity(recommendation_module, sample_books):
+    recommender = recommendation_module.BookRecommender()
+    profile = recommender.build_profile(form_preferences(genres='fantasy', theme='magic'))
+
+    assert list(recommender.score_books(profile, sample_books)) == pytest.approx(
+        list(recommender.text_scores(profile.match_text, sample_books))
+    )
+
+
+def test_set_feature_weights_merges_with_defaults(recommendation_module):
+    weights = recommendation_module.set_feature_weights({'language': 1.0})
+
+    assert weights['language'] == 1.0
+    assert weights['text'] == recommendation_module.DEFAULT_FEATURE_WEIGHTS['text']
+    assert recommendation_module.get_recommender().weights == weights
@@ -0,0 +1,51 @@
+import pytest
+
+TEXTS = [
+    "The Hobbit: There and Back Again — a 1937 children's fantasy novel!",
+    "ÉLAN vital, naïve café; it's the_end of A-B testing...",
+    "",
+]
+
+
+@pytest.fixture
+def token_cache(recommendation_module):
+    from tokenizer import set_token_cache_size
+    return set_token_cache_size(100)
+
+
+def test_tokens_match_the_sklearn_word_analyzer(recommendation_module):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from recommender_model import TOKEN_PATTERN
+    from tokenizer import default_tokenizer
+    analyzer = TfidfVectorizer(stop_words='english', token_pattern=TOKEN_PATTERN).build_analyzer()
+
+    for text in TEXTS:
+        assert default_tokenizer().tokenize(text) == analyzer(text)
+
+
+def test_book_tokens_are_cached_per_key_and_text(recommendation_module, token_cache):
+    from tokenizer import default_tokenizer
+    tokenizer = default_tokenizer()
+
+    first = tokenizer.book_tokens(('book1', 'theme'), TEXTS[0])
+    assert tokenizer.book_tokens(('book1', 'theme'), TEXTS[0]) == first
+    assert (token_cache.hits, token_cache.misses) == (1, 1)
+
+    # A changed description is tokenized again
+    assert tokenizer.book_tokens(('book1', 'theme'), TEXTS[1]) == tokenizer.tokenize(TEXTS[1])
+    assert token_cache.misses == 2
+
+
+def test_repeat_scoring_reuses_tokens_with_the_same_scores(recommendation_module, sample_books, token_cache):
+    recommender = recommendation_module.BookRecommender()
+    recommender.model = recommendation_module.RecommenderModel.fit(
+        [recommender.get_book_text(book) for book in sample_books]
+    )
+
+    first = recommender.score_books('genres:fantasy theme:magic', sample_books)
+    misses = token_cache.misses
+    second = recommender.score_books('genres:fantasy theme:magic', sample_books)
+
+    assert second.tolist() == first.tolist()
+    assert token_cache.misses == misses
+    assert token_cache.hits > 0
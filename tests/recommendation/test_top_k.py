@@ -0,0 +1,31 @@
+def _full_sort_order(scores):
+    return [i for i, _ in sorted(enumerate(scores), key=lambda item: item[1], reverse=True)]
+
+
+def test_top_k_matches_stable_full_sort(recommendation_module):
+    scores = [0.2, 0.9, 0.5, 0.9, 0.1, 0.5, 0.5, 0.0, 0.9]
+
+    for k in range(len(scores) + 2):
+        expected = _full_sort_order(scores)[:k]
+        assert list(recommendation_module.top_k_indices(scores, k)) == expected
+
+
+def test_top_k_breaks_boundary_ties_by_position(recommendation_module):
+    scores = [0.5, 0.7, 0.5, 0.5, 0.5]
+
+    assert list(recommendation_module.top_k_indices(scores, 3)) == [1, 0, 2]
+
+
+def test_top_k_empty_inputs(recommendation_module):
+    assert len(recommendation_module.top_k_indices([], 5)) == 0
+    assert len(recommendation_module.top_k_indices([0.3, 0.1], 0)) == 0
+
+
+def test_get_recommendations_returns_top_k_in_order(recommendation_module, test_user, sample_books):
+    recommender = recommendation_module.BookRecommender()
+    scores = list(recommender.score_books(recommender.get_user_profile(test_user.id), sample_books))
+
+    recommendations = recommender.get_recommendations(test_user.id, sample_books, num_recommendations=2)
+
+    expected_ids = [sample_books[i]['id'] for i in _full_sort_order(scores)[:2]]
+    assert [rec['book']['id'] for rec in recommendations] == expected_ids
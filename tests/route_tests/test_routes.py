@@ -112,7 +112,7 @@ def test_recommendation_page_with_login(mock_recommender, test_client, test_user
     assert response.status_code == 200
     assert b'recommendation' in response.data.lower()
 
-@patch('app.BookRecommender')
+@patch('app.get_recommender')
 @patch('app.get_search_queries_from_preferences')
 @patch('app.fetch_books_from_google_api')
 @patch('app.process_google_books_response')